@@ -1,15 +1,17 @@
 # ======================== BLOQUE 1: IMPORTS Y UTILIDADES ========================
+import io
+import math
+import os
+import time
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
-from data import load_ingredients, get_nutrient_list
-from optimization import DietFormulator
-from profile import load_profile, save_profile, update_mascota_en_perfil
-from ui import show_mascota_form
-from energy_requirements import calcular_mer, descripcion_condiciones
-from nutrient_reference import NUTRIENTES_REFERENCIA_PERRO
-from utils import fmt2, fmt2_df
+from perf import REGISTRY as PERF_REGISTRY, incr, span, timed
+
+# Latencia de cada ejecución completa del script (se registra como "app.rerun" al final)
+_INICIO_SCRIPT = time.perf_counter()
+
+# Fragmentos: st.fragment (Streamlit >= 1.37) o st.experimental_fragment (1.33-1.36).
+# Sin soporte, la función se ejecuta como parte de la ejecución completa.
+fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
 
 # ======================== BLOQUE 2: ESTILO Y LOGO Y BARRA LATERAL ========================
 st.set_page_config(page_title="Formulador UYWA Premium", layout="wide")
@@ -62,6 +64,23 @@ def login():
 if "logged_in" not in st.session_state or not st.session_state["logged_in"]:
     login()
 
+# Dependencias pesadas recién después del login: la pantalla de inicio no las necesita.
+# PuLP y los módulos de cada herramienta (jobs, incremental, riesgo de precio, Pareto,
+# barrido de dosis, menú, producción) se importan donde se usan, la primera vez.
+import numpy as np
+import pandas as pd
+from shared_data import obtener_biblioteca, biblioteca_por_clave, memoria_compartida, reporte_memoria_sesion
+from formulation_result import FormulationResult
+from nutrient_aliases import alinear_columnas
+from diet_profiles import DIET_CATEGORY_RANGES
+from result_history import ResultHistory
+from charts import FIGURAS, figura_aporte, figura_costo, figura_precio_sombra, huella_formula
+from profile import load_profile, save_profile, update_mascota_en_perfil
+from ui import show_mascota_form
+from energy_requirements import calcular_mer, descripcion_condiciones
+from nutrient_adjustment import requerimientos_para_mascota
+from utils import fmt2, fmt2_df
+
 USER_KEY = f"uywa_req_{st.session_state['usuario']}"
 user = st.session_state["user"]
 
@@ -95,6 +114,26 @@ with st.sidebar:
         unsafe_allow_html=True
     )
 
+# ======================== BLOQUE 3.2: PANEL DE RENDIMIENTO (DEBUG) ========================
+# Muestra los spans y contadores de perf.REGISTRY acumulados en este proceso (hasta el rerun anterior).
+with st.sidebar:
+    if st.checkbox("Panel de rendimiento", value=False, key="perf_debug_panel"):
+        resumen_perf = pd.DataFrame(PERF_REGISTRY.resumen())
+        if not resumen_perf.empty:
+            st.dataframe(resumen_perf.set_index("span").round(4), use_container_width=True)
+        st.write(PERF_REGISTRY.contadores())
+        memoria_sesion = reporte_memoria_sesion(st.session_state)
+        bytes_compartidos, n_bibliotecas = memoria_compartida()
+        st.markdown(
+            f"**Memoria de esta sesión:** {memoria_sesion['bytes'].sum() / 1024:,.1f} KB · "
+            f"**Compartida ({n_bibliotecas} matrices):** {bytes_compartidos / 1024:,.1f} KB"
+        )
+        st.dataframe(memoria_sesion.head(10), use_container_width=True, hide_index=True)
+        st.download_button("Exportar JSON lines", PERF_REGISTRY.exportar_jsonl(), file_name="uywa_perf.jsonl", key="perf_export_jsonl")
+        st.download_button("Exportar Prometheus", PERF_REGISTRY.exportar_prometheus(), file_name="uywa_perf.prom", key="perf_export_prom")
+        if st.button("Reiniciar métricas", key="perf_reset"):
+            PERF_REGISTRY.reset()
+
 # ======================== BLOQUE 4: UTILIDADES DE SESIÓN ========================
 def safe_float(val, default=0.0):
     try:
@@ -116,6 +155,134 @@ def clean_state(keys_prefix, valid_names):
                 if not found:
                     del st.session_state[key]
 
+def ingredientes_formulados():
+    """Nombres de los ingredientes de la última formulación (desde la biblioteca compartida)."""
+    biblioteca = biblioteca_por_clave(st.session_state.get("ingredientes_clave"))
+    if biblioteca is None:
+        return []
+    return biblioteca.nombres_de(st.session_state.get("ingredientes_idx", []))
+
+def ingredientes_formulados_df():
+    """Copia de trabajo de los ingredientes de la última formulación, con las ediciones del usuario."""
+    biblioteca = biblioteca_por_clave(st.session_state.get("ingredientes_clave"))
+    if biblioteca is None:
+        return None
+    return biblioteca.frame(st.session_state.get("ingredientes_idx", []), st.session_state.get("ingredientes_ediciones"))
+
+def mostrar_diagnostico(diagnostico):
+    """Tabla con el conjunto de restricciones en conflicto y la menor relajación que lo resuelve."""
+    if not diagnostico:
+        return
+    if diagnostico["conflicto"]:
+        st.markdown("**Restricciones en conflicto** (hay que relajar al menos una de ellas):")
+        st.dataframe(pd.DataFrame(diagnostico["conflicto"]), use_container_width=True, hide_index=True)
+    if diagnostico["relajacion_minima"]:
+        st.markdown("**Menor relajación que permite formular:**")
+        st.dataframe(pd.DataFrame(diagnostico["relajacion_minima"]), use_container_width=True, hide_index=True)
+    if not diagnostico["minimo"]:
+        st.caption("El diagnóstico se detuvo por tiempo; el conjunto mostrado puede no ser mínimo.")
+
+def mostrar_presolve(reporte):
+    """Resumen de cuánto se redujo el modelo antes de resolverlo."""
+    if not reporte:
+        return
+    (ing_antes, ing_despues), (filas_antes, filas_despues) = reporte["ingredientes"], reporte["filas"]
+    st.caption(
+        f"Modelo reducido: {ing_despues}/{ing_antes} ingredientes, {filas_despues}/{filas_antes} restricciones, "
+        f"{reporte['variables_holgura'][1]} variables de holgura."
+    )
+    if reporte["ingredientes_dominados"]:
+        st.caption("Ingredientes dominados (otro es igual o mejor y no más caro): " + ", ".join(reporte["ingredientes_dominados"]))
+    if reporte.get("nutrientes_por_alias"):
+        st.caption(
+            "Nutrientes con otro nombre de columna en la matriz: "
+            + ", ".join(f"{nut} → {col}" for nut, col in reporte["nutrientes_por_alias"].items())
+        )
+
+def advertir_nutrientes_sin_columna(result):
+    if result.get("nutrientes_sin_columna"):
+        st.warning(
+            "Requerimientos sin columna en la matriz de ingredientes (no se aplicaron): "
+            + ", ".join(result["nutrientes_sin_columna"])
+        )
+
+def formulador_actual(ingredientes_df, limites_min, limites_max, ratios, tipo_dieta):
+    """DietFormulator con los requerimientos, límites, relaciones y tipo de dieta de la pestaña Formulación."""
+    from optimization import DietFormulator
+
+    user_requirements = st.session_state.get("nutrientes_requeridos", {})
+    return DietFormulator(
+        ingredientes_df,
+        list(user_requirements.keys()),
+        user_requirements,
+        limits={"min": limites_min, "max": limites_max},
+        ratios=ratios,
+        diet_type=None if tipo_dieta == "Sin restricción" else tipo_dieta,
+    )
+
+def tabla_composicion(result, ingredientes, dosis_g):
+    """% de inclusión y gramos en la dosis de cada ingrediente seleccionado (0 si no entra en la fórmula)."""
+    if isinstance(result, FormulationResult):
+        porcentajes = result.inclusiones(ingredientes)
+    else:
+        diet = result.get("diet", {}) if result else {}
+        porcentajes = np.array([diet.get(ing, 0.0) for ing in ingredientes], dtype=float)
+    return pd.DataFrame({
+        "Ingrediente": ingredientes,
+        "% Inclusión": [fmt2(p) for p in porcentajes],
+        "Gramos en dosis": [fmt2(g) for g in porcentajes / 100.0 * dosis_g],
+    })
+
+def historial_mascota():
+    """Historial de resultados (result_history.ResultHistory) de la mascota activa en esta sesión."""
+    mascota = st.session_state.get("profile", {}).get("mascota", {}).get("nombre", "Mascota")
+    return st.session_state.setdefault("historial_formulaciones", {}).setdefault(mascota, ResultHistory())
+
+def guardar_resultado_formulacion(result, contexto):
+    """Guarda en la sesión el resultado de una formulación y muestra su estado."""
+    st.session_state["last_result"] = result
+    if result.get("success", False):
+        st.session_state["last_diet"] = result.get("diet", {})
+        st.session_state["last_cost"] = result.get("cost", 0)
+        st.session_state["last_nutritional_values"] = result.get("nutritional_values", {})
+        # La referencia a la biblioteca la mantiene viva aunque salga del LRU de shared_data
+        for clave in ["ingredientes_biblioteca", "ingredientes_clave", "ingredientes_idx", "ingredientes_ediciones"]:
+            st.session_state[clave] = contexto[clave]
+        st.session_state["nutrientes_seleccionados"] = contexto["nutrientes_seleccionados"]
+        incremental = result.get("incremental")
+        if not incremental or incremental["metodo"] != "sin_cambios":
+            historial_mascota().agregar(result, st.session_state.get("nutrientes_requeridos", {}))
+        st.success("¡Formulación realizada!")
+        if incremental:
+            metodos = {
+                "sin_cambios": "sin cambios en la matriz",
+                "analitico": "la base anterior sigue siendo óptima (sin re-resolver)",
+                "re_solve": "re-resuelta desde la solución anterior",
+            }
+            cambios = ", ".join(f"{col} de {ing}" for ing, col, _, _ in incremental["cambios"][:5])
+            st.caption(
+                f"Actualización incremental: {metodos[incremental['metodo']]}"
+                + (f" · cambios: {cambios}" if cambios else "")
+                + f" · {fmt2(incremental['tiempo_s'] * 1000)} ms"
+            )
+        mostrar_presolve(result.get("presolve"))
+        advertir_nutrientes_sin_columna(result)
+        if result.get("categorias_sin_ingredientes"):
+            st.warning(
+                "Categorías del tipo de dieta sin ingredientes seleccionados (su rango no se aplicó): "
+                + ", ".join(result["categorias_sin_ingredientes"])
+            )
+    else:
+        st.error(result.get("message", "No se pudo formular la dieta."))
+        mostrar_diagnostico(result.get("diagnostico"))
+        advertir_nutrientes_sin_columna(result)
+
+@st.cache_resource
+def get_job_manager():
+    from jobs import JobManager
+
+    return JobManager(max_workers=2)
+
 # ======================== BLOQUE 5: TITULO Y TABS PRINCIPALES ========================
 st.title("Gestión y Análisis de Dietas")
 
@@ -129,7 +296,7 @@ tabs = st.tabs([
 from nutrient_tools import transformar_referencia_a_porcentaje
 
 # ======================== BLOQUE 5.1: TAB PERFIL DE MASCOTA (tabla de referencia, solo Min, formato mejorado) ========================
-with tabs[0]:
+with tabs[0], span("tab.perfil"):
     show_mascota_form(profile, on_update_callback=update_and_save_profile)
     mascota = st.session_state.get("profile", {}).get("mascota", {})
     nombre_mascota = mascota.get("nombre", "Mascota")
@@ -138,7 +305,8 @@ with tabs[0]:
     edad = mascota.get("edad", 1.0)
     peso = mascota.get("peso", 12.0)
     st.subheader("Cálculo de requerimiento energético")
-    energia = calcular_mer(especie, condicion, peso, edad_meses=edad * 12)
+    with span("requirements.mer"):
+        energia = calcular_mer(especie, condicion, peso, edad_meses=edad * 12)
     if energia:
         st.success(f"Requerimiento energético estimado (MER): {fmt2(energia)} kcal/día")
     else:
@@ -149,42 +317,17 @@ with tabs[0]:
         unsafe_allow_html=True
     )
 
-    def ajustar_nutriente(val_ref, energia_ref, energia_actual):
-        if val_ref is None:
-            return None
-        return val_ref * energia_actual / energia_ref
-
-    energia_ref = 1000
-    requerimientos_ajustados = []
-    for nutr, info in NUTRIENTES_REFERENCIA_PERRO.items():
-        unidad = info["unit"]
-        if nutr == "EM" and unidad == "kcal/kg":
-            requerimientos_ajustados.append({
-                "Nutriente": nutr,
-                "Min": fmt2(energia),
-                "Unidad": unidad
-            })
-        elif nutr == "EM_1" and unidad == "kcal/g":
-            min_aj = ajustar_nutriente(info["min"], energia_ref, energia) if info["min"] is not None else None
-            requerimientos_ajustados.append({
-                "Nutriente": nutr,
-                "Min": fmt2(min_aj),
-                "Unidad": unidad
-            })
-        elif unidad in ["g/100g", "g/kg"]:
-            min_aj = ajustar_nutriente(info["min"], energia_ref, energia) if info["min"] is not None else None
-            requerimientos_ajustados.append({
-                "Nutriente": nutr,
-                "Min": fmt2(min_aj),
-                "Unidad": unidad
-            })
-        else:
-            requerimientos_ajustados.append({
-                "Nutriente": nutr,
-                "Min": fmt2(info["min"]),
-                "Unidad": unidad
-            })
-    df_nutr = pd.DataFrame(requerimientos_ajustados)
+    with span("requirements.compute"):
+        requerimientos_diarios, clave_referencia = (
+            requerimientos_para_mascota(energia, especie, condicion) if energia else ({}, None)
+        )
+    if clave_referencia:
+        st.caption(f"Tabla de referencia: {clave_referencia[0]} · {clave_referencia[1]} · {clave_referencia[2]}")
+    requerimientos_ajustados = [
+        {"Nutriente": nutr, "Min": fmt2(info["min"]), "Unidad": info["unit"]}
+        for nutr, info in requerimientos_diarios.items()
+    ]
+    df_nutr = pd.DataFrame(requerimientos_ajustados, columns=["Nutriente", "Min", "Unidad"])
     df_nutr["Min"] = df_nutr["Min"].replace("None", "").replace({None: ""})
 
     # --- TABLA BONITA CON HTML Y CSS (renderizada de una sola vez) ---
@@ -243,10 +386,11 @@ with tabs[0]:
     st.markdown(html_table, unsafe_allow_html=True)
 
     # Guardar en sesión para Formulación (SOLO columnas Nutriente, Min, Unidad)
-    st.session_state["tabla_requerimientos_base"] = df_nutr[["Nutriente", "Min", "Unidad"]].copy()
+    # (lista de registros: la sesión no guarda DataFrames)
+    st.session_state["tabla_requerimientos_base"] = df_nutr[["Nutriente", "Min", "Unidad"]].to_dict("records")
 
 # ======================== BLOQUE 6: TAB FORMULACIÓN ========================
-with tabs[1]:
+with tabs[1], span("tab.formulacion"):
     st.header("Formulación automática de dieta")
     mascota = st.session_state.get("profile", {}).get("mascota", {})
     nombre_mascota = mascota.get("nombre", "Mascota")
@@ -255,7 +399,7 @@ with tabs[1]:
 
     st.subheader("Ajuste de requerimientos nutricionales según dosis diaria")
 
-    df_base = st.session_state.get("tabla_requerimientos_base", pd.DataFrame()).copy()
+    df_base = pd.DataFrame(st.session_state.get("tabla_requerimientos_base", []))
     if df_base.empty:
         st.warning("Primero completa el perfil de mascota para obtener requerimientos.")
         st.stop()
@@ -319,29 +463,31 @@ with tabs[1]:
         type=["csv", "xlsx"], 
         key="uploader_ingredientes"
     )
-    ingredientes_df = load_ingredients(ingredientes_file)
+    # La matriz se parsea una vez por proceso y se comparte entre sesiones (shared_data);
+    # la sesión solo guarda la clave de la biblioteca (y una referencia, no una copia), índices
+    # seleccionados y ediciones.
+    biblioteca = (
+        obtener_biblioteca(ingredientes_file.getvalue(), ingredientes_file.name) if ingredientes_file is not None else None
+    )
     formulable = False
 
     ingredientes_sel = []
+    ingredientes_idx = np.array([], dtype=np.int64)
     ingredientes_df_filtrado = pd.DataFrame()
     limites_min = {}
     limites_max = {}
+    ratios = []
+    tipo_dieta = "Sin restricción"
 
-    if ingredientes_df is not None and not ingredientes_df.empty:
-        for col in ingredientes_df.columns:
-            if col not in ["Ingrediente", "Categoría"]:
-                ingredientes_df[col] = pd.to_numeric(ingredientes_df[col], errors='coerce').fillna(0)
+    if biblioteca is not None and len(biblioteca) > 0:
         st.subheader("Selecciona las materias primas para formular la dieta por categoría")
 
         categorias = ["Proteinas", "Carbohidratos", "Grasas", "Vegetales", "Frutas", "Otros"]
         ingredientes_seleccionados = []
         for cat in categorias:
-            df_cat = ingredientes_df[
-                ingredientes_df["Categoría"].astype(str).str.strip().str.capitalize() == cat
-            ]
-            if not df_cat.empty:
+            ing_cat = biblioteca.ingredientes_por_categoria(cat)
+            if ing_cat:
                 st.markdown(f"**{cat}**")
-                ing_cat = df_cat["Ingrediente"].tolist()
                 sel_cat = st.multiselect(
                     f"Selecciona ingredientes de {cat}",
                     ing_cat,
@@ -350,7 +496,8 @@ with tabs[1]:
                 )
                 ingredientes_seleccionados.extend(sel_cat)
         ingredientes_sel = list(dict.fromkeys(ingredientes_seleccionados))
-        ingredientes_df_filtrado = ingredientes_df[ingredientes_df["Ingrediente"].isin(ingredientes_sel)].copy()
+        ingredientes_idx = np.sort(biblioteca.indices(ingredientes_sel))
+        ingredientes_df_filtrado = biblioteca.frame(ingredientes_idx)
 
         # Tabla editable para min/max de inclusión
         if not ingredientes_df_filtrado.empty:
@@ -392,50 +539,291 @@ with tabs[1]:
                 use_container_width=True,
                 key="editor_materias_seleccionadas_formulacion"
             )
+        with st.expander("Relaciones entre nutrientes (ej. Ca:P)"):
+            st.write("Cada fila agrega la restricción mínimo ≤ Numerador / Denominador ≤ máximo (deja vacía una cota para no usarla).")
+            columnas_nutrientes = [c for c in biblioteca.columnas_numericas if c != "precio"]
+            ratios_df = st.data_editor(
+                pd.DataFrame(columns=["Numerador", "Denominador", "Mínimo", "Máximo"]),
+                column_config={
+                    "Numerador": st.column_config.SelectboxColumn("Numerador", options=columnas_nutrientes),
+                    "Denominador": st.column_config.SelectboxColumn("Denominador", options=columnas_nutrientes),
+                    "Mínimo": st.column_config.NumberColumn("Mínimo", min_value=0.0, step=0.01),
+                    "Máximo": st.column_config.NumberColumn("Máximo", min_value=0.0, step=0.01),
+                },
+                num_rows="dynamic",
+                use_container_width=True,
+                hide_index=True,
+                key="tabla_ratios_formulacion"
+            )
+            ratios = [
+                {"numerador": row["Numerador"], "denominador": row["Denominador"], "min": row["Mínimo"], "max": row["Máximo"]}
+                for _, row in ratios_df.iterrows()
+                if row["Numerador"] and row["Denominador"] and not (pd.isna(row["Mínimo"]) and pd.isna(row["Máximo"]))
+            ]
+        tipo_dieta = st.selectbox(
+            "Tipo de dieta (rangos de inclusión por categoría)",
+            ["Sin restricción"] + list(DIET_CATEGORY_RANGES),
+            key="tipo_dieta_formulacion"
+        )
+        if tipo_dieta != "Sin restricción":
+            st.dataframe(
+                pd.DataFrame(
+                    [(cat, fmt2(mn * 100), fmt2(mx * 100)) for cat, (mn, mx) in DIET_CATEGORY_RANGES[tipo_dieta].items()],
+                    columns=["Categoría", "Mínimo (%)", "Máximo (%)"],
+                ),
+                use_container_width=True,
+                hide_index=True,
+            )
         st.write(f"Ingredientes seleccionados: {', '.join(ingredientes_sel) if ingredientes_sel else 'Ninguno'}")
         formulable = not ingredientes_df_filtrado.empty
 
     # ---------- FORMULAR DIETA ----------
+    # La formulación corre en segundo plano (jobs.JobManager); la sesión solo guarda el id del trabajo.
+    job_manager = get_job_manager()
+    job_id = st.session_state.get("formulation_job_id")
+    job = job_manager.get(job_id) if job_id else None
+    job_en_curso = job is not None and not job.finalizado
+
     if formulable:
-        if st.button("Formular dieta automática", key="btn_formular_dieta_auto"):
+        if st.button("Formular dieta automática", key="btn_formular_dieta_auto", disabled=job_en_curso):
             user_requirements = st.session_state.get("nutrientes_requeridos", {})
             nutrientes_seleccionados = list(user_requirements.keys())
-            formulator = DietFormulator(
-                ingredientes_df_filtrado,
-                nutrientes_seleccionados,
-                user_requirements,
-                limits={"min": limites_min, "max": limites_max},
-                ratios=[],
-                min_selected_ingredients={},
-                diet_type=None
-            )
-            result = formulator.solve()
-            st.session_state["last_result"] = result
-            if result.get("success", False):
-                st.session_state["last_diet"] = result.get("diet", {})
-                st.session_state["last_cost"] = result.get("cost", 0)
-                st.session_state["last_nutritional_values"] = result.get("nutritional_values", {})
-                st.session_state["ingredients_df"] = ingredientes_df_filtrado
-                st.session_state["nutrientes_seleccionados"] = nutrientes_seleccionados
-                st.success("¡Formulación realizada!")
-            else:
-                st.error(result.get("message", "No se pudo formular la dieta."))
-
+            limits = {"min": limites_min, "max": limites_max}
+            try:
+                formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+            except ValueError as e:
+                st.error(str(e))
+                formulator = None
+            if formulator is not None:
+                from incremental import IncrementalSolver, obtener_solver
+                from jobs import clave_formulacion
+
+                contexto = {
+                    "ingredientes_biblioteca": biblioteca,
+                    "ingredientes_clave": biblioteca.clave,
+                    "ingredientes_idx": ingredientes_idx,
+                    "ingredientes_ediciones": biblioteca.ediciones(ingredientes_idx, ingredientes_df_filtrado),
+                    "nutrientes_seleccionados": nutrientes_seleccionados,
+                }
+                incremental = obtener_solver(st.session_state.get("formulacion_incremental"))
+                if incremental is not None and incremental.compatible(formulator):
+                    # Solo cambiaron valores de la matriz: se re-formula desde el último modelo, sin trabajo en segundo plano
+                    with span("formulation.incremental"):
+                        resultado_incremental = incremental.actualizar(formulator)
+                    guardar_resultado_formulacion(resultado_incremental, contexto)
+                else:
+                    job_id = job_manager.submit(
+                        clave_formulacion(ingredientes_df_filtrado, user_requirements, limits, ratios, formulator.diet_type),
+                        IncrementalSolver(formulator),
+                        contexto=contexto,
+                    )
+                    st.session_state["formulation_job_id"] = job_id
+                    job = job_manager.get(job_id)
+                    job_en_curso = True
     else:
         st.info("Selecciona al menos un ingrediente para formular la mezcla.")
-        
+
+    if job is not None:
+        if not job.finalizado:
+            etapas = {None: "En cola", "build": "Construyendo modelo", "solve": "Resolviendo", "collect": "Recolectando resultados"}
+            st.progress(job.progreso, text=f"Formulación {job.id}: {etapas.get(job.etapa, job.etapa)}...")
+            if st.button("Cancelar formulación", key="btn_cancelar_formulacion"):
+                job_manager.cancel(job.id)
+                st.session_state.pop("formulation_job_id", None)
+                st.warning("Formulación cancelada.")
+            else:
+                time.sleep(0.5)
+                st.rerun()
+        else:
+            st.session_state.pop("formulation_job_id", None)
+            if job.estado == "terminado":
+                if job.resultado.get("success", False):
+                    from incremental import registrar_solver
+
+                    st.session_state["formulacion_incremental"] = registrar_solver(job.formulator)
+                guardar_resultado_formulacion(job.resultado, job.contexto)
+            elif job.estado == "cancelado":
+                st.warning("Formulación cancelada.")
+            else:
+                st.error(f"Error al formular la dieta: {job.error}")
+
+    # ---------- SIMULACIÓN DE RIESGO DE PRECIO ----------
+    if formulable:
+        with st.expander("Simulación de riesgo de precio (Monte Carlo)"):
+            st.write("Varía los precios de las materias primas seleccionadas y re-formula para obtener la distribución del costo.")
+            col_a, col_b = st.columns(2)
+            with col_a:
+                variacion_pct = st.slider("Variación de precio (± %)", 1, 100, 20, key="riesgo_variacion_pct")
+            with col_b:
+                n_muestras = st.number_input("Número de simulaciones", min_value=50, max_value=10000, value=500, step=50, key="riesgo_n")
+            if st.button("Simular riesgo de precio", key="btn_simular_riesgo"):
+                from price_risk import simular_riesgo_precio, especificacion_porcentual
+
+                formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+                with st.spinner("Simulando..."), span("risk.simulation"):
+                    riesgo = simular_riesgo_precio(
+                        formulator,
+                        especificacion_porcentual(ingredientes_df_filtrado, variacion_pct),
+                        n=int(n_muestras),
+                        jobs=min(4, os.cpu_count() or 1),
+                    )
+                if riesgo["percentiles"]:
+                    import plotly.graph_objects as go
+
+                    st.dataframe(
+                        pd.DataFrame([{f"P{p}": fmt2(v) for p, v in riesgo["percentiles"].items()}]),
+                        use_container_width=True, hide_index=True
+                    )
+                    st.markdown(
+                        f"Costo medio (por 100 kg): **{fmt2(riesgo['media'])}** ± {fmt2(riesgo['desv'])} · "
+                        f"{riesgo['n'] - riesgo['n_fallidas']} simulaciones válidas en {fmt2(riesgo['tiempo_s'])} s"
+                    )
+                    st.plotly_chart(
+                        go.Figure(go.Histogram(x=riesgo["costos"], marker_color="#19345c")).update_layout(
+                            xaxis_title="Costo por 100 kg", yaxis_title="Frecuencia", template="simple_white"
+                        ),
+                        use_container_width=True,
+                    )
+                    st.dataframe(fmt2_df(riesgo["ingredientes"]), use_container_width=True, hide_index=True)
+                else:
+                    st.error("Ninguna simulación produjo una solución óptima.")
+
+        with st.expander("Frontera de Pareto: costo vs segundo objetivo"):
+            from pareto import OBJETIVOS as OBJETIVOS_PARETO
+
+            objetivo_pareto = st.selectbox(
+                "Segundo objetivo", list(OBJETIVOS_PARETO.keys()), format_func=OBJETIVOS_PARETO.get, key="pareto_objetivo"
+            )
+            n_puntos_pareto = st.number_input("Número de puntos", min_value=3, max_value=50, value=12, key="pareto_n_puntos")
+            if st.button("Calcular frontera", key="btn_frontera_pareto"):
+                from pareto import frontera_pareto, grafico_frontera
+
+                formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+                try:
+                    with st.spinner("Calculando frontera..."), span("pareto.sweep"):
+                        frontera = frontera_pareto(
+                            formulator, objetivo_pareto, n_puntos=int(n_puntos_pareto), jobs=min(4, os.cpu_count() or 1)
+                        )
+                    if frontera.empty:
+                        st.warning("No se encontraron puntos óptimos en el rango del segundo objetivo.")
+                    else:
+                        st.plotly_chart(grafico_frontera(frontera, objetivo_pareto), use_container_width=True)
+                        st.dataframe(fmt2_df(frontera.drop(columns=["epsilon", "estado"])), use_container_width=True, hide_index=True)
+                except ValueError as e:
+                    st.error(str(e))
+
+        with st.expander("Barrido de dosis: costo según la dosis diaria"):
+            st.write("Re-formula en un rango de dosis (requerimientos por kg = diario / dosis) y ubica los cambios de composición y los límites de factibilidad.")
+            col_a, col_b, col_c = st.columns(3)
+            with col_a:
+                dosis_min_barrido = st.number_input("Dosis mínima (g/día)", min_value=10, max_value=3000, value=max(10, int(dosis_g // 2)), step=10, key="barrido_dosis_min")
+            with col_b:
+                dosis_max_barrido = st.number_input("Dosis máxima (g/día)", min_value=20, max_value=6000, value=int(dosis_g * 2), step=10, key="barrido_dosis_max")
+            with col_c:
+                n_puntos_barrido = st.number_input("Puntos iniciales", min_value=3, max_value=100, value=15, key="barrido_n_puntos")
+            if st.button("Barrer dosis", key="btn_barrido_dosis"):
+                from dose_sweep import barrido_dosis, grafico_barrido
+
+                try:
+                    formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+                    with st.spinner("Barriendo dosis..."), span("dose_sweep.run"):
+                        barrido = barrido_dosis(
+                            formulator, dosis_g, float(dosis_min_barrido), float(dosis_max_barrido), n_puntos=int(n_puntos_barrido)
+                        )
+                    st.plotly_chart(grafico_barrido(barrido), use_container_width=True)
+                    if barrido["limites_factibles"] is None:
+                        st.warning("Ninguna dosis del rango cumple todos los mínimos.")
+                    else:
+                        mejor = barrido["mejor"]
+                        st.markdown(
+                            f"Dosis factibles: **{fmt2(barrido['limites_factibles'][0])}–{fmt2(barrido['limites_factibles'][1])} g/día** · "
+                            f"menor costo diario en **{fmt2(mejor['dosis_g'])} g/día** ({fmt2(mejor['costo_dia'])} por día, "
+                            f"{fmt2(mejor['costo_100kg'])} por 100 kg)"
+                        )
+                    if barrido["quiebres"]:
+                        st.dataframe(
+                            pd.DataFrame([
+                                {
+                                    "Dosis (g/día)": f"{fmt2(q['desde_g'])}–{fmt2(q['hasta_g'])}",
+                                    "Entran": ", ".join(q["entran"]),
+                                    "Salen": ", ".join(q["salen"]),
+                                    "Cambia factibilidad": "Sí" if q["cambia_factibilidad"] else "",
+                                }
+                                for q in barrido["quiebres"]
+                            ]),
+                            use_container_width=True, hide_index=True,
+                        )
+                    st.caption(f"{barrido['n_resoluciones']} resoluciones en {fmt2(barrido['tiempo_s'])} s")
+                except ValueError as e:
+                    st.error(str(e))
+
+        with st.expander("Menú semanal de rotación"):
+            st.write("Formula varias recetas diarias en conjunto: los requerimientos se cumplen en el promedio y cada día dentro de una tolerancia.")
+            col_a, col_b, col_c = st.columns(3)
+            with col_a:
+                n_dias_menu = st.number_input("Días", min_value=2, max_value=14, value=7, key="menu_n_dias")
+            with col_b:
+                tolerancia_menu = st.slider("Tolerancia diaria (± %)", 0, 50, 20, key="menu_tolerancia")
+            with col_c:
+                max_dias_menu = st.number_input(
+                    "Máx. días por ingrediente", min_value=1, max_value=14, value=max(1, math.ceil(n_dias_menu * 0.6)), key="menu_max_dias"
+                )
+            if st.button("Planificar menú", key="btn_menu_semanal"):
+                from menu_planner import planificar_menu
+
+                try:
+                    formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+                    with st.spinner("Planificando menú..."), span("menu.plan"):
+                        menu = planificar_menu(
+                            formulator, int(n_dias_menu), tolerancia_menu / 100.0, int(max_dias_menu)
+                        )
+                    if menu["success"]:
+                        tabla_menu = pd.DataFrame(
+                            {f"Día {d + 1}": dia["diet"] for d, dia in enumerate(menu["dias"])}
+                        ).fillna(0.0)
+                        tabla_menu.loc["Costo (por 100 kg)"] = [dia["cost"] for dia in menu["dias"]]
+                        st.dataframe(tabla_menu.round(2), use_container_width=True)
+                        metodo = "MILP conjunto" if menu["metodo"] == "milp" else "rotación (el MILP no terminó a tiempo)"
+                        st.caption(f"Costo promedio: {fmt2(menu['cost'])} · {metodo} en {fmt2(menu['tiempo_s'])} s")
+                        if "advertencia" in menu:
+                            st.warning(menu["advertencia"])
+                    else:
+                        st.error(menu["message"])
+                except ValueError as e:
+                    st.error(str(e))
+
+        with st.expander("Receta de producción (mezcladora)"):
+            st.write("Convierte la fórmula a kilos enteros según el tamaño del lote y la resolución de la balanza.")
+            col_a, col_b = st.columns(2)
+            with col_a:
+                lote_kg = st.number_input("Tamaño del lote (kg)", min_value=1.0, value=500.0, step=10.0, key="produccion_lote_kg")
+            with col_b:
+                incremento_kg = st.number_input("Resolución de balanza (kg)", min_value=0.001, value=0.5, step=0.1, format="%.3f", key="produccion_incremento_kg")
+            if st.button("Calcular receta", key="btn_receta_produccion"):
+                from production import receta_produccion
+
+                try:
+                    formulator = formulador_actual(ingredientes_df_filtrado, limites_min, limites_max, ratios, tipo_dieta)
+                    with span("production.recipe"):
+                        receta = receta_produccion(formulator, float(lote_kg), float(incremento_kg))
+                    if receta["success"]:
+                        st.dataframe(fmt2_df(receta["receta"]), use_container_width=True, hide_index=True)
+                        metodo = "redondeo directo" if receta["metodo"] == "redondeo" else "reparación MILP"
+                        st.caption(
+                            f"Costo por 100 kg: {fmt2(receta['costo'])} · desviación máxima {fmt2(receta['desviacion_max_kg'])} kg "
+                            f"· {metodo} en {fmt2(receta['tiempo_s'])} s"
+                        )
+                    else:
+                        st.error(receta["message"])
+                except ValueError as e:
+                    st.error(str(e))
+
 # ===================== BLOQUE 7: RESULTADOS DE LA FORMULACIÓN AUTOMÁTICA =====================
-with tabs[2]:
+with tabs[2], span("tab.resultados"):
     st.header("Resultados de la formulación automática")
     result = st.session_state.get("last_result", None)
-    ingredientes_df_filtrado = st.session_state.get("ingredients_df", None)
-
-    ingredientes_sel = []
-    if ingredientes_df_filtrado is not None and "Ingrediente" in ingredientes_df_filtrado.columns:
-        ingredientes_sel = list(ingredientes_df_filtrado["Ingrediente"])
+    ingredientes_sel = ingredientes_formulados()
 
-    diet = result.get("diet", {}) if result else {}
-    comp_data = []
 
     # Obtener la dosis diaria usada en formulación (revisar todas las keys posibles)
     dosis_g = (
@@ -444,15 +832,7 @@ with tabs[2]:
         or 1000  # Valor por defecto si no existe
     )
 
-    for ing in ingredientes_sel:
-        porcentaje = diet.get(ing, 0.0)
-        gramos = (porcentaje / 100.0) * dosis_g
-        comp_data.append({
-            "Ingrediente": ing,
-            "% Inclusión": fmt2(porcentaje),
-            "Gramos en dosis": fmt2(gramos)
-        })
-    res_df = pd.DataFrame(comp_data)
+    res_df = tabla_composicion(result, ingredientes_sel, dosis_g)
     st.subheader("Composición óptima de la dieta (por dosis seleccionada)")
     if "Ingrediente" in res_df.columns and not res_df.empty:
         st.dataframe(res_df.set_index("Ingrediente"), use_container_width=True)
@@ -504,7 +884,46 @@ with tabs[2]:
         })
     comp_df = pd.DataFrame(comp_list)
     st.dataframe(comp_df, use_container_width=True)
+
+    ratios_obtenidos = result.get("ratios", {}) if result else {}
+    if ratios_obtenidos:
+        st.markdown("**Relaciones entre nutrientes**")
+        st.dataframe(
+            pd.DataFrame({"Relación": list(ratios_obtenidos), "Obtenido": [fmt2(v) for v in ratios_obtenidos.values()]}),
+            use_container_width=True,
+            hide_index=True,
+        )
     
+    historial = historial_mascota()
+    if len(historial) >= 2:
+        with st.expander(f"Comparar con formulaciones anteriores ({len(historial) - 1})"):
+            actual = len(historial) - 1
+            anterior = st.selectbox(
+                "Comparar la formulación actual con",
+                list(range(actual - 1, -1, -1)),
+                format_func=lambda k: f"{historial.etiquetas[k]} · costo {fmt2(historial.costos[k])}",
+                key="historial_comparar_con",
+            )
+            with span("history.diff"):
+                diferencia = historial.diferencia(anterior, actual)
+                resumen_historial = historial.resumen_contra(actual)
+            st.metric(
+                "Costo (por 100 kg)", fmt2(diferencia["costo"]["despues"]),
+                delta=fmt2(diferencia["costo"]["delta"]), delta_color="inverse",
+            )
+            st.markdown("**Cambios de inclusión**")
+            if diferencia["ingredientes"].empty:
+                st.write("Misma composición.")
+            else:
+                st.dataframe(diferencia["ingredientes"].round(2), use_container_width=True, hide_index=True)
+            st.markdown("**Cambios en nutrientes**")
+            nutrientes_diff = diferencia["nutrientes"]
+            for columna in ("Cumple antes", "Cumple después"):
+                nutrientes_diff[columna] = np.where(nutrientes_diff[columna], "✔️", "❌")
+            st.dataframe(nutrientes_diff.round(2), use_container_width=True, hide_index=True)
+            st.markdown("**Historial de la mascota frente a la formulación actual**")
+            st.dataframe(resumen_historial.iloc[::-1].round(2), use_container_width=True, hide_index=True)
+
 # ======================== BLOQUE AUXILIARES PARA BLOQUE 8 (GRÁFICOS) ========================
 
 # --- Formato decimales ---
@@ -597,6 +1016,13 @@ def fmt2_df(df):
             df_fmt[c] = df_fmt[c].apply(fmt2)
     return df_fmt
 
+# --- Render de figuras con medición de tiempo ---
+def plotly_chart_medido(fig, nombre, n_bytes=None):
+    with span(nombre):
+        st.plotly_chart(fig, use_container_width=True)
+    if n_bytes:
+        incr("plot.bytes", n_bytes)
+
 # --- Mapeo color ingredientes (simple pero efectivo) ---
 def get_color_map(ingredientes):
     palette = [
@@ -657,17 +1083,145 @@ def cargar_escenarios():
 def guardar_escenarios(escenarios):
     st.session_state["escenarios_guardados"] = escenarios
 
+# ======================== BLOQUE 8: FRAGMENTOS DE GRÁFICOS ========================
+# Cada panel es un fragmento: sus widgets (unidad, tipo de gráfico) re-ejecutan solo ese
+# panel con los argumentos de la última ejecución completa, sin volver a correr el resto
+# de la app ni los otros paneles.
+OPCIONES_UNIDAD = {
+    'kg': ['kg', 'ton'],
+    'g': ['g', '100g', 'kg', 'ton'],
+    'kcal': ['kcal', '1000kcal'],
+    '%': ['%', '100 unidades'],
+    'unidad': ['unidad', '100 unidades', '1000 unidades', 'kg', 'ton'],
+}
+
+@fragmento
+@timed("fragment.costo_total")
+def panel_costo_total(df_formula, ingredientes_seleccionados, color_map, huella):
+    manual_unit = unit_selector(
+        "Unidad para mostrar el costo total por ingrediente",
+        ['USD/kg', 'USD/ton'],
+        'USD/ton',
+        key="unit_selector_costototal_tab1"
+    )
+    factor = 1 if manual_unit == 'USD/kg' else 10  # 1 para USD/kg, 10 para USD/ton a partir de 100 kg base
+    label = manual_unit
+    chart_type = st.radio("Tipo de gráfico", ["Pastel", "Barras"], index=0)
+
+    def construir():
+        inclusion = pd.to_numeric(df_formula["% Inclusión"], errors="coerce")
+        precio = pd.to_numeric(df_formula["precio"], errors="coerce")
+        costos = (precio * inclusion / 100 * factor).fillna(0).to_numpy()
+        suma_inclusion = inclusion.sum()
+        proporciones = (inclusion * 100 / suma_inclusion).fillna(0).to_numpy() if suma_inclusion > 0 else np.zeros(len(costos))
+        fig = figura_costo(
+            chart_type, ingredientes_seleccionados, costos, proporciones,
+            [color_map[ing] for ing in ingredientes_seleccionados], label,
+        )
+        df_costos = pd.DataFrame({
+            "Ingrediente": ingredientes_seleccionados,
+            f"Costo aportado ({label})": [fmt2(c) for c in costos],
+            "% Inclusión": [fmt2(v) for v in df_formula["% Inclusión"]],
+            "Proporción dieta (%)": [fmt2(p) for p in proporciones],
+            "Precio ingrediente (USD/kg)": [fmt2(p) for p in df_formula["precio"]],
+        })
+        return fig, (fmt2_df(df_costos), costos.sum())
+
+    fig, (df_costos, suma_costos), n_bytes = FIGURAS.obtener((huella, "costo", chart_type, manual_unit), construir)
+    plotly_chart_medido(fig, "plot.costo_pastel" if chart_type == "Pastel" else "plot.costo_barras", n_bytes)
+    st.dataframe(df_costos, use_container_width=True)
+    st.markdown(f"**Costo total de la fórmula:** {fmt2(suma_costos)} {label} (suma de los ingredientes). Puedes cambiar la unidad.")
+
+@fragmento
+@timed("fragment.aporte_nutriente")
+def panel_aporte_nutriente(nut, unit, df_formula, ingredientes_seleccionados, color_map, huella):
+    manual_unit = unit_selector(
+        f"Unidad para {nut}",
+        OPCIONES_UNIDAD.get(unit, ["unidad", "100 unidades", "1000 unidades", "kg", "ton"]),
+        OPCIONES_UNIDAD.get(unit, ["unidad"])[0],
+        key=f"unit_selector_{nut}_aporte_tab1"
+    )
+    factor, label = get_unit_factor(unit, manual_unit)
+
+    def construir():
+        inclusion = pd.to_numeric(df_formula["% Inclusión"], errors="coerce").to_numpy()
+        tiene_columna = nut in df_formula.columns
+        contenido = pd.to_numeric(df_formula[nut], errors="coerce") if tiene_columna else pd.Series(np.nan, index=df_formula.index)
+        valores = contenido.fillna(0).to_numpy() * inclusion / 100 * factor
+        total_nut = valores.sum()
+        porc_aporte = 100 * valores / total_nut if total_nut > 0 else np.zeros(len(valores))
+        fig = figura_aporte(
+            nut, ingredientes_seleccionados, valores, porc_aporte,
+            [color_map[ing] for ing in ingredientes_seleccionados], label,
+        )
+        df_aporte = pd.DataFrame({
+            "Ingrediente": ingredientes_seleccionados,
+            f"Aporte de {nut} ({label})": [fmt2(v) for v in valores],
+            "% Inclusión": [fmt2(v) for v in df_formula["% Inclusión"]],
+            "Contenido por kg": [fmt2(c) for c in df_formula[nut]] if tiene_columna else "",
+            f"Proporción aporte {nut} (%)": [fmt2(p) for p in porc_aporte],
+        })
+        return fig, fmt2_df(df_aporte)
+
+    fig, df_aporte, n_bytes = FIGURAS.obtener((huella, "aporte", nut, manual_unit), construir)
+    plotly_chart_medido(fig, "plot.aporte_nutriente", n_bytes)
+    st.dataframe(df_aporte, use_container_width=True)
+    st.markdown(
+        f"Puedes ajustar la unidad para visualizar el aporte en la escala más útil para tu análisis."
+    )
+
+@fragmento
+@timed("fragment.precio_sombra")
+def panel_precio_sombra(nut, unit, df_formula, ingredientes_seleccionados, huella):
+    manual_unit = unit_selector(
+        f"Unidad para {nut}",
+        OPCIONES_UNIDAD.get(unit, ["unidad", "100 unidades", "1000 unidades", "kg", "ton"]),
+        OPCIONES_UNIDAD.get(unit, ["unidad"])[0],
+        key=f"unit_selector_{nut}_shadow_tab1"
+    )
+    factor, label = get_unit_factor(unit, manual_unit)
+
+    def construir():
+        if nut in df_formula.columns:
+            contenidos = pd.to_numeric(df_formula[nut], errors="coerce").to_numpy(dtype=float)
+        else:
+            contenidos = np.zeros(len(df_formula))
+        precios_ing = pd.to_numeric(df_formula["precio"], errors="coerce").to_numpy(dtype=float)
+        validos = ~np.isnan(contenidos) & (np.nan_to_num(contenidos) > 0) & ~np.isnan(precios_ing)
+        precios_unit = np.full(len(contenidos), np.nan)
+        precios_unit[validos] = precios_ing[validos] / contenidos[validos] * factor
+        min_idx = int(np.nanargmin(precios_unit)) if validos.any() else None
+        df_shadow = pd.DataFrame({
+            "Ingrediente": ingredientes_seleccionados,
+            f"Precio por {manual_unit}": [fmt2(v) if pd.notnull(v) else "" for v in precios_unit],
+            f"Contenido de {nut} por kg": [fmt2(c) for c in contenidos],
+            "Precio ingrediente (USD/kg)": [fmt2(p) for p in precios_ing],
+            "Es el más barato": ["✅" if i == min_idx else "" for i in range(len(precios_unit))],
+        })
+        fig = figura_precio_sombra(nut, ingredientes_seleccionados, precios_unit, min_idx, label)
+        return fig, fmt2_df(df_shadow)
+
+    fig_shadow, df_shadow, n_bytes = FIGURAS.obtener((huella, "precio_sombra", nut, manual_unit), construir)
+    plotly_chart_medido(fig_shadow, "plot.precio_sombra", n_bytes)
+    st.dataframe(df_shadow, use_container_width=True)
+    st.markdown(
+        f"**El precio sombra de {nut} es el menor costo posible para obtener una unidad de este nutriente usando el ingrediente más barato en la fórmula.**\n\n"
+        f"- Puedes ajustar la unidad para mejorar la visualización.\n"
+        f"- El ingrediente marcado con ✅ aporta el precio sombra."
+    )
+
 # ======================== BLOQUE 8: TAB GRÁFICOS DINÁMICOS ========================
-with tabs[2]:
+# Arma df_formula una vez por ejecución completa y se lo pasa a los paneles (fragmentos).
+# Estado compartido que lee (escrito por Formulación): last_diet, nutrientes_seleccionados
+# e ingredientes_clave/idx/ediciones (vía ingredientes_formulados_df).
+@timed("tab.graficos")
+def tab_graficos():
     st.header("Gráficos de la formulación")
 
     diet = st.session_state.get("last_diet", None)
-    nutritional_values = st.session_state.get("last_nutritional_values", {})
-    req_input = st.session_state.get("req_input", {})
     ingredientes_seleccionados = list(st.session_state.get("last_diet", {}).keys())
     nutrientes_seleccionados = st.session_state.get("nutrientes_seleccionados", [])
-    ingredients_df = st.session_state.get("ingredients_df", None)
-    total_cost = st.session_state.get("last_cost", 0)
+    ingredients_df = ingredientes_formulados_df()
     unidades_dict = get_unidades_dict(nutrientes_seleccionados)
 
     # Construye df_formula para uso en todos los subtabs
@@ -677,8 +1231,10 @@ with tabs[2]:
         df_formula["% Inclusión"] = df_formula["Ingrediente"].map(diet).fillna(0)
         df_formula["precio"] = df_formula["precio"].fillna(0)
         df_formula = df_formula[df_formula["Ingrediente"].isin(diet.keys())].reset_index(drop=True)
+        df_formula, _, _ = alinear_columnas(df_formula, nutrientes_seleccionados)
         ingredientes_seleccionados = list(df_formula["Ingrediente"])
         color_map = get_color_map(ingredientes_seleccionados)
+        huella = huella_formula(df_formula)
 
         # ==================== SUBTABS PRINCIPALES ====================
         subtab1, subtab2, subtab3 = st.tabs([
@@ -689,211 +1245,35 @@ with tabs[2]:
 
         # ---------- SUBTAB 1: Costo Total por Ingrediente ----------
         with subtab1:
-            manual_unit = unit_selector(
-                "Unidad para mostrar el costo total por ingrediente",
-                ['USD/kg', 'USD/ton'],
-                'USD/ton',
-                key="unit_selector_costototal_tab1"
-            )
-            factor = 1 if manual_unit == 'USD/kg' else 10  # 1 para USD/kg, 10 para USD/ton a partir de 100 kg base
-            label = manual_unit
-            costos = [
-                float(row["precio"]) * float(row["% Inclusión"]) / 100 * factor
-                if pd.notnull(row["precio"]) and pd.notnull(row["% Inclusión"]) else 0
-                for _, row in df_formula.iterrows()
-            ]
-            suma_costos = sum(costos)
-            suma_inclusion = sum(df_formula["% Inclusión"])
-            proporciones = [
-                float(row["% Inclusión"]) * 100 / suma_inclusion if suma_inclusion > 0 else 0
-                for _, row in df_formula.iterrows()
-            ]
-            chart_type = st.radio("Tipo de gráfico", ["Pastel", "Barras"], index=0)
-            if chart_type == "Pastel":
-                fig_pie = go.Figure(go.Pie(
-                    labels=ingredientes_seleccionados,
-                    values=costos,
-                    marker_colors=[color_map[ing] for ing in ingredientes_seleccionados],
-                    hoverinfo="label+percent+value",
-                    textinfo="label+percent",
-                    hole=0.3
-                ))
-                fig_pie.update_layout(title="Participación de cada ingrediente en el costo total")
-                st.plotly_chart(fig_pie, use_container_width=True)
-            else:
-                fig2 = go.Figure([go.Bar(
-                    x=ingredientes_seleccionados,
-                    y=costos,
-                    marker_color=[color_map[ing] for ing in ingredientes_seleccionados],
-                    text=[f"{fmt2(c)} {label}" for c in costos],
-                    textposition='auto',
-                    customdata=proporciones,
-                    hovertemplate='%{x}<br>Costo: %{y:.2f} ' + label + '<br>Proporción dieta: %{customdata:.2f}%<extra></extra>'
-                )])
-                fig2.update_layout(
-                    xaxis_title="Ingrediente",
-                    yaxis_title=f"Costo aportado ({label})",
-                    title=f"Costo total aportado por ingrediente ({label})",
-                    showlegend=False,
-                    template="simple_white"
-                )
-                st.plotly_chart(fig2, use_container_width=True)
-            df_costos = pd.DataFrame({
-                "Ingrediente": ingredientes_seleccionados,
-                f"Costo aportado ({label})": [fmt2(c) for c in costos],
-                "% Inclusión": [fmt2(row["% Inclusión"]) for _, row in df_formula.iterrows()],
-                "Proporción dieta (%)": [fmt2(p) for p in proporciones],
-                "Precio ingrediente (USD/kg)": [fmt2(row["precio"]) for _, row in df_formula.iterrows()],
-            })
-            st.dataframe(fmt2_df(df_costos), use_container_width=True)
-            st.markdown(f"**Costo total de la fórmula:** {fmt2(suma_costos)} {label} (suma de los ingredientes). Puedes cambiar la unidad.")
+            panel_costo_total(df_formula, ingredientes_seleccionados, color_map, huella)
 
         # ---------- SUBTAB 2: Aporte por Ingrediente a Nutrientes ----------
         with subtab2:
-            unit_options = {
-                'kg': ['kg', 'ton'],
-                'g': ['g', '100g', 'kg', 'ton'],
-                'kcal': ['kcal', '1000kcal'],
-                '%': ['%', '100 unidades'],
-                'unidad': ['unidad', '100 unidades', '1000 unidades', 'kg', 'ton'],
-            }
             if nutrientes_seleccionados:
                 nut_tabs = st.tabs([nut for nut in nutrientes_seleccionados])
                 for i, nut in enumerate(nutrientes_seleccionados):
                     with nut_tabs[i]:
-                        unit = unidades_dict.get(nut, "unidad")
-                        manual_unit = unit_selector(
-                            f"Unidad para {nut}",
-                            unit_options.get(unit, ["unidad", "100 unidades", "1000 unidades", "kg", "ton"]),
-                            unit_options.get(unit, ["unidad"])[0],
-                            key=f"unit_selector_{nut}_aporte_tab1"
-                        )
-                        factor, label = get_unit_factor(unit, manual_unit)
-                        valores = []
-                        porc_aporte = []
-                        total_nut = sum([
-                            (float(df_formula.loc[df_formula["Ingrediente"] == ing, nut].values[0]) *
-                             float(df_formula[df_formula["Ingrediente"] == ing]["% Inclusión"].values[0]) / 100 * factor)
-                            if nut in df_formula.columns and
-                               pd.notnull(df_formula.loc[df_formula["Ingrediente"] == ing, nut].values[0]) else 0
-                            for ing in ingredientes_seleccionados
-                        ])
-                        for ing in ingredientes_seleccionados:
-                            valor = float(df_formula.loc[df_formula["Ingrediente"] == ing, nut].values[0]) \
-                                if nut in df_formula.columns and pd.notnull(df_formula.loc[df_formula["Ingrediente"] == ing, nut].values[0]) else 0
-                            porc = float(df_formula[df_formula["Ingrediente"] == ing]["% Inclusión"].values[0])
-                            aporte = valor * porc / 100 * factor
-                            valores.append(aporte)
-                            porc_aporte.append(100 * aporte / total_nut if total_nut > 0 else 0)
-                        df_aporte = pd.DataFrame({
-                            "Ingrediente": ingredientes_seleccionados,
-                            f"Aporte de {nut} ({label})": [fmt2(v) for v in valores],
-                            "% Inclusión": [fmt2(df_formula[df_formula["Ingrediente"] == ing]["% Inclusión"].values[0]) for ing in ingredientes_seleccionados],
-                            "Contenido por kg": [fmt2(df_formula[df_formula["Ingrediente"] == ing][nut].values[0]) if nut in df_formula.columns else "" for ing in ingredientes_seleccionados],
-                            f"Proporción aporte {nut} (%)": [fmt2(p) for p in porc_aporte],
-                        })
-                        fig = go.Figure()
-                        fig.add_trace(go.Bar(
-                            x=ingredientes_seleccionados,
-                            y=valores,
-                            marker_color=[color_map[ing] for ing in ingredientes_seleccionados],
-                            text=[fmt2(v) for v in valores],
-                            textposition='auto',
-                            customdata=porc_aporte,
-                            hovertemplate='%{x}<br>Aporte: %{y:.2f} ' + label + '<br>Proporción aporte: %{customdata:.2f}%<extra></extra>',
-                        ))
-                        fig.update_layout(
-                            xaxis_title="Ingrediente",
-                            yaxis_title=f"Aporte de {nut} ({label})",
-                            title=f"Aporte de cada ingrediente a {nut} ({label})",
-                            template="simple_white"
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                        st.dataframe(fmt2_df(df_aporte), use_container_width=True)
-                        st.markdown(
-                            f"Puedes ajustar la unidad para visualizar el aporte en la escala más útil para tu análisis."
+                        panel_aporte_nutriente(
+                            nut, unidades_dict.get(nut, "unidad"), df_formula, ingredientes_seleccionados, color_map, huella
                         )
             else:
                 st.info("Selecciona al menos un nutriente para visualizar los aportes por ingrediente.")
 
-              # ---------- SUBTAB 3: Precio sombra por nutriente ----------
+        # ---------- SUBTAB 3: Precio sombra por nutriente ----------
         with subtab3:
-            unit_options = {
-                'kg': ['kg', 'ton'],
-                'g': ['g', '100g', 'kg', 'ton'],
-                'kcal': ['kcal', '1000kcal'],
-                '%': ['%', '100 unidades'],
-                'unidad': ['unidad', '100 unidades', '1000 unidades', 'kg', 'ton'],
-            }
             if nutrientes_seleccionados:
                 shadow_tab = st.tabs([nut for nut in nutrientes_seleccionados])
                 for idx, nut in enumerate(nutrientes_seleccionados):
                     with shadow_tab[idx]:
-                        unit = unidades_dict.get(nut, "unidad")
-                        manual_unit = unit_selector(
-                            f"Unidad para {nut}",
-                            unit_options.get(unit, ["unidad", "100 unidades", "1000 unidades", "kg", "ton"]),
-                            unit_options.get(unit, ["unidad"])[0],
-                            key=f"unit_selector_{nut}_shadow_tab1"
-                        )
-                        factor, label = get_unit_factor(unit, manual_unit)
-                        precios_unit = []
-                        contenidos = []
-                        precios_ing = []
-                        for i, ing in enumerate(ingredientes_seleccionados):
-                            row = df_formula[df_formula["Ingrediente"] == ing].iloc[0]
-                            contenido = float(row.get(nut, 0))
-                            precio = float(row.get("precio", np.nan))
-                            if pd.notnull(contenido) and contenido > 0 and pd.notnull(precio):
-                                precios_unit.append(precio / contenido * factor)
-                            else:
-                                precios_unit.append(np.nan)
-                            contenidos.append(contenido)
-                            precios_ing.append(precio)
-                        df_shadow = pd.DataFrame({
-                            "Ingrediente": ingredientes_seleccionados,
-                            f"Precio por {manual_unit}": [fmt2(v) if pd.notnull(v) else "" for v in precios_unit],
-                            f"Contenido de {nut} por kg": [fmt2(c) for c in contenidos],
-                            "Precio ingrediente (USD/kg)": [fmt2(p) for p in precios_ing],
-                        })
-                        precios_unit_np = np.array([v if pd.notnull(v) else np.inf for v in precios_unit])
-                        # FIX: verifica si hay algún valor finito antes de nanargmin
-                        if len(precios_unit_np) > 0 and np.isfinite(precios_unit_np).any():
-                            min_idx = int(np.nanargmin(precios_unit_np))
-                            df_shadow["Es el más barato"] = ["✅" if i == min_idx else "" for i in range(len(df_shadow))]
-                            bar_colors = ['green' if i == min_idx else 'royalblue' for i in range(len(df_shadow))]
-                        else:
-                            min_idx = None
-                            df_shadow["Es el más barato"] = ["" for _ in range(len(df_shadow))]
-                            bar_colors = ['royalblue' for _ in range(len(df_shadow))]
-                        fig_shadow = go.Figure()
-                        fig_shadow.add_trace(go.Bar(
-                            x=df_shadow["Ingrediente"],
-                            y=[v if pd.notnull(v) else 0 for v in precios_unit],
-                            marker_color=bar_colors,
-                            text=[fmt2(v) if pd.notnull(v) else "" for v in precios_unit],
-                            textposition='auto',
-                            customdata=df_shadow["Es el más barato"],
-                            hovertemplate=f'%{{x}}<br>Precio sombra: %{{y:.2f}} {label}<br>%{{customdata}}<extra></extra>',
-                        ))
-                        fig_shadow.update_layout(
-                            xaxis_title="Ingrediente",
-                            yaxis_title=label,
-                            title=f"Precio sombra y costo por ingrediente para {nut}",
-                            template="simple_white"
-                        )
-                        st.plotly_chart(fig_shadow, use_container_width=True)
-                        st.dataframe(fmt2_df(df_shadow), use_container_width=True)
-                        st.markdown(
-                            f"**El precio sombra de {nut} es el menor costo posible para obtener una unidad de este nutriente usando el ingrediente más barato en la fórmula.**\n\n"
-                            f"- Puedes ajustar la unidad para mejorar la visualización.\n"
-                            f"- El ingrediente marcado con ✅ aporta el precio sombra."
-                        )
+                        panel_precio_sombra(nut, unidades_dict.get(nut, "unidad"), df_formula, ingredientes_seleccionados, huella)
             else:
                 st.info("Selecciona al menos un nutriente para visualizar el precio sombra por ingrediente.")
 
+with tabs[2]:
+    tab_graficos()
+
 # ======================== BLOQUE 9: RESUMEN Y EXPORTAR (ESTILO UNIFICADO) ========================
-with tabs[3]:
+with tabs[3], span("tab.resumen"):
     st.header("Resumen general y exportación")
 
     # --- CSS de tabla bonita (igual que requerimientos) ---
@@ -962,18 +1342,12 @@ with tabs[3]:
     st.subheader("Perfil de la mascota")
     cols = st.columns([1, 3])
     with cols[0]:
-        foto_path = mascota.get("foto", None)
-        from PIL import Image
-        import io
-
+        # Miniatura JPEG que guarda el formulario de perfil (ui.show_mascota_form)
+        foto = st.session_state.get("foto_mascota_bytes")
         foto_ok = False
-        if foto_path:
+        if foto:
             try:
-                if isinstance(foto_path, bytes):
-                    img = Image.open(io.BytesIO(foto_path))
-                else:
-                    img = Image.open(foto_path)
-                st.image(img, width=130)
+                st.image(foto, width=130)
                 foto_ok = True
             except Exception:
                 foto_ok = False
@@ -991,21 +1365,10 @@ with tabs[3]:
     # === 2. Dieta (proporciones y gramos) ===
     st.subheader("Composición de la dieta formulada")
     result = st.session_state.get("last_result", None)
-    diet = result.get("diet", {}) if result is not None else {}
     dosis_g = st.session_state.get("dosis_dieta_g_formulacion", 1000)
-    ingredientes_df_filtrado = st.session_state.get("ingredients_df", None)
-    ingredientes_sel = list(ingredientes_df_filtrado["Ingrediente"]) if ingredientes_df_filtrado is not None and "Ingrediente" in ingredientes_df_filtrado.columns else []
-
-    comp_data = []
-    for ing in ingredientes_sel:
-        porcentaje = diet.get(ing, 0.0)
-        gramos = (porcentaje / 100.0) * dosis_g
-        comp_data.append({
-            "Ingrediente": ing,
-            "% Inclusión": fmt2(porcentaje),
-            "Gramos en dosis": fmt2(gramos)
-        })
-    res_df = pd.DataFrame(comp_data)
+    ingredientes_sel = ingredientes_formulados()
+
+    res_df = tabla_composicion(result, ingredientes_sel, dosis_g)
 
     # Render tabla HTML bonita
     if not res_df.empty and "Ingrediente" in res_df.columns:
@@ -1095,8 +1458,6 @@ with tabs[3]:
     # === 6. Exportar a Excel ===
     st.subheader("Exportar resumen a Excel")
 
-    import io
-    import pandas as pd
 
     perfil_df = pd.DataFrame([mascota])
     dieta_df = res_df
@@ -1121,3 +1482,5 @@ with tabs[3]:
         file_name="Resumen_dieta_uywa.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
+
+PERF_REGISTRY.registrar("app.rerun", time.perf_counter() - _INICIO_SCRIPT)
@@ -0,0 +1,348 @@
+"""
+Formulación por lotes desde línea de comandos (sin navegador).
+
+Para cada mascota:
+  1. calcula el MER con calcular_mer,
+  2. deriva los requerimientos ajustados a la energía desde la tabla de referencia de su
+     especie y etapa (reference_registry),
+  3. los pasa a requerimientos por kg de dieta según la dosis diaria,
+  4. formula con DietFormulator,
+y escribe todos los resultados en un único archivo columnar (una fila por mascota, una
+columna por ingrediente y por nutriente). El formato sale de la extensión de la salida:
+.parquet (por defecto) o .feather con pyarrow, o .csv.
+
+Perfiles de mascota:
+  - Directorio con archivos .json (formato de profile.py con clave "mascota", o el dict
+    de la mascota directamente). El id de cada mascota es el nombre del archivo.
+  - Archivo .csv con columnas especie, condicion, edad, peso y opcionalmente enfermedad,
+    id o nombre (mismos campos que data.PerfilMascota).
+Una mascota sin edad o sin peso no se formula con valores supuestos: su fila queda con
+estado "error".
+
+Uso:
+    python batch_formulate.py ingredientes.csv perfiles/ -o resultados.parquet --jobs 8
+    python batch_formulate.py ingredientes.xlsx pacientes.csv -o resultados.parquet --resume
+
+Las filas se escriben a medida que terminan en un archivo de avance (<salida>.avance.csv,
+por filas) y al final se consolidan en la salida. Con --resume se omiten las mascotas ya
+formuladas con éxito (en la salida o en el avance de una corrida interrumpida); las que
+quedaron con error o fallo se vuelven a formular y su fila se reemplaza.
+
+Con --canil TOL (modo canil, ver kennel.py) los animales se agrupan en pocas fórmulas
+compartidas y se formula una vez por grupo; la salida tiene una fila por mascota con su
+grupo, la dosis diaria (g/día) de la fórmula del grupo y sus inclusiones:
+    python batch_formulate.py ingredientes.csv refugio.csv -o canil.parquet --canil 0.1
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from data import PerfilMascota, load_ingredients, limpiar_matriz_ingredientes
+from energy_requirements import calcular_mer
+from nutrient_adjustment import requerimientos_para_mascota, requerimientos_por_kg_dieta
+from reference_registry import REGISTRO
+from optimization import DietFormulator
+
+COLUMNAS_CANIL = [
+    "id", "grupo", "estado", "mensaje", "especie", "condicion", "edad", "peso",
+    "mer_kcal", "dosis_g", "energia_kcal", "nutriente_limitante", "costo_100kg",
+]
+COLUMNAS_BASE = ["id", "estado", "mensaje", "especie", "condicion", "edad", "peso", "mer_kcal", "costo_100kg", "tiempo_s"]
+
+# --- Lectura de entradas ---
+def cargar_matriz(ruta, ingredientes=None):
+    with open(ruta, "rb") as f:
+        df = load_ingredients(f)
+    if df.empty:
+        raise ValueError(f"No se pudo cargar la matriz de ingredientes: {ruta}")
+    df = limpiar_matriz_ingredientes(df)
+    if ingredientes:
+        faltantes = [ing for ing in ingredientes if ing not in set(df["Ingrediente"])]
+        if faltantes:
+            raise ValueError(f"Ingredientes no encontrados en la matriz: {', '.join(faltantes)}")
+        df = df[df["Ingrediente"].isin(ingredientes)]
+    return df.reset_index(drop=True)
+
+def _numero(valor):
+    # Vacío -> None; un texto no numérico se conserva y validar_perfil lo rechaza
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return valor
+
+def _perfil_desde_dict(datos):
+    datos = datos.get("mascota", datos)
+    return PerfilMascota(
+        especie=datos.get("especie", "perro"),
+        condicion=datos.get("condicion", "adulto_entero"),
+        edad=_numero(datos.get("edad")),
+        peso=_numero(datos.get("peso")),
+        enfermedad=datos.get("enfermedad") or None,
+    )
+
+def validar_perfil(perfil):
+    """Lanza ValueError si falta la edad o el peso, o si no son números positivos."""
+    for campo in ("edad", "peso"):
+        valor = getattr(perfil, campo)
+        if valor is None:
+            raise ValueError(f"Falta {campo} en el perfil")
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not valor > 0:
+            raise ValueError(f"{campo.capitalize()} inválido en el perfil: {valor}")
+
+def cargar_perfiles(ruta):
+    """Retorna lista de (id, PerfilMascota) desde un directorio de .json o un .csv."""
+    perfiles = []
+    if os.path.isdir(ruta):
+        for nombre in sorted(os.listdir(ruta)):
+            if nombre.lower().endswith(".json"):
+                with open(os.path.join(ruta, nombre), "r") as f:
+                    perfiles.append((os.path.splitext(nombre)[0], _perfil_desde_dict(json.load(f))))
+    else:
+        df = pd.read_csv(ruta, sep=None, engine="python")
+        df.columns = df.columns.str.strip()
+        for n, row in enumerate(df.to_dict("records")):
+            datos = {k: v for k, v in row.items() if not (isinstance(v, float) and math.isnan(v))}
+            pet_id = datos.get("id", datos.get("nombre", n))
+            perfiles.append((str(pet_id), _perfil_desde_dict(datos)))
+    ids = [pet_id for pet_id, _ in perfiles]
+    if len(ids) != len(set(ids)):
+        raise ValueError("Los ids de mascota deben ser únicos para poder reanudar la corrida.")
+    return perfiles
+
+def ruta_avance(ruta_salida):
+    return ruta_salida + ".avance.csv"
+
+def leer_salida(ruta):
+    """Lee una salida o un archivo de avance según su extensión; DataFrame vacío si no existe."""
+    if not os.path.exists(ruta):
+        return pd.DataFrame()
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".parquet":
+        df = pd.read_parquet(ruta)
+    elif extension == ".feather":
+        df = pd.read_feather(ruta)
+    else:
+        df = pd.read_csv(ruta, dtype={"id": str, "estado": str, "mensaje": str})
+    if "id" in df.columns:
+        df["id"] = df["id"].astype(str)
+    return df
+
+def escribir_salida(df, ruta):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".parquet":
+        df.to_parquet(ruta, index=False)
+    elif extension == ".feather":
+        df.reset_index(drop=True).to_feather(ruta)
+    else:
+        df.to_csv(ruta, index=False)
+
+def filas_previas(ruta_salida):
+    """Filas de corridas anteriores: la salida consolidada más el avance de una corrida interrumpida."""
+    previas = [df for df in (leer_salida(ruta_salida), leer_salida(ruta_avance(ruta_salida))) if not df.empty]
+    if not previas:
+        return pd.DataFrame()
+    return pd.concat(previas, ignore_index=True).drop_duplicates("id", keep="last")
+
+def ids_completados(previas):
+    """Ids formulados con éxito; las mascotas con error o fallo se vuelven a formular."""
+    if previas.empty:
+        return set()
+    return set(previas.loc[previas["estado"] == "ok", "id"])
+
+# --- Formulación de una mascota (se ejecuta en los workers) ---
+_CONTEXTO = {}
+
+def _init_worker(ingredientes_df, dosis_g):
+    import pulp
+
+    _CONTEXTO["ingredientes_df"] = ingredientes_df
+    _CONTEXTO["dosis_g"] = dosis_g
+    _CONTEXTO["solver"] = pulp.PULP_CBC_CMD(msg=False)
+
+def formular_mascota(pet_id, perfil):
+    inicio = time.perf_counter()
+    ingredientes_df = _CONTEXTO["ingredientes_df"]
+    fila = {"id": pet_id, **perfil.to_dict()}
+    fila.pop("enfermedad", None)
+    try:
+        validar_perfil(perfil)
+        energia = calcular_mer(perfil.especie, perfil.condicion, perfil.peso, edad_meses=perfil.edad * 12)
+        fila["mer_kcal"] = round(energia, 2) if energia else ""
+        requerimientos = requerimientos_por_kg_dieta(
+            requerimientos_para_mascota(energia, perfil.especie, perfil.condicion)[0],
+            _CONTEXTO["dosis_g"],
+        )
+        formulator = DietFormulator(
+            ingredientes_df,
+            list(requerimientos.keys()),
+            requerimientos,
+            solver=_CONTEXTO["solver"],
+        )
+        result = formulator.solve()
+        if result.get("success", False):
+            sin_columna = result.get("nutrientes_sin_columna", [])
+            mensaje = f"Requerimientos sin columna en la matriz: {', '.join(sin_columna)}" if sin_columna else ""
+            fila.update({"estado": "ok", "mensaje": mensaje, "costo_100kg": result["cost"]})
+            fila.update({f"inc_{ing}": val for ing, val in result["diet"].items()})
+            fila.update({f"nut_{nut}": val for nut, val in result["nutritional_values"].items()})
+        else:
+            fila.update({"estado": "fallo", "mensaje": result.get("message", "")})
+    except Exception as e:
+        fila.update({"estado": "error", "mensaje": f"{type(e).__name__}: {e}"})
+    fila["tiempo_s"] = round(time.perf_counter() - inicio, 4)
+    return fila
+
+# --- Ejecución del lote ---
+def columnas_salida(ingredientes_df):
+    return (
+        COLUMNAS_BASE
+        + [f"inc_{ing}" for ing in ingredientes_df["Ingrediente"]]
+        + [f"nut_{nut}" for nut in REGISTRO.nutrientes]
+    )
+
+def ejecutar_lote(ingredientes_df, perfiles, ruta_salida, dosis_g=1000, jobs=1, reanudar=False):
+    previas = filas_previas(ruta_salida) if reanudar else pd.DataFrame()
+    completados = ids_completados(previas)
+    pendientes = [(pet_id, perfil) for pet_id, perfil in perfiles if pet_id not in completados]
+    columnas = columnas_salida(ingredientes_df)
+    avance = ruta_avance(ruta_salida)
+    modo = "a" if reanudar and os.path.exists(avance) else "w"
+    inicio = time.perf_counter()
+    filas = []
+    with open(avance, modo, newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columnas, restval="", extrasaction="ignore")
+        if modo == "w":
+            writer.writeheader()
+
+        def escribir(fila):
+            writer.writerow(fila)
+            f.flush()
+            filas.append(fila)
+
+        if jobs <= 1:
+            _init_worker(ingredientes_df, dosis_g)
+            for pet_id, perfil in pendientes:
+                escribir(formular_mascota(pet_id, perfil))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker, initargs=(ingredientes_df, dosis_g)
+            ) as pool:
+                futuros = [pool.submit(formular_mascota, pet_id, perfil) for pet_id, perfil in pendientes]
+                for futuro in as_completed(futuros):
+                    escribir(futuro.result())
+    # Consolidación: la última fila de cada id gana (un reintento reemplaza al error anterior)
+    partes = [df for df in (previas, leer_salida(avance)) if not df.empty]
+    consolidado = pd.concat(partes, ignore_index=True).drop_duplicates("id", keep="last") if partes else pd.DataFrame()
+    escribir_salida(consolidado.reindex(columns=columnas), ruta_salida)
+    os.remove(avance)
+    return resumen_lote(filas, omitidas=len(perfiles) - len(pendientes), tiempo_total=time.perf_counter() - inicio)
+
+def resumen_lote(filas, omitidas, tiempo_total):
+    tiempos = sorted(f["tiempo_s"] for f in filas)
+    fallidas = [f for f in filas if f["estado"] != "ok"]
+    p95 = tiempos[min(len(tiempos) - 1, int(math.ceil(0.95 * len(tiempos))) - 1)] if tiempos else 0.0
+    return {
+        "procesadas": len(filas),
+        "ok": len(filas) - len(fallidas),
+        "fallidas": len(fallidas),
+        "omitidas": omitidas,
+        "tiempo_total_s": round(tiempo_total, 2),
+        "tiempo_medio_s": round(sum(tiempos) / len(tiempos), 4) if tiempos else 0.0,
+        "tiempo_p95_s": p95,
+        "mascotas_por_s": round(len(filas) / tiempo_total, 2) if tiempo_total > 0 else 0.0,
+        "detalle_fallidas": [(f["id"], f["estado"], f["mensaje"]) for f in fallidas],
+    }
+
+def ejecutar_canil(ingredientes_df, perfiles, ruta_salida, dosis_g=1000, tolerancia=0.1):
+    import pulp
+
+    from kennel import formular_canil
+
+    canil = formular_canil(
+        ingredientes_df, perfiles, tolerancia=tolerancia, dosis_g=dosis_g, solver=pulp.PULP_CBC_CMD(msg=False)
+    )
+    mascotas = canil["mascotas"]
+    costos = {g["grupo"]: g["result"].get("cost", "") for g in canil["grupos"]}
+    mascotas["costo_100kg"] = mascotas["grupo"].map(costos)
+    inclusiones = pd.DataFrame(
+        {g["grupo"]: {f"inc_{ing}": val for ing, val in g["result"].get("diet", {}).items()} for g in canil["grupos"]}
+    ).T
+    salida = mascotas.join(inclusiones, on="grupo").reindex(
+        columns=COLUMNAS_CANIL + [f"inc_{ing}" for ing in ingredientes_df["Ingrediente"]]
+    )
+    escribir_salida(salida, ruta_salida)
+    return canil
+
+def imprimir_resumen_canil(canil, max_fallidas=20):
+    mascotas = canil["mascotas"]
+    fallidas = mascotas[mascotas["estado"] != "ok"]
+    print(
+        f"Mascotas: {len(mascotas)} (ok: {len(mascotas) - len(fallidas)}, fallidas: {len(fallidas)}) | "
+        f"fórmulas: {canil['n_formulas']} | tiempo total: {canil['tiempo_s']:.2f} s"
+    )
+    for g in canil["grupos"]:
+        print(
+            f"  Grupo {g['grupo']} ({'/'.join(g['tabla'])}): {len(g['animales'])} animales, "
+            f"MER {g['mer_kcal'][0]:.0f}-{g['mer_kcal'][1]:.0f} kcal/día, costo {g['result'].get('cost', '-')}"
+        )
+    for fila in fallidas.head(max_fallidas).itertuples():
+        print(f"  [{fila.estado}] {fila.id}: {fila.mensaje}")
+    if len(fallidas) > max_fallidas:
+        print(f"  ... y {len(fallidas) - max_fallidas} más")
+
+def imprimir_resumen(resumen, max_fallidas=20):
+    print(
+        f"Procesadas: {resumen['procesadas']} (ok: {resumen['ok']}, fallidas: {resumen['fallidas']}, "
+        f"omitidas por --resume: {resumen['omitidas']})"
+    )
+    print(
+        f"Tiempo total: {resumen['tiempo_total_s']} s | por mascota: media {resumen['tiempo_medio_s']} s, "
+        f"p95 {resumen['tiempo_p95_s']} s | {resumen['mascotas_por_s']} mascotas/s"
+    )
+    for pet_id, estado, mensaje in resumen["detalle_fallidas"][:max_fallidas]:
+        print(f"  [{estado}] {pet_id}: {mensaje}")
+    if len(resumen["detalle_fallidas"]) > max_fallidas:
+        print(f"  ... y {len(resumen['detalle_fallidas']) - max_fallidas} más")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Formulación por lotes de dietas para perfiles de mascotas.")
+    parser.add_argument("ingredientes", help="Matriz de ingredientes (.csv con ';' o .xlsx)")
+    parser.add_argument("perfiles", help="Directorio de perfiles .json o archivo .csv de mascotas")
+    parser.add_argument(
+        "-o", "--output", default="resultados_lote.parquet",
+        help="Archivo de salida (.parquet o .feather con pyarrow, o .csv)",
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="Número de procesos en paralelo")
+    parser.add_argument("--dosis-g", type=float, default=1000, help="Dosis diaria de dieta (g/día)")
+    parser.add_argument("--ingredientes-sel", default="", help="Lista de ingredientes a usar, separados por coma")
+    parser.add_argument("--resume", action="store_true", help="Omitir mascotas ya formuladas con éxito en la salida")
+    parser.add_argument(
+        "--canil", type=float, default=None, metavar="TOL",
+        help="Modo canil: agrupar mascotas en fórmulas compartidas con exceso máximo TOL (ej. 0.1 = 10%%)",
+    )
+    args = parser.parse_args(argv)
+
+    seleccion = [ing.strip() for ing in args.ingredientes_sel.split(",") if ing.strip()]
+    ingredientes_df = cargar_matriz(args.ingredientes, seleccion)
+    perfiles = cargar_perfiles(args.perfiles)
+    if args.canil is not None:
+        canil = ejecutar_canil(ingredientes_df, perfiles, args.output, dosis_g=args.dosis_g, tolerancia=args.canil)
+        imprimir_resumen_canil(canil)
+        return 0 if canil["success"] else 1
+    resumen = ejecutar_lote(
+        ingredientes_df, perfiles, args.output, dosis_g=args.dosis_g, jobs=args.jobs, reanudar=args.resume
+    )
+    imprimir_resumen(resumen)
+    return 1 if resumen["fallidas"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
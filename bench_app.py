@@ -0,0 +1,267 @@
+"""
+Latencia de los reruns de app.py en los flujos reales, sin navegador.
+
+Usa el modo de pruebas de Streamlit (streamlit.testing.v1.AppTest): el script corre en
+este mismo proceso, así que el registro de perf (perf.REGISTRY) es el de la app. Cada
+repetición abre una sesión nueva y ejecuta los pasos:
+
+    inicio           primera ejecución (pantalla de login; termina con st.stop() antes del
+                     span "app.rerun", así que solo tiene tiempo de pared)
+    login            usuario de auth.USERS_DB
+    perfil           formulario de la mascota y "Guardar perfil de mascota"
+    matriz           carga de una matriz de ingredientes sintética (CSV ; latin1)
+    seleccion        ingredientes por categoría
+    formular         botón de formulación y reruns hasta que el trabajo termina
+    grafico_barras / grafico_pastel   tipo de gráfico del costo total
+    unidad_costo     USD/kg en el costo total
+    unidad_aporte / unidad_sombra     segunda unidad del primer nutriente en Gráficos
+
+Por paso se registra el tiempo de pared, el tiempo de ejecución del script (suma de los
+spans "app.rerun" del paso), el número de reruns y las invocaciones del solver (contador
+"solver.invocations"). Se reporta la mediana de las repeticiones.
+
+Uso:
+    python bench_app.py                                  # 3 repeticiones, 40 ingredientes
+    python bench_app.py --max-ms 3000                    # falla si un paso supera 3 s de script
+    python bench_app.py --guardar base.json              # guarda las medianas como referencia
+    python bench_app.py --baseline base.json --tolerancia 1.5
+
+Retorna código 1 si la app lanza una excepción, si un paso que no formula llama al
+solver, si la formulación no termina con éxito o si el tiempo de script de un paso supera
+--max-ms o la referencia x --tolerancia (más --margen-ms, para los pasos muy cortos).
+El perfil de la mascota que escribe la app (<nombre>_profile.json) se restaura al final.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(DIRECTORIO, "app.py")
+USUARIO = "demo"
+CATEGORIAS = ["Proteinas", "Carbohidratos", "Grasas", "Vegetales", "Frutas", "Otros"]
+POR_CATEGORIA = 2  # ingredientes seleccionados de cada categoría
+MAX_RERUNS_FORMULACION = 120
+PASOS_SOLVER = {"formular"}  # únicos pasos que pueden llamar al solver
+
+def matriz_sintetica(n_ingredientes=40, semilla=0):
+    """CSV (bytes, ';' y latin1 como las matrices de los usuarios) con los nutrientes de referencia del perro."""
+    from nutrient_reference import NUTRIENTES_REFERENCIA_PERRO
+
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for i in range(n_ingredientes):
+        fila = {
+            "Ingrediente": f"Ing {i}",
+            "Categoría": CATEGORIAS[i % len(CATEGORIAS)],
+            "precio": round(rng.uniform(0.3, 5), 2),
+            "Materia seca (%)": 90,
+        }
+        for nut, info in NUTRIENTES_REFERENCIA_PERRO.items():
+            base = info["min"] or 1
+            escala = 0.3 if info["unit"] == "kcal/kg" else 1
+            fila[nut] = round(base * rng.uniform(0, 6) / escala, 4)
+        filas.append(fila)
+    return pd.DataFrame(filas).to_csv(sep=";", index=False).encode("latin1")
+
+def preparar():
+    """Directorio y logging para ejecutar app.py con AppTest (la app lee assets/ del directorio actual)."""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)  # avisos de deprecación de cada rerun
+    os.chdir(DIRECTORIO)
+    if DIRECTORIO not in sys.path:
+        sys.path.insert(0, DIRECTORIO)
+
+@contextmanager
+def perfil_preservado():
+    """Restaura (o elimina) al salir el <nombre>_profile.json que escribe el paso perfil."""
+    from auth import USERS_DB
+
+    archivo = os.path.join(DIRECTORIO, f"{USERS_DB[USUARIO]['name']}_profile.json")
+    original = open(archivo, "rb").read() if os.path.exists(archivo) else None
+    try:
+        yield
+    finally:
+        if original is None:
+            if os.path.exists(archivo):
+                os.remove(archivo)
+        else:
+            with open(archivo, "wb") as f:
+                f.write(original)
+
+def _por_etiqueta(widgets, etiqueta):
+    return next(w for w in widgets if w.label == etiqueta)
+
+class Sesion:
+    """Una sesión de AppTest con la medición de cada paso."""
+
+    def __init__(self, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.pasos = []
+
+    def paso(self, nombre, accion=None, hasta=None):
+        """Aplica accion(at), ejecuta el script y repite mientras hasta(at) sea falso."""
+        from perf import REGISTRY
+
+        reruns_antes = _rerun_totales(REGISTRY)
+        solver_antes = REGISTRY.contadores().get("solver.invocations", 0)
+        inicio = time.perf_counter()
+        if accion is not None:
+            accion(self.at)
+        self.at.run()
+        intentos = 0
+        while hasta is not None and not hasta(self.at) and intentos < MAX_RERUNS_FORMULACION:
+            time.sleep(0.1)
+            self.at.run()
+            intentos += 1
+        pared = time.perf_counter() - inicio
+        n, total = (a - b for a, b in zip(_rerun_totales(REGISTRY), reruns_antes))
+        self.pasos.append({
+            "paso": nombre,
+            "pared_ms": pared * 1000,
+            "script_ms": total * 1000,
+            "reruns": n,
+            "solver": REGISTRY.contadores().get("solver.invocations", 0) - solver_antes,
+            "excepciones": [e.value for e in self.at.exception],
+        })
+        return self.at
+
+def _rerun_totales(registro):
+    for fila in registro.resumen():
+        if fila["span"] == "app.rerun":
+            return fila["count"], fila["total_s"]
+    return 0, 0.0
+
+def flujo(matriz, timeout=120):
+    """Ejecuta el flujo completo en una sesión nueva. Retorna (pasos, resultado de la formulación)."""
+    from auth import USERS_DB
+
+    s = Sesion(timeout)
+    s.paso("inicio")
+
+    def login(at):
+        at.text_input(key="usuario_login").input(USUARIO)
+        at.text_input(key="password_login").input(USERS_DB[USUARIO]["password"])
+        at.button(key="entrar_login").click()
+    s.paso("login", login)
+
+    def perfil(at):
+        _por_etiqueta(at.text_input, "Nombre de la mascota").input("Firulais")
+        _por_etiqueta(at.selectbox, "Especie").select("perro")
+        _por_etiqueta(at.number_input, "Edad (años)").set_value(4.0)
+        _por_etiqueta(at.number_input, "Peso (kg)").set_value(18.0)
+        _por_etiqueta(at.selectbox, "Condición").select("adulto_entero")
+        _por_etiqueta(at.button, "Guardar perfil de mascota").click()
+    s.paso("perfil", perfil)
+
+    s.paso("matriz", lambda at: at.file_uploader(key="uploader_ingredientes").upload("matriz.csv", matriz, "text/csv"))
+
+    def seleccion(at):
+        for cat in CATEGORIAS:
+            claves = [w for w in at.multiselect if w.key == f"multiselect_{cat}_formulacion"]
+            if claves:
+                claves[0].set_value(claves[0].options[:POR_CATEGORIA])
+    s.paso("seleccion", seleccion)
+
+    s.paso(
+        "formular",
+        lambda at: at.button(key="btn_formular_dieta_auto").click(),
+        hasta=lambda at: "formulation_job_id" not in at.session_state and "last_result" in at.session_state,
+    )
+    resultado = s.at.session_state["last_result"] if "last_result" in s.at.session_state else None
+
+    if resultado is not None and resultado.get("success", False):
+        s.paso("grafico_barras", lambda at: _por_etiqueta(at.radio, "Tipo de gráfico").set_value("Barras"))
+        s.paso("grafico_pastel", lambda at: _por_etiqueta(at.radio, "Tipo de gráfico").set_value("Pastel"))
+        s.paso("unidad_costo", lambda at: at.selectbox(key="unit_selector_costototal_tab1").set_value("USD/kg"))
+        for nombre, sufijo in (("unidad_aporte", "_aporte_tab1"), ("unidad_sombra", "_shadow_tab1")):
+            selectores = [w for w in s.at.selectbox if w.key and w.key.startswith("unit_selector_") and w.key.endswith(sufijo)]
+            if selectores and len(selectores[0].options) > 1:
+                clave, opcion = selectores[0].key, selectores[0].options[1]
+                s.paso(nombre, lambda at, clave=clave, opcion=opcion: at.selectbox(key=clave).set_value(opcion))
+    return s.pasos, resultado
+
+def medianas(repeticiones):
+    """{paso: fila con la mediana de cada medición} (orden del flujo)."""
+    por_paso = {}
+    for pasos in repeticiones:
+        for fila in pasos:
+            por_paso.setdefault(fila["paso"], []).append(fila)
+    return {
+        paso: {
+            "paso": paso,
+            **{m: statistics.median(f[m] for f in filas) for m in ("pared_ms", "script_ms", "reruns", "solver")},
+            "max_script_ms": max(f["script_ms"] for f in filas),
+        }
+        for paso, filas in por_paso.items()
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia de los reruns de app.py en los flujos reales.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Sesiones nuevas (se reporta la mediana)")
+    parser.add_argument("--ingredientes", type=int, default=40, help="Filas de la matriz sintética")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--max-ms", type=float, default=None, help="Presupuesto de tiempo de script por paso")
+    parser.add_argument("--baseline", default=None, help="JSON de referencia ({paso: script_ms}) de --guardar")
+    parser.add_argument("--tolerancia", type=float, default=1.5, help="Factor permitido sobre la referencia")
+    parser.add_argument("--margen-ms", type=float, default=50.0, help="Holgura absoluta sobre la referencia")
+    parser.add_argument("--guardar", default=None, help="Guarda las medianas de script_ms como referencia")
+    parser.add_argument("--json", action="store_true", help="Imprime las mediciones como JSON")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo de cada ejecución del script (s)")
+    args = parser.parse_args(argv)
+
+    preparar()
+    matriz = matriz_sintetica(args.ingredientes, args.semilla)
+    fallas, repeticiones = [], []
+    with perfil_preservado():
+        for r in range(args.repeticiones):
+            pasos, resultado = flujo(matriz, args.timeout)
+            repeticiones.append(pasos)
+            for fila in pasos:
+                if fila["excepciones"]:
+                    fallas.append(f"repetición {r + 1}, {fila['paso']}: excepción {fila['excepciones'][0]}")
+                if fila["solver"] and fila["paso"] not in PASOS_SOLVER:
+                    fallas.append(f"repetición {r + 1}, {fila['paso']}: {fila['solver']} invocaciones del solver")
+            if resultado is None or not resultado.get("success", False):
+                fallas.append(f"repetición {r + 1}: la formulación no terminó con éxito")
+
+    resumen = medianas(repeticiones)
+    referencia = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            referencia = json.load(f)
+    if args.json:
+        print(json.dumps(list(resumen.values()), indent=2))
+    else:
+        print(f"{'Paso':<16}{'script ms':>11}{'máx ms':>10}{'pared ms':>10}{'reruns':>8}{'solver':>8}{'ref ms':>9}")
+        for fila in resumen.values():
+            ref = referencia.get(fila["paso"])
+            print(
+                f"{fila['paso']:<16}{fila['script_ms']:>11.1f}{fila['max_script_ms']:>10.1f}{fila['pared_ms']:>10.1f}"
+                f"{fila['reruns']:>8g}{fila['solver']:>8g}{'' if ref is None else f'{ref:.1f}':>9}"
+            )
+    for fila in resumen.values():
+        if args.max_ms is not None and fila["script_ms"] > args.max_ms:
+            fallas.append(f"{fila['paso']}: {fila['script_ms']:.1f} ms > {args.max_ms:.1f} ms")
+        ref = referencia.get(fila["paso"])
+        if ref is not None and fila["script_ms"] > ref * args.tolerancia + args.margen_ms:
+            fallas.append(
+                f"{fila['paso']}: {fila['script_ms']:.1f} ms > referencia {ref:.1f} ms x {args.tolerancia:g} + {args.margen_ms:g} ms"
+            )
+    if args.guardar:
+        with open(args.guardar, "w") as f:
+            json.dump({p: round(fila["script_ms"], 1) for p, fila in resumen.items()}, f, indent=2)
+    for falla in fallas:
+        print(f"FALLA: {falla}")
+    return 1 if fallas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
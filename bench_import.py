@@ -0,0 +1,121 @@
+"""
+Tiempo de importación en frío de los módulos de la aplicación.
+
+Cada módulo se importa en un proceso Python nuevo (como un worker de batch_formulate o
+de ProcessPoolExecutor) y se mide el tiempo del import. También se revisa qué
+dependencias pesadas quedaron cargadas: los módulos de biblioteca no deben cargar
+Streamlit ni Plotly.
+
+Uso:
+    python bench_import.py                       # módulos de biblioteca, 5 repeticiones
+    python bench_import.py --max-ms 900          # falla si batch_formulate supera 900 ms
+    python bench_import.py optimization --detalle  # imports más lentos (-X importtime)
+
+Retorna código 1 si algún módulo de biblioteca carga una dependencia prohibida o si
+batch_formulate supera --max-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que usan el CLI y los workers: deben importarse sin Streamlit ni Plotly
+MODULOS_BIBLIOTECA = [
+    "perf",
+    "data",
+    "presolve",
+    "formulation_result",
+    "nutrient_aliases",
+    "solver_portfolio",
+    "optimization",
+    "diagnosis",
+    "jobs",
+    "incremental",
+    "result_history",
+    "shared_data",
+    "reference_registry",
+    "nutrient_adjustment",
+    "price_risk",
+    "pareto",
+    "dose_sweep",
+    "charts",
+    "production",
+    "menu_planner",
+    "kennel",
+    "batch_formulate",
+]
+PROHIBIDOS = ["streamlit", "plotly"]
+PESADOS = ["pandas", "numpy", "pulp", "streamlit", "plotly", "PIL"]
+MODULO_WORKER = "batch_formulate"
+
+_SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({{"ms": ms, "cargados": [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+def medir(modulo, repeticiones=5):
+    """Mediana del tiempo de import (ms) en procesos nuevos y dependencias pesadas cargadas."""
+    tiempos, cargados = [], []
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", _SCRIPT.format(modulo=modulo, pesados=PESADOS)],
+            cwd=DIRECTORIO, capture_output=True, text=True, check=True,
+        )
+        datos = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(datos["ms"])
+        cargados = datos["cargados"]
+    return {"modulo": modulo, "ms": statistics.median(tiempos), "min_ms": min(tiempos), "cargados": cargados}
+
+def detalle(modulo, top=15):
+    """Imports más lentos (tiempo acumulado, µs) según python -X importtime."""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=DIRECTORIO, capture_output=True, text=True, check=True,
+    )
+    filas = []
+    for linea in salida.stderr.splitlines():
+        partes = [p.strip() for p in linea.split("|")]
+        if len(partes) == 3 and partes[1].isdigit():
+            filas.append((int(partes[1]), partes[2]))
+    return sorted(filas, reverse=True)[:top]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiempo de importación en frío de los módulos.")
+    parser.add_argument("modulos", nargs="*", help="Módulos a medir (por defecto, los de biblioteca)")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Procesos nuevos por módulo")
+    parser.add_argument("--max-ms", type=float, default=None, help=f"Presupuesto para importar {MODULO_WORKER}")
+    parser.add_argument("--detalle", action="store_true", help="Mostrar los imports más lentos de cada módulo")
+    args = parser.parse_args(argv)
+
+    modulos = args.modulos or MODULOS_BIBLIOTECA
+    fallas = []
+    print(f"{'Módulo':<22}{'mediana ms':>12}{'mín ms':>10}  dependencias pesadas")
+    for modulo in modulos:
+        try:
+            r = medir(modulo, args.repeticiones)
+        except subprocess.CalledProcessError as e:
+            fallas.append(f"{modulo} no se pudo importar: {e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e}")
+            continue
+        print(f"{modulo:<22}{r['ms']:>12.1f}{r['min_ms']:>10.1f}  {', '.join(r['cargados'])}")
+        if modulo in MODULOS_BIBLIOTECA:
+            prohibidos = [m for m in PROHIBIDOS if m in r["cargados"]]
+            if prohibidos:
+                fallas.append(f"{modulo} carga {', '.join(prohibidos)}")
+        if modulo == MODULO_WORKER and args.max_ms is not None and r["ms"] > args.max_ms:
+            fallas.append(f"{modulo}: {r['ms']:.1f} ms > {args.max_ms:.1f} ms")
+        if args.detalle:
+            for us, nombre in detalle(modulo):
+                print(f"    {us / 1000:>8.1f} ms  {nombre}")
+    for falla in fallas:
+        print(f"FALLA: {falla}")
+    return 1 if fallas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
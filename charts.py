@@ -0,0 +1,189 @@
+"""
+Figuras de la pestaña Gráficos: construcción compacta y caché por proceso.
+
+Un rerun completo de la pestaña dibuja 1 + 2 x nutrientes figuras y Streamlit serializa
+cada una a JSON para el navegador. Casi todo ese JSON era la plantilla de Plotly
+("simple_white" o la "plotly" por defecto, ~8 KB) copiada en layout.template de cada
+figura, y armar la figura con update_layout(template=...) hacía una copia profunda de
+la plantilla. Aquí:
+
+- plantilla() es una plantilla mínima con solo lo que usan las barras y el pastel (ejes
+  con línea y sin grilla, fondo blanco, el mismo aspecto que "simple_white").
+- Los datos van como listas redondeadas a los DECIMALES que muestra la vista, o a CIFRAS
+  cifras significativas si eso deja más decimales (precios sombra pequeños). Con 6 cifras
+  la etiqueta con 2 decimales sale igual que con el valor exacto; Plotly codificaría los
+  arreglos de numpy en base64 a 8 bytes por valor.
+- Las etiquetas de las barras salen de texttemplate sobre y en lugar de un arreglo text
+  con los mismos valores; customdata solo cuando el hover necesita un dato que no está en
+  x ni en y.
+- Los colores de los ingredientes vienen del mapa de get_color_map (la misma paleta en
+  todas las figuras de una fórmula).
+- FIGURAS guarda cada figura con la tabla de su panel por (huella de la fórmula, tipo
+  de gráfico o nutriente, unidad): un rerun con el mismo resultado no reconstruye nada.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from perf import incr
+
+CIFRAS = 6
+DECIMALES = 2
+MAX_FIGURAS = 1024
+COLOR_TEXTO = "rgb(36,36,36)"
+
+def huella_formula(df_formula):
+    """Huella del contenido de df_formula (ingredientes, inclusiones, precios y nutrientes)."""
+    h = hashlib.sha1(repr(list(df_formula.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df_formula, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def redondear(valores, cifras=CIFRAS, decimales=DECIMALES):
+    """
+    Lista de floats con al menos los decimales de las etiquetas y cifras significativas para
+    los valores pequeños (NaN se conserva, Plotly lo envía como null).
+    """
+    valores = np.asarray(valores, dtype=float)
+    redondeados = []
+    for v in valores:
+        if not np.isfinite(v) or v == 0:
+            redondeados.append(float(v))
+            continue
+        orden = int(np.floor(np.log10(abs(v))))
+        redondeados.append(round(float(v), max(decimales, cifras - 1 - orden)))
+    return redondeados
+
+@lru_cache(maxsize=1)
+def plantilla():
+    import plotly.graph_objects as go
+
+    eje = dict(
+        linecolor=COLOR_TEXTO, showgrid=False, showline=True, ticks="outside",
+        title=dict(standoff=15), automargin=True, zeroline=False,
+    )
+    return go.layout.Template(
+        layout=dict(
+            font=dict(color=COLOR_TEXTO), paper_bgcolor="white", plot_bgcolor="white",
+            hovermode="closest", hoverlabel=dict(align="left"), xaxis=eje, yaxis=eje,
+        ),
+        data=dict(
+            bar=[go.Bar(marker_line=dict(color="white", width=0.5))],
+            pie=[go.Pie(automargin=True)],
+        ),
+    )
+
+class FigureCache:
+    """LRU por proceso de {clave: (figura, datos del panel, bytes del JSON de la figura)}."""
+
+    def __init__(self, max_items=MAX_FIGURAS):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def obtener(self, clave, construir):
+        """construir() -> (figura, datos); se llama solo si la clave no está en la caché."""
+        with self._lock:
+            if clave in self._items:
+                self._items.move_to_end(clave)
+                incr("charts.cache_hit")
+                return self._items[clave]
+        import plotly.io as pio
+
+        incr("charts.cache_miss")
+        figura, datos = construir()
+        entrada = (figura, datos, len(pio.to_json(figura, validate=False)))
+        with self._lock:
+            self._items[clave] = entrada
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return entrada
+
+    def limpiar(self):
+        with self._lock:
+            self._items.clear()
+
+FIGURAS = FigureCache()
+
+def figura_costo(tipo, ingredientes, costos, proporciones, colores, label):
+    """tipo: "Pastel" o "Barras". Costo aportado por ingrediente en label."""
+    import plotly.graph_objects as go
+
+    if tipo == "Pastel":
+        fig = go.Figure(go.Pie(
+            labels=ingredientes,
+            values=redondear(costos),
+            marker_colors=colores,
+            hoverinfo="label+percent+value",
+            textinfo="label+percent",
+            hole=0.3,
+        ))
+        fig.update_layout(title="Participación de cada ingrediente en el costo total", template=plantilla())
+        return fig
+    fig = go.Figure(go.Bar(
+        x=ingredientes,
+        y=redondear(costos),
+        marker_color=colores,
+        texttemplate="%{y:,.2f} " + label,
+        textposition="auto",
+        customdata=redondear(proporciones),
+        hovertemplate="%{x}<br>Costo: %{y:.2f} " + label + "<br>Proporción dieta: %{customdata:.2f}%<extra></extra>",
+    ))
+    fig.update_layout(
+        xaxis_title="Ingrediente",
+        yaxis_title=f"Costo aportado ({label})",
+        title=f"Costo total aportado por ingrediente ({label})",
+        showlegend=False,
+        template=plantilla(),
+    )
+    return fig
+
+def figura_aporte(nut, ingredientes, valores, porc_aporte, colores, label):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Bar(
+        x=ingredientes,
+        y=redondear(valores),
+        marker_color=colores,
+        texttemplate="%{y:,.2f}",
+        textposition="auto",
+        customdata=redondear(porc_aporte),
+        hovertemplate="%{x}<br>Aporte: %{y:.2f} " + label + "<br>Proporción aporte: %{customdata:.2f}%<extra></extra>",
+    ))
+    fig.update_layout(
+        xaxis_title="Ingrediente",
+        yaxis_title=f"Aporte de {nut} ({label})",
+        title=f"Aporte de cada ingrediente a {nut} ({label})",
+        template=plantilla(),
+    )
+    return fig
+
+def figura_precio_sombra(nut, ingredientes, precios_unit, min_idx, label):
+    """precios_unit: NaN donde el ingrediente no aporta el nutriente (sin barra ni etiqueta)."""
+    import plotly.graph_objects as go
+
+    titulo = f"Precio sombra y costo por ingrediente para {nut}"
+    if min_idx is not None:
+        titulo += f" (más barato: {ingredientes[min_idx]})"
+    colores = ["green" if i == min_idx else "royalblue" for i in range(len(ingredientes))]
+    fig = go.Figure(go.Bar(
+        x=ingredientes,
+        y=redondear(precios_unit),
+        marker_color=colores,
+        texttemplate="%{y:,.2f}",
+        textposition="auto",
+        hovertemplate="%{x}<br>Precio sombra: %{y:.2f} " + label + "<extra></extra>",
+    ))
+    fig.update_layout(
+        xaxis_title="Ingrediente",
+        yaxis_title=label,
+        title=titulo,
+        template=plantilla(),
+    )
+    return fig
@@ -1,5 +1,13 @@
+import sys
 import pandas as pd
-import streamlit as st
+from perf import span
+
+def _mostrar_error(mensaje):
+    # Streamlit solo si ya está cargado (app); el CLI y los workers no lo importan
+    if "streamlit" in sys.modules:
+        sys.modules["streamlit"].error(mensaje)
+    else:
+        print(mensaje, file=sys.stderr)
 
 # NUEVO: Estructura para perfil de mascota
 class PerfilMascota:
@@ -32,22 +40,33 @@ def load_ingredients(uploaded_file):
         return pd.DataFrame()
     filename = uploaded_file.name.lower()
     try:
-        if filename.endswith(".xlsx"):
-            df = pd.read_excel(uploaded_file)
-        elif filename.endswith(".csv"):
-            try:
-                df = pd.read_csv(uploaded_file, delimiter=';', encoding='latin1')
-            except UnicodeDecodeError:
-                df = pd.read_csv(uploaded_file, delimiter=';', encoding='utf-8')
-        else:
-            st.error("Formato de archivo de ingredientes no soportado. Usa .csv o .xlsx")
-            return pd.DataFrame()
+        with span("data.load_ingredients"):
+            if filename.endswith(".xlsx"):
+                df = pd.read_excel(uploaded_file)
+            elif filename.endswith(".csv"):
+                try:
+                    df = pd.read_csv(uploaded_file, delimiter=';', encoding='latin1')
+                except UnicodeDecodeError:
+                    df = pd.read_csv(uploaded_file, delimiter=';', encoding='utf-8')
+            else:
+                _mostrar_error("Formato de archivo de ingredientes no soportado. Usa .csv o .xlsx")
+                return pd.DataFrame()
     except Exception as e:
-        st.error(f"Error al cargar ingredientes: {e}")
+        _mostrar_error(f"Error al cargar ingredientes: {e}")
         return pd.DataFrame()
     df.columns = df.columns.str.strip()  # Limpia espacios en los nombres de columna
     return df
 
+def limpiar_matriz_ingredientes(df):
+    """Convierte a numérico todas las columnas salvo Ingrediente y Categoría (vacíos/no numéricos -> 0)."""
+    if df is None or df.empty:
+        return df
+    df = df.copy()
+    for col in df.columns:
+        if col not in ["Ingrediente", "Categoría"]:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
 def get_nutrient_list(ingredients_df):
     exclude_cols = ["Ingrediente", "precio", "Materia seca (%)"]
     return [col for col in ingredients_df.columns if col not in exclude_cols]
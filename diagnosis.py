@@ -0,0 +1,166 @@
+"""
+Diagnóstico de infactibilidad de una formulación.
+
+Las restricciones duras del modelo de DietFormulator son: proporción total (= 1),
+límites de inclusión por ingrediente (MinInc_/MaxInc_), máximos de nutrientes (Max_) y
+relaciones entre nutrientes (RatioMin_/RatioMax_) y rangos por categoría del tipo de
+dieta (CatMin_/CatMax_).
+Los mínimos de nutrientes ya son blandos (slack penalizado), por lo que no generan
+infactibilidad.
+
+1. Filtro elástico: a cada restricción dura se le agregan variables elásticas y se
+   minimiza la relajación total, ponderada por 1/|lado derecho| (relajación relativa;
+   las relaciones, con lado derecho 0, pesan 1; la proporción total se pondera mucho más alto).
+   La primera solución es la menor relajación que restituye la factibilidad. Las
+   restricciones relajadas pasan a ser duras y se repite hasta que el conjunto duro
+   sea infactible.
+2. Filtro de eliminación: sobre ese conjunto se quita una restricción a la vez (su
+   elástica queda libre); si el resto sigue infactible se descarta, si no se conserva.
+   El resultado es un conjunto irreducible (IIS).
+
+Todo se hace sobre un único modelo, cambiando solo las cotas de las variables elásticas.
+Cada resolución recibe como límite el tiempo que queda del presupuesto total; si se agota,
+se retorna el conjunto del filtro elástico sin minimizar.
+"""
+import time
+
+import pulp
+
+TIPOS_RESTRICCION = {
+    "Total_Proportion": "Proporción total (100%)",
+    "MinInc_": "Inclusión mínima de ingrediente",
+    "MaxInc_": "Inclusión máxima de ingrediente",
+    "Max_": "Máximo de nutriente",
+    "RatioMin_": "Relación mínima entre nutrientes",
+    "RatioMax_": "Relación máxima entre nutrientes",
+    "CatMin_": "Inclusión mínima de categoría",
+    "CatMax_": "Inclusión máxima de categoría",
+}
+
+# La proporción total no es algo que el usuario pueda relajar: se relaja solo como último recurso
+PESO_PROPORCION_TOTAL = 100.0
+
+def _tipo(nombre):
+    for prefijo, descripcion in TIPOS_RESTRICCION.items():
+        if nombre.startswith(prefijo):
+            return descripcion
+    return None
+
+def _elastizar(prob):
+    """Agrega variables elásticas a cada restricción dura. Retorna {nombre: [elásticas]}."""
+    elasticas = {}
+    for n, (nombre, restriccion) in enumerate(list(prob.constraints.items())):
+        if _tipo(nombre) is None:
+            continue
+        vars_e = []
+        if restriccion.sense in (pulp.LpConstraintLE, pulp.LpConstraintEQ):
+            e = pulp.LpVariable(f"Elastica_{n}_baja", lowBound=0)
+            restriccion.addInPlace(-1 * e)
+            vars_e.append(e)
+        if restriccion.sense in (pulp.LpConstraintGE, pulp.LpConstraintEQ):
+            e = pulp.LpVariable(f"Elastica_{n}_sube", lowBound=0)
+            restriccion.addInPlace(1 * e)
+            vars_e.append(e)
+        elasticas[nombre] = vars_e
+    return elasticas
+
+def _fijar(elasticas, nombres, libre):
+    for nombre in nombres:
+        for e in elasticas[nombre]:
+            e.upBound = None if libre else 0
+
+def _factible(prob, restante_s):
+    """True si el modelo es factible, False si es infactible, None si CBC agotó restante_s."""
+    prob.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=restante_s))
+    if prob.status == pulp.LpStatusOptimal and prob.sol_status == pulp.LpSolutionOptimal:
+        return True
+    if prob.status == pulp.LpStatusInfeasible:
+        return False
+    return None
+
+def diagnosticar_infactibilidad(formulator, tiempo_max_s=3.0):
+    """
+    Retorna dict con:
+      "conflicto": lista de {restriccion, tipo, lado_derecho} (conjunto mínimo en conflicto),
+      "relajacion_minima": lista de {restriccion, tipo, lado_derecho, relajacion} con la menor
+          relajación (en unidades de cada restricción) que restituye la factibilidad,
+      "minimo": True si se completó el filtro de eliminación dentro del tiempo,
+      "relajacion_total": suma de relajaciones del filtro elástico.
+    """
+    inicio = time.perf_counter()
+    prob, _ = formulator._build_problem()
+    elasticas = _elastizar(prob)
+
+    def restante():
+        return tiempo_max_s - (time.perf_counter() - inicio)
+
+    # Filtro elástico (se ignora el costo)
+    pesos = {
+        nombre: 1.0 / abs(prob.constraints[nombre].constant) if abs(prob.constraints[nombre].constant) > 1e-9 else 1.0
+        for nombre in elasticas
+    }
+    if "Total_Proportion" in pesos:
+        pesos["Total_Proportion"] *= PESO_PROPORCION_TOTAL
+    relajacion = None
+    conflicto = []
+    completo = False
+    while restante() > 0:
+        prob.setObjective(pulp.lpSum(
+            pesos[n] * e for n, vars_e in elasticas.items() if n not in conflicto for e in vars_e
+        ))
+        factible = _factible(prob, restante())
+        if factible is None:
+            break
+        if not factible:
+            completo = True
+            break
+        valores = {n: sum(e.varValue or 0.0 for e in vars_e) for n, vars_e in elasticas.items()}
+        nuevas = [n for n in elasticas if n not in conflicto and valores[n] > 1e-7]
+        if relajacion is None:
+            relajacion = valores
+        if not nuevas:
+            break
+        conflicto.extend(nuevas)
+        _fijar(elasticas, nuevas, libre=False)
+    if relajacion is None:
+        return {"conflicto": [], "relajacion_minima": [], "minimo": False, "relajacion_total": None}
+    relajacion_minima = [
+        {"restriccion": n, "tipo": _tipo(n), "lado_derecho": -prob.constraints[n].constant + 0.0, "relajacion": r}
+        for n, r in relajacion.items() if r > 1e-7
+    ]
+    if not completo:
+        # Sin conjunto infactible (modelo factible o tiempo agotado): solo se reporta la relajación
+        return {
+            "conflicto": [],
+            "relajacion_minima": relajacion_minima,
+            "minimo": False,
+            "relajacion_total": float(sum(relajacion.values())),
+        }
+
+    # Filtro de eliminación sobre el conjunto en conflicto (el resto de restricciones queda libre)
+    prob.setObjective(pulp.LpAffineExpression())
+    _fijar(elasticas, [n for n in elasticas if n not in conflicto], libre=True)
+    minimo = True
+    for nombre in list(conflicto):
+        if restante() <= 0:
+            minimo = False
+            break
+        _fijar(elasticas, [nombre], libre=True)
+        factible = _factible(prob, restante())
+        if factible is None:
+            minimo = False
+            break
+        if factible:
+            _fijar(elasticas, [nombre], libre=False)  # necesaria para el conflicto
+        else:
+            conflicto.remove(nombre)  # el resto sigue en conflicto sin ella
+
+    return {
+        "conflicto": [
+            {"restriccion": nombre, "tipo": _tipo(nombre), "lado_derecho": -prob.constraints[nombre].constant + 0.0}
+            for nombre in conflicto
+        ],
+        "relajacion_minima": relajacion_minima,
+        "minimo": minimo,
+        "relajacion_total": float(sum(relajacion.values())),
+    }
@@ -0,0 +1,177 @@
+"""
+Barrido paramétrico de la dosis diaria: costo, composición y factibilidad en un rango.
+
+En la pestaña Formulación los requerimientos por kg son Min / dosis_kg (y Max / dosis_kg),
+así que cambiar la dosis de d0 a d multiplica el lado derecho de todas las filas Min_ y
+Max_ por t = d0 / d; inclusiones, relaciones y categorías no cambian. Es un análisis
+paramétrico del lado derecho:
+
+- Se construye un solo modelo (sin presolve: una cota redundante a una dosis puede no
+  serlo a otra) y en cada punto solo se cambia el lado derecho de esas filas, con la
+  solución del punto vecino como warm start.
+- Dentro de un intervalo de estabilidad de la base la composición es afín en t, el costo
+  por kg es afín en t y el costo diario (costo por kg x dosis) es afín en la dosis. Entre
+  dos puntos con los mismos ingredientes y holguras activas no hay quiebre; si difieren,
+  se bisecta hasta la resolución pedida. Así se ubican los quiebres de composición y los
+  límites de factibilidad con pocas resoluciones.
+- Factible: el modelo es óptimo y ningún mínimo necesita holgura. El conjunto de dosis
+  factibles es un intervalo (el lado derecho es lineal en t).
+"""
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from perf import span
+
+TOLERANCIA = 1e-7
+
+def _filas_escalables(prob):
+    """{nombre: lado derecho a la dosis de referencia} de las filas Min_ y Max_ de nutrientes."""
+    return {
+        nombre: -restriccion.constant
+        for nombre, restriccion in prob.constraints.items()
+        if nombre.startswith("Max_") or (nombre.startswith("Min_") and nombre.endswith("_slack"))
+    }
+
+class _Modelo:
+    """Modelo de DietFormulator reutilizado entre dosis."""
+
+    def __init__(self, formulator, dosis_ref_g):
+        self.formulator = copy.copy(formulator)
+        self.formulator.presolve = False
+        self.prob, ingredient_vars = self.formulator._build_problem()
+        df = self.formulator.ingredients_df
+        self.nombres = list(df["Ingrediente"])
+        self.variables = [ingredient_vars[i] for i in df.index]
+        self.holguras = [v for v in self.prob.variables() if v.name.startswith("Slack_")]
+        precios = pd.to_numeric(df.get("precio", 0), errors="coerce")
+        self.precios = np.zeros(len(df)) if np.isscalar(precios) else precios.fillna(0).to_numpy(dtype=float)
+        self.filas = _filas_escalables(self.prob)
+        self.dosis_ref_g = dosis_ref_g
+        self.solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True)
+
+    def resolver(self, dosis_g):
+        factor = self.dosis_ref_g / dosis_g
+        for nombre, lado_derecho in self.filas.items():
+            self.prob.constraints[nombre].changeRHS(lado_derecho * factor)
+        self.prob.solve(self.solver)
+        optimo = self.prob.sol_status == pulp.LpSolutionOptimal
+        x = np.array([var.varValue or 0.0 for var in self.variables]) if optimo else np.zeros(len(self.variables))
+        # CBC puede dejar valores como -1e-13: fuera de las cotas, setInitialValue los rechaza
+        x = np.clip(x, 0.0, 1.0)
+        if x.sum() > 0:
+            x = x / x.sum()
+        holgura = sum(v.varValue or 0.0 for v in self.holguras) if optimo else float("nan")
+        for var, valor in zip(self.variables, x):
+            var.setInitialValue(valor)
+        costo = float(self.precios @ x) * 100 if optimo else float("nan")  # por 100 kg
+        return {
+            "dosis_g": float(dosis_g),
+            "estado": pulp.LpStatus[self.prob.status],
+            "factible": bool(optimo and holgura <= TOLERANCIA),
+            "holgura": holgura,
+            "costo_100kg": costo,
+            "costo_dia": costo / 100 * dosis_g / 1000,
+            "x": x,
+            # Firma de la base: ingredientes en la fórmula y mínimos con holgura
+            "firma": (
+                optimo,
+                tuple(np.flatnonzero(x > TOLERANCIA)),
+                tuple(v.name for v in self.holguras if (v.varValue or 0.0) > TOLERANCIA) if optimo else (),
+            ),
+        }
+
+def _refinar(modelo, a, b, resolucion_g, puntos):
+    """Bisecta [a, b] mientras los extremos tengan firmas distintas."""
+    if a["firma"] == b["firma"] or b["dosis_g"] - a["dosis_g"] <= resolucion_g:
+        return
+    m = modelo.resolver((a["dosis_g"] + b["dosis_g"]) / 2)
+    puntos.append(m)
+    _refinar(modelo, a, m, resolucion_g, puntos)
+    _refinar(modelo, m, b, resolucion_g, puntos)
+
+def _quiebres(puntos, nombres):
+    quiebres = []
+    for a, b in zip(puntos[:-1], puntos[1:]):
+        if a["firma"] == b["firma"]:
+            continue
+        antes, despues = set(a["firma"][1]), set(b["firma"][1])
+        quiebres.append({
+            "desde_g": a["dosis_g"],
+            "hasta_g": b["dosis_g"],
+            "entran": [nombres[j] for j in sorted(despues - antes)],
+            "salen": [nombres[j] for j in sorted(antes - despues)],
+            "cambia_factibilidad": a["factible"] != b["factible"],
+        })
+    return quiebres
+
+def barrido_dosis(formulator, dosis_ref_g, dosis_min_g, dosis_max_g, n_puntos=15, resolucion_g=1.0):
+    """
+    formulator: DietFormulator con requerimientos por kg a la dosis dosis_ref_g (g/día).
+    Retorna dict con:
+      "curva" (DataFrame por dosis: factible, costo por 100 kg, costo diario, holgura e
+      inclusiones en %), "quiebres" (intervalos de ancho <= resolucion_g donde cambia la
+      composición: ingredientes que entran y salen), "limites_factibles" ((min, max) en g/día
+      dentro del rango o None), "mejor" (dosis factible de menor costo diario),
+      "n_resoluciones" y "tiempo_s".
+    """
+    if not 0 < dosis_min_g < dosis_max_g:
+        raise ValueError("El rango de dosis debe cumplir 0 < mínima < máxima")
+    inicio = time.perf_counter()
+    with span("dose_sweep.build"):
+        modelo = _Modelo(formulator, dosis_ref_g)
+    with span("dose_sweep.solve"):
+        puntos = [modelo.resolver(d) for d in np.linspace(dosis_min_g, dosis_max_g, max(2, int(n_puntos)))]
+        for a, b in list(zip(puntos[:-1], puntos[1:])):
+            _refinar(modelo, a, b, resolucion_g, puntos)
+    puntos.sort(key=lambda p: p["dosis_g"])
+
+    curva = pd.DataFrame({
+        "dosis_g": [p["dosis_g"] for p in puntos],
+        "factible": [p["factible"] for p in puntos],
+        "estado": [p["estado"] for p in puntos],
+        "costo_100kg": [p["costo_100kg"] for p in puntos],
+        "costo_dia": [p["costo_dia"] for p in puntos],
+        "holgura": [p["holgura"] for p in puntos],
+    })
+    inclusiones = pd.DataFrame(np.vstack([p["x"] for p in puntos]) * 100, columns=modelo.nombres)
+    curva = pd.concat([curva, inclusiones.loc[:, inclusiones.max() > 1e-5]], axis=1)
+
+    factibles = curva[curva["factible"]]
+    return {
+        "curva": curva,
+        "quiebres": _quiebres(puntos, modelo.nombres),
+        "limites_factibles": (float(factibles["dosis_g"].min()), float(factibles["dosis_g"].max())) if len(factibles) else None,
+        "mejor": factibles.loc[factibles["costo_dia"].idxmin()].to_dict() if len(factibles) else None,
+        "n_resoluciones": len(puntos),
+        "tiempo_s": time.perf_counter() - inicio,
+    }
+
+def grafico_barrido(barrido):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    curva = barrido["curva"]
+    factible = curva["factible"].to_numpy()
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(
+        x=curva["dosis_g"], y=curva["costo_dia"], mode="lines+markers", name="Costo diario",
+        marker=dict(color=np.where(factible, "#19345c", "#d62728"), size=6), line=dict(color="#7a9fc8"),
+    ))
+    fig.add_trace(go.Scatter(
+        x=curva["dosis_g"], y=curva["costo_100kg"], mode="lines", name="Costo por 100 kg",
+        line=dict(color="#999999", dash="dot"),
+    ), secondary_y=True)
+    for quiebre in barrido["quiebres"]:
+        fig.add_vline(x=(quiebre["desde_g"] + quiebre["hasta_g"]) / 2, line=dict(color="#cccccc", width=1))
+    fig.update_layout(
+        xaxis_title="Dosis diaria (g/día)",
+        title="Costo según dosis (rojo: no cumple los mínimos)",
+        template="simple_white",
+    )
+    fig.update_yaxes(title_text="Costo diario", secondary_y=False)
+    fig.update_yaxes(title_text="Costo por 100 kg", secondary_y=True)
+    return fig
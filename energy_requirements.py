@@ -20,6 +20,20 @@ Referencia: Daily Maintenance Energy Requirements for Dogs and Cats
 Notas:
 - MER es punto de partida, ajustar según respuesta individual.
 """
+import numpy as np
+
+# Factor MER/RER por (especie, condición); única fuente para calcular_mer y calcular_mer_vector
+FACTORES_MER = {
+    ("perro", "adulto_entero"): 1.8,
+    ("perro", "adulto_castrado"): 1.6,
+    ("perro", "obesidad"): 1.4,
+    ("perro", "cachorro_<4m"): 3.0,
+    ("perro", "cachorro_>4m"): 2.0,
+    ("gato", "adulto_entero"): 1.4,
+    ("gato", "adulto_castrado"): 1.2,
+    ("gato", "obesidad"): 1.0,
+    ("gato", "gatito"): 2.5,
+}
 
 def calcular_rer(peso_kg, formula="auto"):
     """
@@ -42,36 +56,38 @@ def calcular_mer(especie, condicion, peso_kg, edad_meses=None):
     condicion: ["adulto_entero", "adulto_castrado", "obesidad", "cachorro_<4m", "cachorro_>4m", "adulto_entero_gato", "adulto_castrado_gato", "obesidad_gato", "gatito"]
     edad_meses: solo para cachorros/gatitos (opcional)
     """
-    rer = calcular_rer(peso_kg)
-    # Perros
-    if especie == "perro":
-        if condicion == "adulto_entero":
-            return 1.8 * rer
-        elif condicion == "adulto_castrado":
-            return 1.6 * rer
-        elif condicion == "obesidad":
-            return 1.4 * rer
-        elif condicion == "cachorro_<4m":
-            return 3.0 * rer
-        elif condicion == "cachorro_>4m":
-            return 2.0 * rer
-        # Si se usa edad_meses
-        if edad_meses is not None:
-            if edad_meses < 4:
-                return 3.0 * rer
-            else:
-                return 2.0 * rer
-    # Gatos
-    elif especie == "gato":
-        if condicion == "adulto_entero":
-            return 1.4 * rer
-        elif condicion == "adulto_castrado":
-            return 1.2 * rer
-        elif condicion == "obesidad":
-            return 1.0 * rer
-        elif condicion == "gatito":
-            return 2.5 * rer
-    return None
+    factor = _factor_mer(especie, condicion, edad_meses)
+    if factor is None:
+        return None
+    return factor * calcular_rer(peso_kg)
+
+def _factor_mer(especie, condicion, edad_meses=None):
+    """
+    Factor MER/RER de FACTORES_MER. Para perros con condición no reconocida se usa la
+    edad (cachorro <4 o >4 meses) si está disponible; si no, None.
+    """
+    factor = FACTORES_MER.get((especie, condicion))
+    if factor is None and especie == "perro" and edad_meses is not None:
+        factor = FACTORES_MER[("perro", "cachorro_<4m" if edad_meses < 4 else "cachorro_>4m")]
+    return factor
+
+def calcular_mer_vector(especies, condiciones, pesos_kg, edades_meses=None):
+    """
+    calcular_mer para muchos animales a la vez. Retorna un arreglo de kcal/día con NaN
+    donde calcular_mer retornaría None.
+    """
+    especies = np.asarray(especies, dtype=object)
+    condiciones = np.asarray(condiciones, dtype=object)
+    pesos = np.asarray(pesos_kg, dtype=float)
+    rer = np.where((pesos > 2) & (pesos < 45), 30 * pesos + 70, 70 * np.power(pesos, 0.75))
+    if edades_meses is None:
+        edades = [None] * len(pesos)
+    else:
+        edades = [None if np.isnan(e) else e for e in np.asarray(edades_meses, dtype=float)]
+    factor = np.array(
+        [_factor_mer(e, c, ed) for e, c, ed in zip(especies, condiciones, edades)], dtype=float
+    )
+    return factor * rer
 
 def descripcion_condiciones(especie):
     """
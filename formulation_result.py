@@ -0,0 +1,255 @@
+"""
+Resultado de una formulación exitosa respaldado por arreglos de numpy.
+
+DietFormulator._collect_results retornaba dicts anidados {nombre: valor redondeado} que
+la app convertía una y otra vez en DataFrames. FormulationResult guarda:
+
+    ingredientes  IndiceNombres de los ingredientes de la matriz (compartido)
+    inclusion     fracción de cada ingrediente (0..1, alineada con ingredientes)
+    nutrientes    IndiceNombres de nutrient_list (compartido)
+    niveles       valor obtenido de cada nutriente por kg de dieta
+    usados        posiciones de los ingredientes con inclusión > 0
+    aportes       (usados x nutrientes) aporte de cada ingrediente usado a cada nutriente
+    dual_min / dual_max  precio dual de las filas Min_ y Max_ por unidad de nutriente y
+                  kg de dieta (NaN si la fila no está en el modelo o no hay duales)
+
+Los índices de nombres se comparten entre resultados con los mismos nombres (mismos
+ingredientes seleccionados o la misma lista de nutrientes), así que un historial o un
+lote de resultados no repite las listas de nombres.
+
+Compatibilidad: es un MutableMapping con las mismas claves que el dict anterior
+("success", "diet", "nutritional_values", "cost", "ratios", "categorias_sin_ingredientes",
+"nutrientes_sin_columna", "presolve"). Las vistas "diet" y "nutritional_values" se arman al primer acceso con el
+mismo redondeo de antes; las claves que se agregan después ("incremental", ...) van a
+extras. to_dict() entrega el dict completo, to_frame() y nutrientes_frame() los
+DataFrames, y to_bytes()/from_bytes() una serialización binaria de los arreglos
+(pickle: solo para mover resultados entre procesos propios, no para datos externos).
+"""
+import pickle
+import sys
+import threading
+import weakref
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+DECIMALES = 4
+UMBRAL_INCLUSION = 1e-7
+
+class IndiceNombres:
+    """Tupla de nombres con su posición; se comparte entre resultados (ver indice_nombres)."""
+
+    __slots__ = ("nombres", "posicion", "__weakref__")
+
+    def __init__(self, nombres):
+        self.nombres = tuple(nombres)
+        self.posicion = {nombre: i for i, nombre in enumerate(self.nombres)}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def indices(self, nombres):
+        """Posición de cada nombre (-1 si no está)."""
+        return np.array([self.posicion.get(n, -1) for n in nombres], dtype=np.int64)
+
+_INDICES = weakref.WeakValueDictionary()
+_LOCK = threading.Lock()
+
+def indice_nombres(nombres):
+    """IndiceNombres compartido para la secuencia de nombres dada."""
+    clave = tuple(nombres)
+    with _LOCK:
+        indice = _INDICES.get(clave)
+        if indice is None:
+            indice = _INDICES[clave] = IndiceNombres(clave)
+        return indice
+
+def _solo_lectura(arreglo, dtype=float):
+    arreglo = np.array(arreglo, dtype=dtype)
+    arreglo.setflags(write=False)
+    return arreglo
+
+class FormulationResult(MutableMapping):
+    __slots__ = (
+        "ingredientes", "nutrientes", "inclusion", "niveles", "usados", "aportes",
+        "dual_min", "dual_max", "costo", "ratios", "extras", "_vistas",
+    )
+    CLAVES = ("success", "diet", "nutritional_values", "cost", "ratios")
+
+    def __init__(self, ingredientes, nutrientes, inclusion, niveles, aportes, dual_min=None,
+                 dual_max=None, costo=0.0, ratios=None, extras=None):
+        """
+        ingredientes, nutrientes: IndiceNombres (o secuencias de nombres). inclusion:
+        fracciones por ingrediente; niveles: valor por kg de cada nutriente; aportes:
+        matriz (ingredientes usados x nutrientes); costo por kg de dieta.
+        """
+        self.ingredientes = ingredientes if isinstance(ingredientes, IndiceNombres) else indice_nombres(ingredientes)
+        self.nutrientes = nutrientes if isinstance(nutrientes, IndiceNombres) else indice_nombres(nutrientes)
+        self.inclusion = _solo_lectura(inclusion)
+        self.usados = _solo_lectura(np.flatnonzero(self.inclusion > 0), np.int64)
+        self.niveles = _solo_lectura(niveles)
+        self.aportes = _solo_lectura(aportes).reshape(len(self.usados), len(self.nutrientes))
+        sin_dual = np.full(len(self.nutrientes), np.nan)
+        self.dual_min = _solo_lectura(sin_dual if dual_min is None else dual_min)
+        self.dual_max = _solo_lectura(sin_dual if dual_max is None else dual_max)
+        self.costo = float(costo)
+        self.ratios = dict(ratios or {})
+        self.extras = dict(extras or {})
+        self._vistas = None
+
+    # --- Vistas compatibles con el dict anterior ---
+    def _vista(self, clave):
+        if self._vistas is None:
+            self._vistas = {}
+        if clave not in self._vistas:
+            if clave == "diet":
+                nombres = self.ingredientes.nombres
+                self._vistas[clave] = {
+                    nombres[i]: round(float(self.inclusion[i]) * 100, DECIMALES) for i in self.usados
+                }
+            else:
+                self._vistas[clave] = {
+                    n: round(float(v), DECIMALES) for n, v in zip(self.nutrientes.nombres, self.niveles)
+                }
+        return self._vistas[clave]
+
+    def __getitem__(self, clave):
+        if clave in self.extras:
+            return self.extras[clave]
+        if clave == "success":
+            return True
+        if clave in ("diet", "nutritional_values"):
+            return self._vista(clave)
+        if clave == "cost":
+            return round(self.costo * 100, DECIMALES)  # por 100 kg
+        if clave == "ratios":
+            return self.ratios
+        raise KeyError(clave)
+
+    def __setitem__(self, clave, valor):
+        self.extras[clave] = valor
+
+    def __delitem__(self, clave):
+        del self.extras[clave]
+
+    def __contains__(self, clave):
+        return clave in self.extras or clave in self.CLAVES
+
+    def __iter__(self):
+        yield from self.CLAVES
+        yield from (k for k in self.extras if k not in self.CLAVES)
+
+    def __len__(self):
+        return len(self.CLAVES) + sum(1 for k in self.extras if k not in self.CLAVES)
+
+    def __repr__(self):
+        return (
+            f"FormulationResult(cost={self['cost']}, ingredientes={len(self.usados)}/{len(self.ingredientes)}, "
+            f"nutrientes={len(self.nutrientes)})"
+        )
+
+    def __copy__(self):
+        copia = object.__new__(FormulationResult)
+        for slot in self.__slots__:
+            setattr(copia, slot, getattr(self, slot))
+        copia.extras = dict(self.extras)
+        copia._vistas = None
+        return copia
+
+    def to_dict(self):
+        """Dict con la forma del resultado anterior de DietFormulator."""
+        return {clave: self[clave] for clave in self}
+
+    @classmethod
+    def from_dict(cls, datos):
+        """Resultado desde el dict de to_dict (sin aportes ni duales: quedan en NaN)."""
+        diet = datos.get("diet", {})
+        valores = datos.get("nutritional_values", {})
+        return cls(
+            ingredientes=list(diet),
+            nutrientes=list(valores),
+            inclusion=np.array(list(diet.values()), dtype=float) / 100,
+            niveles=np.array(list(valores.values()), dtype=float),
+            aportes=np.full((sum(v > 0 for v in diet.values()), len(valores)), np.nan),
+            costo=datos.get("cost", 0.0) / 100,
+            ratios=datos.get("ratios", {}),
+            extras={k: v for k, v in datos.items() if k not in cls.CLAVES},
+        )
+
+    # --- DataFrames (se arman solo cuando se piden) ---
+    def inclusiones(self, nombres):
+        """% de inclusión de cada nombre dado (0 si no está en la fórmula)."""
+        posiciones = self.ingredientes.indices(nombres)
+        return np.where(posiciones >= 0, self.inclusion[posiciones] * 100, 0.0)
+
+    def to_frame(self):
+        """Ingrediente y % de inclusión de los ingredientes usados."""
+        return pd.DataFrame({
+            "Ingrediente": np.array(self.ingredientes.nombres, dtype=object)[self.usados],
+            "% Inclusión": self.inclusion[self.usados] * 100,
+        })
+
+    def nutrientes_frame(self):
+        return pd.DataFrame({
+            "Nutriente": list(self.nutrientes.nombres),
+            "Obtenido": self.niveles,
+            "Dual mínimo": self.dual_min,
+            "Dual máximo": self.dual_max,
+        })
+
+    def aportes_frame(self):
+        """Aporte de cada ingrediente usado a cada nutriente (por kg de dieta)."""
+        return pd.DataFrame(
+            self.aportes,
+            index=np.array(self.ingredientes.nombres, dtype=object)[self.usados],
+            columns=list(self.nutrientes.nombres),
+        )
+
+    # --- Serialización ---
+    @property
+    def nbytes(self):
+        """Bytes propios del resultado (los índices de nombres son compartidos y no cuentan)."""
+        arreglos = (self.inclusion, self.niveles, self.usados, self.aportes, self.dual_min, self.dual_max)
+        return int(
+            sum(a.nbytes for a in arreglos) + sys.getsizeof(self.ratios) + sys.getsizeof(self.extras)
+            + sum(sys.getsizeof(v) for v in (self._vistas or {}).values())
+        )
+
+    def __reduce__(self):
+        # Un solo buffer float64 con todos los arreglos (se lee sin copiar con np.frombuffer)
+        buffer = np.concatenate(
+            [self.inclusion, self.niveles, self.aportes.ravel(), self.dual_min, self.dual_max]
+        ).tobytes()
+        return _desde_buffer, (
+            self.ingredientes.nombres, self.nutrientes.nombres, buffer, self.costo, self.ratios, self.extras,
+        )
+
+    def to_bytes(self):
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, datos):
+        resultado = pickle.loads(datos)
+        if not isinstance(resultado, cls):
+            raise TypeError("Los datos no contienen un FormulationResult")
+        return resultado
+
+def _desde_buffer(ingredientes, nutrientes, buffer, costo, ratios, extras):
+    resultado = object.__new__(FormulationResult)
+    resultado.ingredientes = indice_nombres(ingredientes)
+    resultado.nutrientes = indice_nombres(nutrientes)
+    datos = np.frombuffer(buffer)
+    n_ing, n_nut = len(ingredientes), len(nutrientes)
+    resultado.inclusion = datos[:n_ing]
+    resultado.usados = _solo_lectura(np.flatnonzero(resultado.inclusion > 0), np.int64)
+    inicio = n_ing + n_nut + len(resultado.usados) * n_nut
+    resultado.niveles = datos[n_ing:n_ing + n_nut]
+    resultado.aportes = datos[n_ing + n_nut:inicio].reshape(len(resultado.usados), n_nut)
+    resultado.dual_min = datos[inicio:inicio + n_nut]
+    resultado.dual_max = datos[inicio + n_nut:inicio + 2 * n_nut]
+    resultado.costo = costo
+    resultado.ratios = ratios
+    resultado.extras = extras
+    resultado._vistas = None
+    return resultado
@@ -0,0 +1,309 @@
+"""
+Re-formulación incremental tras ediciones puntuales en la matriz de ingredientes.
+
+IncrementalSolver envuelve un DietFormulator (misma interfaz solve(progress,
+should_cancel), así que se puede enviar al JobManager) y conserva el último modelo resuelto
+y su base. Al recibir la matriz editada:
+
+1. Detecta las celdas numéricas que cambiaron (precio o nutrientes).
+2. Si solo cambiaron precios y el presolve conserva los mismos ingredientes, cambia los
+   coeficientes del objetivo del modelo anterior; si no, reconstruye el modelo (es barato).
+   Si la estructura cambió (el presolve quitó o repuso filas o ingredientes) re-resuelve
+   con la solución anterior como punto de partida.
+3. Si la estructura es la misma, evalúa la base anterior con los coeficientes nuevos:
+   B x_B = b - N x_N (factibilidad primal) y B^T y = c_B, costos reducidos d = c - A^T y
+   (factibilidad dual). Si la base sigue siendo óptima, la solución se obtiene de ese
+   sistema lineal sin llamar al solver; si no, o si la base es degenerada, se re-resuelve.
+
+Los cambios de requerimientos, límites, relaciones, tipo de dieta o de la selección de
+ingredientes no son incrementales: clave_estructura cambia y se formula desde cero.
+
+El IncrementalSolver (modelo de PuLP incluido) no se guarda en la sesión de Streamlit:
+registrar_solver lo deja en una caché LRU del proceso y la sesión guarda solo su clave. Si
+se descartó, obtener_solver retorna None y la siguiente formulación es completa.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from perf import incr, span
+
+TOLERANCIA = 1e-7
+
+def clave_estructura(formulator):
+    """Huella de todo lo que no es un valor numérico editable de la matriz de ingredientes."""
+    df = formulator.ingredients_df
+    categorias = list(df["Categoría"].astype(str)) if "Categoría" in df.columns else []
+    datos = [
+        list(df.columns), list(df.index), list(df["Ingrediente"]), categorias,
+        formulator.nutrient_list, formulator.requirements, formulator.limits,
+        formulator.ratios, formulator.diet_type, formulator.min_penalty_weight,
+        formulator.presolve, formulator.presolve_dominated,
+    ]
+    return hashlib.sha1(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()
+
+def celdas_modificadas(antes, despues):
+    """[(ingrediente, columna, valor anterior, valor nuevo)] de las columnas numéricas que cambiaron."""
+    columnas = [c for c in despues.columns if c not in ("Ingrediente", "Categoría") and c in antes.columns]
+    a, b = antes[columnas], despues[columnas]
+    distintos = (a.to_numpy() != b.to_numpy()) & ~(a.isna().to_numpy() & b.isna().to_numpy())
+    cambios = []
+    for fila, j in zip(*np.nonzero(distintos)):
+        antes_val = pd.to_numeric(a.iat[fila, j], errors="coerce")
+        despues_val = pd.to_numeric(b.iat[fila, j], errors="coerce")
+        if not (antes_val == despues_val or (pd.isna(antes_val) and pd.isna(despues_val))):
+            cambios.append((despues["Ingrediente"].iloc[fila], columnas[j], float(antes_val), float(despues_val)))
+    return cambios
+
+def _matrices(prob):
+    """Forma matricial del modelo: variables, A (filas x variables), sentidos, lado derecho, c y cotas."""
+    variables = prob.variables()
+    posicion = {v.name: j for j, v in enumerate(variables)}
+    filas = list(prob.constraints.items())
+    A = np.zeros((len(filas), len(variables)))
+    for i, (_, restriccion) in enumerate(filas):
+        for var, coef in restriccion.items():
+            A[i, posicion[var.name]] = coef
+    sentidos = np.array([r.sense for _, r in filas])
+    lado_derecho = np.array([-r.constant for _, r in filas], dtype=float)
+    c = np.zeros(len(variables))
+    for var, coef in prob.objective.items():
+        c[posicion[var.name]] = coef
+    bajo = np.array([-np.inf if v.lowBound is None else v.lowBound for v in variables], dtype=float)
+    alto = np.array([np.inf if v.upBound is None else v.upBound for v in variables], dtype=float)
+    return variables, [n for n, _ in filas], A, sentidos, lado_derecho, c, bajo, alto
+
+class _Base:
+    """Base de una solución: variables estructurales básicas, filas no activas y valores no básicos."""
+
+    def __init__(self, nombres_var, nombres_fila, x, basicas, filas_holgura, y=None, d=None):
+        self.nombres_var = nombres_var
+        self.nombres_fila = nombres_fila
+        self.x = x
+        self.basicas = basicas
+        self.filas_holgura = filas_holgura
+        self.y = y  # duales del solver (para completar una base degenerada)
+        self.d = d  # costos reducidos con esos duales
+
+    @classmethod
+    def desde_solucion(cls, prob):
+        variables, filas, A, sentidos, lado_derecho, c, bajo, alto = _matrices(prob)
+        # Dentro de las cotas: CBC puede dejar -1e-13 y la solución se reusa como warm start
+        x = np.clip(np.array([v.varValue or 0.0 for v in variables]), bajo, alto)
+        basicas = (x > bajo + TOLERANCIA) & (x < alto - TOLERANCIA)
+        # Tolerancia relativa al lado derecho: CBC deja residuos del orden de 1e-8 * |b| en filas activas
+        residuo = np.abs(A @ x - lado_derecho)
+        filas_holgura = (sentidos != pulp.LpConstraintEQ) & (residuo > TOLERANCIA * np.maximum(1.0, np.abs(lado_derecho)))
+        y = np.array([r.pi or 0.0 for r in prob.constraints.values()])
+        return cls([v.name for v in variables], filas, x, basicas, filas_holgura, y, c - A.T @ y)
+
+    def evaluar(self, prob):
+        """(x, duales por fila) de la misma base con los coeficientes de prob, o None si no es óptima."""
+        variables, filas, A, sentidos, lado_derecho, c, bajo, alto = _matrices(prob)
+        if [v.name for v in variables] != self.nombres_var or filas != self.nombres_fila:
+            return None
+        m = len(filas)
+        if self.basicas.sum() + self.filas_holgura.sum() != m:
+            return None  # base degenerada: se deja al solver
+        # Columnas de la base: estructurales básicas y holguras (a_i x - s_i = b_i) de filas no activas
+        B = np.hstack([A[:, self.basicas], -np.eye(m)[:, self.filas_holgura]])
+        x = self.x.copy()
+        x[self.basicas] = 0.0
+        try:
+            z = np.linalg.solve(B, lado_derecho - A @ x)
+            y = np.linalg.solve(B.T, np.concatenate([c[self.basicas], np.zeros(self.filas_holgura.sum())]))
+        except np.linalg.LinAlgError:
+            return None
+        k = self.basicas.sum()
+        x[self.basicas] = z[:k]
+        holguras = z[k:]
+        # Factibilidad primal: cotas de las básicas y signo de la holgura según el sentido de la fila
+        if ((x < bajo - TOLERANCIA) | (x > alto + TOLERANCIA)).any():
+            return None
+        if (holguras * sentidos[self.filas_holgura] < -TOLERANCIA).any():
+            return None
+        # Factibilidad dual: costos reducidos de las no básicas y duales de las filas activas
+        d = c - A.T @ y
+        en_cota_inferior = ~self.basicas & (np.abs(x - bajo) <= TOLERANCIA)
+        if (d[en_cota_inferior] < -TOLERANCIA).any() or (d[~self.basicas & ~en_cota_inferior] > TOLERANCIA).any():
+            return None
+        activas = ~self.filas_holgura & (sentidos != pulp.LpConstraintEQ)
+        if (y[activas] * sentidos[activas] < -TOLERANCIA).any():
+            return None
+        return x, y
+
+    def _completar(self, A, sentidos):
+        """
+        Base con m columnas independientes: la de la solución más, si es degenerada, holguras
+        de filas activas y variables no básicas (en su cota). None si no se puede completar.
+        """
+        m = A.shape[0]
+        basicas, holgura = self.basicas.copy(), self.filas_holgura.copy()
+        if basicas.sum() + holgura.sum() > m:
+            return None
+        columnas = [A[:, j] for j in np.flatnonzero(basicas)] + [-np.eye(m)[:, i] for i in np.flatnonzero(holgura)]
+        rango = np.linalg.matrix_rank(np.array(columnas).T) if columnas else 0
+        if rango < len(columnas):
+            return None
+        candidatas = [("fila", i) for i in np.flatnonzero(~holgura & (sentidos != pulp.LpConstraintEQ))]
+        candidatas += [("var", j) for j in np.flatnonzero(~basicas)]
+        if self.y is not None:
+            # Primero las columnas con dual o costo reducido nulo: las que la base del solver tenía en cero
+            candidatas.sort(key=lambda t: abs(self.y[t[1]]) if t[0] == "fila" else abs(self.d[t[1]]))
+        for tipo, k in candidatas:
+            if rango == m:
+                break
+            columna = -np.eye(m)[:, k] if tipo == "fila" else A[:, k]
+            if np.linalg.matrix_rank(np.array(columnas + [columna]).T) > rango:
+                columnas.append(columna)
+                rango += 1
+                if tipo == "fila":
+                    holgura[k] = True
+                else:
+                    basicas[k] = True
+        return (basicas, holgura) if rango == m else None
+
+    def optima_con_objetivos(self, A, sentidos, bajo, C):
+        """
+        Máscara de las filas de C (objetivos x variables, en el orden de _matrices) con las que
+        la solución sigue siendo óptima. Solo cambia el objetivo, así que x sigue siendo
+        factible y basta la factibilidad dual de la base, evaluada para todos los objetivos a la
+        vez (B^T Y = C_B, D = C - Y A). Si la base es degenerada se completa con columnas en
+        cota: la condición sigue siendo suficiente.
+        """
+        C = np.atleast_2d(C)
+        base = self._completar(A, sentidos)
+        if base is None:
+            return np.zeros(len(C), dtype=bool)
+        basicas, holgura = base
+        m = A.shape[0]
+        B = np.hstack([A[:, basicas], -np.eye(m)[:, holgura]])
+        C_B = np.hstack([C[:, basicas], np.zeros((len(C), holgura.sum()))])
+        try:
+            Y = np.linalg.solve(B.T, C_B.T).T
+        except np.linalg.LinAlgError:
+            return np.zeros(len(C), dtype=bool)
+        D = C - Y @ A
+        en_cota_inferior = ~basicas & (np.abs(self.x - bajo) <= TOLERANCIA)
+        optimas = (D[:, en_cota_inferior] >= -TOLERANCIA).all(axis=1)
+        optimas &= (D[:, ~basicas & ~en_cota_inferior] <= TOLERANCIA).all(axis=1)
+        # Duales en la escala de cada fila (coeficientes de miles en vitaminas, p. ej.)
+        activas = ~holgura & (sentidos != pulp.LpConstraintEQ)
+        escala = np.maximum(1.0, np.abs(A[activas]).max(axis=1)) if activas.any() else 1.0
+        optimas &= (Y[:, activas] * sentidos[activas] * escala >= -TOLERANCIA).all(axis=1)
+        return optimas
+
+class IncrementalSolver:
+    def __init__(self, formulator):
+        self.formulator = formulator
+        self.clave = clave_estructura(formulator)
+        self.resultado = None
+        self._base = None
+        self._modelo = None  # (prob, ingredient_vars) del último resultado
+
+    def solve(self, progress=None, should_cancel=None):
+        """Formulación completa (misma interfaz que DietFormulator.solve, para el JobManager)."""
+        f = self.formulator
+        f._etapa("build", progress, should_cancel)
+        with span("model.build"):
+            prob, ingredient_vars = f._build_problem()
+        self.resultado = f._resolver_problema(prob, ingredient_vars, progress, should_cancel)
+        self._base = _Base.desde_solucion(prob) if self.resultado.get("success", False) else None
+        self._modelo = (prob, ingredient_vars)
+        return self.resultado
+
+    def compatible(self, formulator):
+        return self._base is not None and clave_estructura(formulator) == self.clave
+
+    def _modelo_actualizado(self, formulator, cambios):
+        """
+        Solo precios y el presolve conserva los mismos ingredientes: se cambian los
+        coeficientes del objetivo del modelo anterior. Si no, se reconstruye el modelo.
+        """
+        prob, ingredient_vars = self._modelo
+        if any(columna != "precio" for _, columna, _, _ in cambios):
+            return formulator._build_problem()
+        presolved = formulator._presolve()
+        if list(presolved.labels) != list(ingredient_vars):
+            return formulator._build_problem()
+        for label, precio in zip(presolved.labels, presolved.precios):
+            if prob.objective.get(ingredient_vars[label]) != precio:
+                prob.objective[ingredient_vars[label]] = float(precio)
+        formulator.presolve_report = presolved.reporte
+        formulator.presolve_report["filas"] = self.formulator.presolve_report["filas"]
+        formulator.categorias_sin_ingredientes = self.formulator.categorias_sin_ingredientes
+        return prob, ingredient_vars
+
+    def actualizar(self, formulator):
+        """
+        Re-formula con la matriz editada de formulator (debe ser compatible). Retorna el
+        resultado de DietFormulator con "incremental": {"metodo" ("sin_cambios", "analitico" o
+        "re_solve"), "cambios" (celdas modificadas), "tiempo_s"}.
+        """
+        inicio = time.perf_counter()
+        cambios = celdas_modificadas(self.formulator.ingredients_df, formulator.ingredients_df)
+        if not cambios:
+            metodo, resultado = "sin_cambios", copy.copy(self.resultado)
+        else:
+            with span("incremental.build"):
+                prob, ingredient_vars = self._modelo_actualizado(formulator, cambios)
+            with span("incremental.basis"):
+                solucion = self._base.evaluar(prob)
+            if solucion is not None:
+                metodo = "analitico"
+                incr("incremental.analytic")
+                x, y = solucion
+                for var, valor in zip(prob.variables(), x):
+                    var.varValue = float(valor)
+                for restriccion, dual in zip(prob.constraints.values(), y):
+                    restriccion.pi = float(dual)
+                with span("model.collect"):
+                    resultado = formulator._collect_results(ingredient_vars, prob)
+            else:
+                metodo = "re_solve"
+                # Punto de partida: la solución anterior (CBC lo usa como solución inicial)
+                anteriores = dict(zip(self._base.nombres_var, self._base.x))
+                for var in prob.variables():
+                    if var.name in anteriores:
+                        var.setInitialValue(float(anteriores[var.name]))
+                solver = formulator.solver
+                formulator.solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True) if solver is None else solver
+                try:
+                    resultado = formulator._resolver_problema(prob, ingredient_vars)
+                finally:
+                    formulator.solver = solver
+            if resultado.get("success", False):
+                self._base = _Base.desde_solucion(prob)
+                self.formulator, self.resultado, self._modelo = formulator, resultado, (prob, ingredient_vars)
+        resultado["incremental"] = {"metodo": metodo, "cambios": cambios, "tiempo_s": time.perf_counter() - inicio}
+        return resultado
+
+# --- Caché de solvers por proceso (fuera de st.session_state) ---
+_SOLVERS = OrderedDict()
+_LOCK = threading.Lock()
+MAX_SOLVERS = 16
+
+def registrar_solver(solver):
+    """Guarda el IncrementalSolver en la caché del proceso y retorna su clave."""
+    clave = uuid.uuid4().hex[:12]
+    with _LOCK:
+        _SOLVERS[clave] = solver
+        while len(_SOLVERS) > MAX_SOLVERS:
+            _SOLVERS.popitem(last=False)
+    return clave
+
+def obtener_solver(clave):
+    """IncrementalSolver registrado con esa clave, o None si no existe o ya se descartó."""
+    with _LOCK:
+        if clave not in _SOLVERS:
+            return None
+        _SOLVERS.move_to_end(clave)
+        return _SOLVERS[clave]
@@ -0,0 +1,134 @@
+"""
+Trabajos de formulación en segundo plano.
+
+La app envía la formulación a un JobManager compartido por el proceso y solo guarda el
+id del trabajo en la sesión; en cada rerun consulta el estado (etapas build / solve /
+collect) sin bloquear el script de Streamlit.
+
+- Solicitudes idénticas en curso (misma clave) se deduplican: se retorna el mismo id y
+  se suma un suscriptor al trabajo. cancel resta un suscriptor; el trabajo solo se
+  cancela cuando lo cancela el último (una sesión no cancela el trabajo de otra).
+- La cancelación se revisa antes de cada etapa y durante la etapa solve: el solver corre
+  en un proceso propio (solver_portfolio.resolver_en_proceso) que se termina junto con
+  CBC, así un worker del pool no queda ocupado con una formulación cancelada.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from optimization import ETAPAS_FORMULACION, FormulationCancelled
+
+ESTADOS_FINALES = ("terminado", "cancelado", "error")
+
+def clave_formulacion(ingredientes_df, requirements, limits, ratios=None, diet_type=None):
+    """Huella de los datos de entrada de una formulación (para deduplicar trabajos)."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(ingredientes_df, index=True).values.tobytes())
+    h.update(json.dumps([list(ingredientes_df.columns), requirements, limits, ratios or [], diet_type], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+class FormulationJob:
+    def __init__(self, clave, formulator, contexto=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.clave = clave
+        self.formulator = formulator
+        self.contexto = contexto or {}
+        self.estado = "pendiente"
+        self.etapa = None
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+        self.suscriptores = 1
+        self._cancelar = threading.Event()
+
+    @property
+    def finalizado(self):
+        return self.estado in ESTADOS_FINALES
+
+    @property
+    def progreso(self):
+        """Fracción completada (0-1) según la etapa en curso."""
+        if self.estado == "terminado":
+            return 1.0
+        if self.etapa not in ETAPAS_FORMULACION:
+            return 0.0
+        return ETAPAS_FORMULACION.index(self.etapa) / len(ETAPAS_FORMULACION)
+
+    def cancelar(self):
+        self._cancelar.set()
+        if self.estado == "pendiente":
+            self._finalizar("cancelado")
+
+    def _finalizar(self, estado):
+        self.estado = estado
+        self.terminado = time.time()
+
+    def _marcar_etapa(self, etapa):
+        self.estado = "corriendo"
+        self.etapa = etapa
+
+    def ejecutar(self):
+        if self._cancelar.is_set():
+            self._finalizar("cancelado")
+            return
+        try:
+            self.resultado = self.formulator.solve(
+                progress=self._marcar_etapa, should_cancel=self._cancelar.is_set
+            )
+            self._finalizar("cancelado" if self._cancelar.is_set() else "terminado")
+        except FormulationCancelled:
+            self._finalizar("cancelado")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self._finalizar("error")
+
+class JobManager:
+    def __init__(self, max_workers=2, ttl_s=600):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="formulacion")
+        self._jobs = {}
+        self._en_curso = {}  # clave -> job_id
+        self._lock = threading.Lock()
+        self.ttl_s = ttl_s
+
+    def submit(self, clave, formulator, contexto=None):
+        """Envía una formulación; si ya hay una idéntica en curso retorna su id."""
+        with self._lock:
+            self._purgar()
+            job_id = self._en_curso.get(clave)
+            if job_id is not None and not self._jobs[job_id].finalizado:
+                self._jobs[job_id].suscriptores += 1
+                return job_id
+            job = FormulationJob(clave, formulator, contexto)
+            self._jobs[job.id] = job
+            self._en_curso[clave] = job.id
+        self._pool.submit(job.ejecutar)
+        return job.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Retira un suscriptor del trabajo; lo cancela si era el último."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finalizado:
+                return
+            job.suscriptores -= 1
+            if job.suscriptores > 0:
+                return
+            if self._en_curso.get(job.clave) == job_id:
+                del self._en_curso[job.clave]
+        job.cancelar()
+
+    def _purgar(self):
+        limite = time.time() - self.ttl_s
+        for job_id in [j.id for j in self._jobs.values() if j.finalizado and j.terminado < limite]:
+            job = self._jobs.pop(job_id)
+            if self._en_curso.get(job.clave) == job_id:
+                del self._en_curso[job.clave]
@@ -0,0 +1,183 @@
+"""
+Modo canil: pocas fórmulas compartidas para muchos animales.
+
+1. MER y requerimientos diarios de todos los animales en forma vectorizada
+   (calcular_mer_vector y ReferenceRegistry.requerimientos_diarios_matriz). Los animales
+   sin edad o peso válidos (batch_formulate.validar_perfil) quedan con estado "error" y
+   el motivo en el mensaje.
+2. Densidad de requerimientos por kcal: r_aj = R_aj / MER_a. Una fórmula con nutrientes
+   n_j por kg, dada en la dosis que cubre la energía del animal, le aporta MER_a * n_j / EM.
+3. Agrupamiento: dos animales comparten fórmula si ninguna densidad de su grupo supera la
+   propia en más de la tolerancia (r_Gj <= (1 + tol) * r_aj, con r_G el máximo del grupo).
+   Se agrupa en forma voraz por tabla de referencia: la semilla es el animal restante más
+   exigente por kcal y el grupo son los restantes dentro de la caja [r_s / (1 + tol), r_s].
+   Cuando solo varían los nutrientes que no escalan con la energía (el caso de las tablas
+   actuales), es un recorte por rangos de MER y el voraz es óptimo.
+4. Una formulación por grupo con la envolvente r_G a la energía del animal de mayor MER y
+   la dosis de referencia (mismo criterio que batch_formulate).
+5. Dosis diaria por animal: d_a = max_j R_aj / n_j (g/día), la menor que cubre todos sus
+   mínimos con la fórmula de su grupo.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_formulate import validar_perfil
+from energy_requirements import calcular_mer_vector
+from nutrient_adjustment import requerimientos_por_kg_dieta
+from optimization import DietFormulator
+from perf import span
+from reference_registry import REGISTRO, etapa_de_condicion
+
+def requerimientos_canil(perfiles, registro=REGISTRO):
+    """
+    perfiles: lista de (id, PerfilMascota). Retorna DataFrame con id, especie, condicion,
+    edad, peso, mer_kcal, tabla (posición en el registro o -1) y mensaje, y la matriz de
+    mínimos diarios (animales x registro.nutrientes).
+    """
+    ids = [pet_id for pet_id, _ in perfiles]
+    animales = pd.DataFrame([p.to_dict() for _, p in perfiles], index=range(len(perfiles)))
+    animales.insert(0, "id", ids)
+    invalidos = {}
+    for n, (_, perfil) in enumerate(perfiles):
+        try:
+            validar_perfil(perfil)
+        except ValueError as e:
+            invalidos[n] = str(e)
+    # Edad y peso inválidos quedan en NaN (sin MER) y el animal se reporta con su error
+    validos = ~animales.index.isin(list(invalidos))
+    for campo in ("edad", "peso"):
+        animales[campo] = pd.to_numeric(animales[campo].where(validos), errors="coerce")
+    animales["mer_kcal"] = calcular_mer_vector(
+        animales["especie"], animales["condicion"], animales["peso"], animales["edad"].astype(float) * 12
+    )
+    tabla = np.full(len(animales), -1, dtype=int)
+    mensaje = np.full(len(animales), "", dtype=object)
+    etapas = animales["condicion"].map(etapa_de_condicion)
+    for (especie, etapa), filas in animales.groupby([animales["especie"], etapas]).groups.items():
+        try:
+            tabla[filas] = registro.indices([registro.resolver(especie, etapa)])[0]
+        except ValueError as e:
+            mensaje[filas] = str(e)
+    sin_energia = np.isnan(animales["mer_kcal"].to_numpy()) & (tabla >= 0)
+    mensaje[sin_energia] = "No se pudo calcular el requerimiento energético."
+    tabla[sin_energia] = -1
+    for n, error in invalidos.items():
+        tabla[n] = -1
+        mensaje[n] = error
+    animales["tabla"] = tabla
+    animales["mensaje"] = mensaje
+
+    minimos = np.full((len(animales), len(registro.nutrientes)), np.nan)
+    validos = tabla >= 0
+    if validos.any():
+        minimos[validos] = registro.requerimientos_diarios_matriz(tabla[validos], animales["mer_kcal"].to_numpy()[validos])
+    return animales, minimos
+
+def agrupar(densidades, tablas, tolerancia):
+    """
+    densidades: requerimientos por kcal (animales x nutrientes, NaN = sin mínimo).
+    Retorna el número de grupo de cada animal (-1 para tabla < 0).
+    """
+    grupos = np.full(len(tablas), -1, dtype=int)
+    limite = np.log1p(tolerancia)
+    siguiente = 0
+    for tabla in np.unique(tablas[tablas >= 0]):
+        filas = np.flatnonzero(tablas == tabla)
+        d = densidades[filas]
+        columnas = (np.nan_to_num(d, nan=0.0) > 0).all(axis=0)
+        log_d = np.log(d[:, columnas])
+        restantes = np.ones(len(filas), dtype=bool)
+        while restantes.any():
+            candidatos = np.flatnonzero(restantes)
+            semilla = candidatos[np.argmax(log_d[candidatos].sum(axis=1))]
+            diferencia = log_d[semilla] - log_d
+            miembros = restantes & (diferencia >= -1e-12).all(axis=1) & (diferencia <= limite + 1e-12).all(axis=1)
+            grupos[filas[miembros]] = siguiente
+            restantes &= ~miembros
+            siguiente += 1
+    return grupos
+
+def _requerimientos_grupo(registro, tabla, densidad, energia):
+    """Requerimientos diarios {nutriente: {"min", "max", "unit"}} de la envolvente del grupo."""
+    return {
+        registro.nutrientes[j]: {
+            "min": None if np.isnan(densidad[j]) else float(densidad[j] * energia),
+            "max": None,
+            "unit": registro.unidades[j],
+        }
+        for j in np.flatnonzero(registro.presentes[tabla])
+    }
+
+def dosis_diarias(minimos, aportes):
+    """
+    d_a = max_j R_aj / n_j en kg/día sobre los nutrientes con mínimo y aporte > 0.
+    Retorna (dosis, posición del nutriente limitante, máscara de mínimos sin aporte).
+    """
+    con_minimo = np.nan_to_num(minimos, nan=0.0) > 0
+    con_aporte = aportes[None, :] > 0
+    cociente = np.where(con_minimo & con_aporte, np.nan_to_num(minimos, nan=0.0) / np.where(con_aporte, aportes, 1.0), 0.0)
+    return cociente.max(axis=1), cociente.argmax(axis=1), con_minimo & ~con_aporte
+
+def formular_canil(ingredientes_df, perfiles, tolerancia=0.1, dosis_g=1000, limits=None, solver=None, registro=REGISTRO):
+    """
+    Retorna dict con:
+      "success", "mascotas" (DataFrame por animal: grupo, mer_kcal, dosis_g, energia_kcal,
+      nutriente_limitante, estado, mensaje), "grupos" (lista por fórmula con su resultado de
+      DietFormulator, animales y rango de MER), "n_formulas" y "tiempo_s".
+    """
+    if tolerancia < 0:
+        raise ValueError("La tolerancia del canil debe ser >= 0")
+    inicio = time.perf_counter()
+    with span("kennel.requirements"):
+        animales, minimos = requerimientos_canil(perfiles, registro)
+        mer = animales["mer_kcal"].to_numpy(dtype=float)
+        densidades = minimos / mer[:, None]
+    with span("kennel.grouping"):
+        animales["grupo"] = agrupar(densidades, animales["tabla"].to_numpy(), tolerancia)
+
+    columnas_nut = np.array(registro.nutrientes, dtype=object)
+    animales["estado"] = np.where(animales["grupo"] >= 0, "ok", "error")
+    for columna in ("dosis_g", "energia_kcal"):
+        animales[columna] = np.nan
+    animales["nutriente_limitante"] = ""
+    grupos = []
+    for g, filas in animales[animales["grupo"] >= 0].groupby("grupo").groups.items():
+        filas = np.asarray(filas)
+        tabla = int(animales.at[filas[0], "tabla"])
+        envolvente = np.fmax.reduce(densidades[filas], axis=0)
+        energia = float(mer[filas].max())
+        requerimientos = requerimientos_por_kg_dieta(_requerimientos_grupo(registro, tabla, envolvente, energia), dosis_g)
+        formulator = DietFormulator(ingredientes_df, list(requerimientos), requerimientos, limits=limits, solver=solver)
+        with span("kennel.formulate"):
+            result = formulator.solve()
+        grupos.append({
+            "grupo": int(g),
+            "tabla": registro.claves[tabla],
+            "animales": animales.loc[filas, "id"].tolist(),
+            "mer_kcal": (float(mer[filas].min()), energia),
+            "result": result,
+        })
+        if not result.get("success", False):
+            animales.loc[filas, "estado"] = "fallo"
+            animales.loc[filas, "mensaje"] = result.get("message", "")
+            continue
+        aportes = np.array([result["nutritional_values"].get(n, 0.0) for n in columnas_nut], dtype=float)
+        dosis_kg, limitante, sin_aporte = dosis_diarias(minimos[filas], aportes)
+        # Redondeo hacia arriba a 0.1 g para no quedar por debajo de ningún mínimo
+        animales.loc[filas, "dosis_g"] = np.ceil(dosis_kg * 10000 - 1e-9) / 10
+        animales.loc[filas, "nutriente_limitante"] = columnas_nut[limitante]
+        if "EM" in result["nutritional_values"]:
+            animales.loc[filas, "energia_kcal"] = np.round(dosis_kg * result["nutritional_values"]["EM"], 1)
+        for fila, faltantes in zip(filas, sin_aporte):
+            if faltantes.any():
+                animales.at[fila, "mensaje"] = f"La fórmula no aporta: {', '.join(columnas_nut[faltantes])}"
+    animales["mer_kcal"] = animales["mer_kcal"].round(2)
+    return {
+        "success": bool(grupos) and all(g["result"].get("success", False) for g in grupos),
+        "mascotas": animales.drop(columns=["tabla"]),
+        "grupos": grupos,
+        "n_formulas": len(grupos),
+        "tiempo_s": time.perf_counter() - inicio,
+    }
@@ -0,0 +1,382 @@
+"""
+Prueba de carga local: cuántas sesiones concurrentes soporta un servidor.
+
+Simula N sesiones de nutricionistas que repiten el flujo de la app (cargar la matriz,
+seleccionar ingredientes, formular, dibujar los gráficos) contra una matriz de
+ingredientes sintética, sin red. Dos modos:
+
+- pipeline (por defecto): cada sesión es un hilo de este proceso, como las sesiones de un
+  servidor de Streamlit. Comparten lo mismo que en la app: la biblioteca de ingredientes
+  (shared_data), un JobManager con los workers de formulación de la app y la caché de
+  figuras (charts.FIGURAS). La formulación se envía al JobManager y la sesión sondea el
+  trabajo, como el botón "Formular dieta automática".
+- app: cada sesión es un proceso con una instancia de app.py sin navegador
+  (bench_app.flujo, AppTest). No hay cachés compartidas entre sesiones, pero el CPU y la
+  memoria de cada proceso son exactamente los de su sesión.
+
+Se prueba una escalera de niveles de concurrencia (--sesiones 1,2,4,8) y por nivel se
+reporta:
+
+    flujos/s              flujos completos por segundo
+    p50/p95/p99           latencia del flujo completo (y de formular)
+    cola p95              espera de la formulación antes de que un worker la tome (pipeline)
+    solves máx            formulaciones simultáneas observadas (pipeline)
+    CPU/sesión            pipeline: CPU del hilo de la sesión y del worker en sus formulaciones;
+                          app: CPU del proceso de la sesión
+    CBC/flujo             CPU de los subprocesos del solver por flujo
+    estado KB/sesión      lo que la sesión guarda (matriz seleccionada, requerimientos,
+                          resultado), medido como en reporte_memoria_sesion
+    RSS MB/sesión         pipeline: crecimiento de memoria del proceso / sesiones;
+                          app: memoria máxima del proceso de la sesión
+
+La concurrencia del solver se satura en el último nivel a partir del cual agregar
+sesiones no sube los flujos/s en más de --umbral (10 %): desde ahí las sesiones extra
+solo esperan en la cola.
+
+Uso:
+    python load_test.py                                  # pipeline, 1,2,4,8 sesiones, 3 flujos c/u
+    python load_test.py --sesiones 1,4,16 --workers 4    # JobManager con 4 workers
+    python load_test.py --modo app --sesiones 1,2,4 --iteraciones 1
+    python load_test.py --json > carga.json
+
+Retorna código 1 si algún flujo termina con error.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: sin CPU de subprocesos ni memoria máxima
+    resource = None
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+if DIRECTORIO not in sys.path:
+    sys.path.insert(0, DIRECTORIO)
+
+WORKERS_APP = 2  # JobManager(max_workers=2) de get_job_manager en app.py
+POR_CATEGORIA = 2
+DOSIS_G = 1000
+CONDICIONES = ["adulto_entero", "adulto_castrado", "cachorro_>4m", "obesidad"]
+UNIDAD_COSTO = "USD/ton"
+
+def _percentiles(valores):
+    if not valores:
+        return {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    return dict(zip(("p50", "p95", "p99"), np.percentile(valores, [50, 95, 99]).tolist()))
+
+def _rss_bytes():
+    """Memoria residente actual del proceso (Linux: /proc; si no, la máxima de getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return _rss_max_bytes()
+
+def _rss_max_bytes():
+    if resource is None:
+        return 0
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == "darwin" else maximo * 1024
+
+def _cpu_subprocesos():
+    if resource is None:
+        return 0.0
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+class MonitorSolver:
+    """Formulaciones en curso y máximo simultáneo (se usa como context manager en el worker)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.activas = 0
+        self.maximo = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.activas += 1
+            self.maximo = max(self.maximo, self.activas)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.activas -= 1
+
+class _FormulacionMedida:
+    """IncrementalSolver para el JobManager que registra su inicio y el CPU del worker."""
+
+    def __init__(self, solver, monitor):
+        self.solver = solver
+        self.monitor = monitor
+        self.inicio = None
+        self.cpu_s = 0.0
+
+    def solve(self, progress=None, should_cancel=None):
+        self.inicio = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            with self.monitor:
+                return self.solver.solve(progress=progress, should_cancel=should_cancel)
+        finally:
+            self.cpu_s = time.thread_time() - cpu
+
+@contextmanager
+def _medir(latencias, operacion):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        latencias.setdefault(operacion, []).append(time.perf_counter() - inicio)
+
+def _graficos(result, df):
+    """Figuras de la pestaña Gráficos (costo y aporte por nutriente) con la caché compartida. Retorna bytes."""
+    from charts import FIGURAS, figura_aporte, figura_costo, huella_formula
+
+    nombres = np.array(result.ingredientes.nombres, dtype=object)[result.usados].tolist()
+    inclusion = result.inclusion[result.usados] * 100
+    precios = df.set_index("Ingrediente")["precio"].reindex(nombres).to_numpy(dtype=float)
+    colores = ["#19345c"] * len(nombres)
+    huella = huella_formula(result.aportes_frame().reset_index())
+    _, _, total = FIGURAS.obtener(
+        (huella, "costo", "Barras", UNIDAD_COSTO),
+        lambda: (figura_costo("Barras", nombres, precios * inclusion / 10, inclusion, colores, UNIDAD_COSTO), None),
+    )
+    for j, nut in enumerate(result.nutrientes.nombres):
+        aportes = result.aportes[:, j]
+        suma = aportes.sum()
+        porc = aportes * 100 / suma if suma else np.zeros(len(aportes))
+        total += FIGURAS.obtener(
+            (huella, "aporte", nut, "base"),
+            lambda: (figura_aporte(nut, nombres, aportes, porc, colores, ""), None),
+        )[2]
+    return total
+
+def sesion_pipeline(i, matriz, iteraciones, job_manager, monitor, semilla=0, pausa_s=0.0, sondeo_s=0.05):
+    """Una sesión simulada en este proceso. Retorna sus latencias, CPU, estado y errores."""
+    from energy_requirements import calcular_mer
+    from jobs import clave_formulacion
+    from incremental import IncrementalSolver
+    from nutrient_adjustment import requerimientos_para_mascota, requerimientos_por_kg_dieta
+    from optimization import DietFormulator
+    from shared_data import obtener_biblioteca, tamano_aproximado
+    import pulp
+
+    solver = pulp.PULP_CBC_CMD(msg=False)
+    rng = np.random.default_rng(semilla + i)
+    cpu = time.thread_time()
+    latencias, espera_cola, estado = {}, [], {}
+    cpu_workers, bytes_graficos, fallidas, errores = 0.0, 0, 0, []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        try:
+            with _medir(latencias, "matriz"):
+                biblioteca = obtener_biblioteca(matriz, "matriz.csv")
+            with _medir(latencias, "seleccion"):
+                nombres = []
+                for cat in sorted(set(biblioteca.categorias)):
+                    disponibles = biblioteca.ingredientes_por_categoria(cat)
+                    nombres += list(rng.choice(disponibles, size=min(POR_CATEGORIA, len(disponibles)), replace=False))
+                df = biblioteca.frame(biblioteca.indices(nombres))
+            with _medir(latencias, "requerimientos"):
+                condicion = str(rng.choice(CONDICIONES))
+                energia = calcular_mer("perro", condicion, float(rng.uniform(4, 40)), edad_meses=float(rng.uniform(6, 120)))
+                requerimientos = requerimientos_por_kg_dieta(
+                    requerimientos_para_mascota(energia, "perro", condicion)[0], DOSIS_G
+                )
+            with _medir(latencias, "formular"):
+                formulacion = _FormulacionMedida(
+                    IncrementalSolver(DietFormulator(df, list(requerimientos), requerimientos, solver=solver)), monitor
+                )
+                enviado = time.perf_counter()
+                job = job_manager.get(job_manager.submit(
+                    clave_formulacion(df, requerimientos, {"min": {}, "max": {}}), formulacion,
+                ))
+                while not job.finalizado:
+                    time.sleep(sondeo_s)
+            if job.estado != "terminado":
+                raise RuntimeError(job.error or job.estado)
+            if job.formulator is formulacion:  # si no, se reutilizó un trabajo idéntico de otra sesión
+                espera_cola.append(formulacion.inicio - enviado)
+                cpu_workers += formulacion.cpu_s
+            result = job.resultado
+            if result.get("success", False):
+                with _medir(latencias, "graficos"):
+                    bytes_graficos += _graficos(result, df)
+            else:
+                fallidas += 1
+            estado = {"ingredientes_df": df, "nutrientes_requeridos": requerimientos, "last_result": result}
+        except Exception as e:
+            errores.append(f"{type(e).__name__}: {e}")
+        latencias.setdefault("flujo", []).append(time.perf_counter() - inicio)
+        if pausa_s:
+            time.sleep(pausa_s)
+    return {
+        "latencias": latencias,
+        "espera_cola": espera_cola,
+        "cpu_s": time.thread_time() - cpu + cpu_workers,
+        "estado_bytes": tamano_aproximado(estado),
+        "graficos_bytes": bytes_graficos,
+        "sin_solucion": fallidas,
+        "errores": errores,
+    }
+
+def sesion_app(i, matriz, iteraciones, timeout=120, pausa_s=0.0):
+    """Una sesión en un proceso propio con app.py en AppTest (se ejecuta en un worker de proceso)."""
+    import bench_app
+    from shared_data import tamano_aproximado
+
+    bench_app.preparar()
+    cpu = time.process_time()
+    cpu_hijos = _cpu_subprocesos()
+    latencias, errores, fallidas, estado = {}, [], 0, {}
+    for _ in range(iteraciones):
+        try:
+            pasos, resultado = bench_app.flujo(matriz, timeout)
+        except Exception as e:
+            errores.append(f"{type(e).__name__}: {e}")
+            continue
+        for paso in pasos:
+            latencias.setdefault(paso["paso"], []).append(paso["pared_ms"] / 1000)
+            errores += [f"{paso['paso']}: {e}" for e in paso["excepciones"]]
+        latencias.setdefault("flujo", []).append(sum(p["pared_ms"] for p in pasos) / 1000)
+        if resultado is None or not resultado.get("success", False):
+            fallidas += 1
+        estado = {"last_result": resultado}
+        if pausa_s:
+            time.sleep(pausa_s)
+    return {
+        "latencias": latencias,
+        "espera_cola": [],
+        "cpu_s": time.process_time() - cpu,
+        "cpu_solver_s": _cpu_subprocesos() - cpu_hijos,
+        "estado_bytes": tamano_aproximado(estado),
+        "rss_max_bytes": _rss_max_bytes(),
+        "sin_solucion": fallidas,
+        "errores": errores,
+    }
+
+def nivel_pipeline(n, matriz, args):
+    """Ejecuta n sesiones concurrentes en hilos. Retorna (sesiones, métricas del proceso)."""
+    from jobs import JobManager
+
+    job_manager, monitor = JobManager(max_workers=args.workers), MonitorSolver()
+    rss, cbc = _rss_bytes(), _cpu_subprocesos()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n, thread_name_prefix="sesion") as ex:
+        sesiones = list(ex.map(
+            lambda i: sesion_pipeline(i, matriz, args.iteraciones, job_manager, monitor, args.semilla, args.pausa_s),
+            range(n),
+        ))
+    return sesiones, {
+        "duracion_s": time.perf_counter() - inicio,
+        "cpu_solver_s": _cpu_subprocesos() - cbc,
+        "rss_mb_sesion": (_rss_bytes() - rss) / n / 2**20,
+        "solves_max": monitor.maximo,
+    }
+
+def nivel_app(n, matriz, args):
+    """Ejecuta n sesiones concurrentes, un proceso nuevo por sesión."""
+    import multiprocessing
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1) as ex:
+        futuros = [ex.submit(sesion_app, i, matriz, args.iteraciones, args.timeout, args.pausa_s) for i in range(n)]
+        sesiones = [f.result() for f in futuros]
+    return sesiones, {
+        "duracion_s": time.perf_counter() - inicio,
+        "cpu_solver_s": sum(s["cpu_solver_s"] for s in sesiones),
+        "rss_mb_sesion": float(np.mean([s["rss_max_bytes"] for s in sesiones])) / 2**20,
+        "solves_max": None,
+    }
+
+def resumen_nivel(n, sesiones, proceso):
+    """Fila del reporte de un nivel de concurrencia."""
+    flujos = [t for s in sesiones for t in s["latencias"].get("flujo", [])]
+    formular = [t for s in sesiones for t in s["latencias"].get("formular", [])]
+    cola = [t for s in sesiones for t in s["espera_cola"]]
+    return {
+        "sesiones": n,
+        "flujos": len(flujos),
+        "duracion_s": proceso["duracion_s"],
+        "flujos_por_s": len(flujos) / proceso["duracion_s"] if proceso["duracion_s"] else 0.0,
+        **{f"flujo_{k}_s": v for k, v in _percentiles(flujos).items()},
+        **{f"formular_{k}_s": v for k, v in _percentiles(formular).items()},
+        "cola_p95_s": _percentiles(cola)["p95"],
+        "solves_max": proceso["solves_max"],
+        "cpu_s_sesion": float(np.mean([s["cpu_s"] for s in sesiones])),
+        "cpu_solver_s_flujo": proceso["cpu_solver_s"] / len(flujos) if flujos else float("nan"),
+        "estado_kb_sesion": float(np.mean([s["estado_bytes"] for s in sesiones])) / 1024,
+        "graficos_kb_flujo": sum(s.get("graficos_bytes", 0) for s in sesiones) / 1024 / len(flujos) if flujos else 0.0,
+        "rss_mb_sesion": proceso["rss_mb_sesion"],
+        "sin_solucion": sum(s["sin_solucion"] for s in sesiones),
+        "errores": [e for s in sesiones for e in s["errores"]],
+        "operaciones": {
+            op: _percentiles([t for s in sesiones for t in s["latencias"].get(op, [])])
+            for op in dict.fromkeys(op for s in sesiones for op in s["latencias"])
+        },
+    }
+
+def punto_saturacion(filas, umbral=0.1):
+    """Sesiones del último nivel que todavía subió los flujos/s en más de umbral (None si nunca se estanca)."""
+    for anterior, fila in zip(filas, filas[1:]):
+        if fila["flujos_por_s"] < anterior["flujos_por_s"] * (1 + umbral):
+            return anterior["sesiones"]
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga local con sesiones simuladas.")
+    parser.add_argument("--modo", choices=["pipeline", "app"], default="pipeline")
+    parser.add_argument("--sesiones", default="1,2,4,8", help="Niveles de concurrencia separados por coma")
+    parser.add_argument("--iteraciones", type=int, default=3, help="Flujos completos por sesión")
+    parser.add_argument("--workers", type=int, default=WORKERS_APP, help="Workers del JobManager (pipeline)")
+    parser.add_argument("--ingredientes", type=int, default=40, help="Filas de la matriz sintética")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--pausa-s", type=float, default=0.0, help="Tiempo de reflexión entre flujos de una sesión")
+    parser.add_argument("--umbral", type=float, default=0.1, help="Mejora mínima de flujos/s para no considerar saturado")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo de cada ejecución del script (app)")
+    parser.add_argument("--json", action="store_true", help="Imprime los niveles como JSON")
+    args = parser.parse_args(argv)
+
+    import bench_app
+
+    niveles = [int(n) for n in args.sesiones.split(",") if n.strip()]
+    matriz = bench_app.matriz_sintetica(args.ingredientes, args.semilla)
+    filas = []
+    with bench_app.perfil_preservado():
+        for n in niveles:
+            sesiones, proceso = (nivel_app if args.modo == "app" else nivel_pipeline)(n, matriz, args)
+            filas.append(resumen_nivel(n, sesiones, proceso))
+    saturacion = punto_saturacion(filas, args.umbral)
+
+    if args.json:
+        print(json.dumps({"modo": args.modo, "workers": args.workers, "saturacion": saturacion, "niveles": filas}, indent=2))
+    else:
+        print(
+            f"{'sesiones':>8}{'flujos/s':>10}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'form p95':>10}{'cola p95':>10}"
+            f"{'solves':>8}{'CPU s/ses':>11}{'CBC s/flujo':>12}{'estado KB':>11}{'RSS MB/ses':>12}{'errores':>9}"
+        )
+        for f in filas:
+            print(
+                f"{f['sesiones']:>8}{f['flujos_por_s']:>10.2f}{f['flujo_p50_s']:>8.2f}{f['flujo_p95_s']:>8.2f}"
+                f"{f['flujo_p99_s']:>8.2f}{f['formular_p95_s']:>10.2f}{f['cola_p95_s']:>10.2f}"
+                f"{'-' if f['solves_max'] is None else f['solves_max']:>8}{f['cpu_s_sesion']:>11.2f}"
+                f"{f['cpu_solver_s_flujo']:>12.3f}{f['estado_kb_sesion']:>11.1f}{f['rss_mb_sesion']:>12.1f}{len(f['errores']):>9}"
+            )
+        if saturacion is None:
+            print("Los flujos/s siguen subiendo en todos los niveles: probar con más sesiones.")
+        else:
+            print(f"La concurrencia se satura en {saturacion} sesiones (más sesiones no suben los flujos/s en más de {args.umbral:.0%}).")
+    errores = [e for f in filas for e in f["errores"]]
+    for error in errores[:10]:
+        print(f"ERROR: {error}")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
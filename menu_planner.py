@@ -0,0 +1,176 @@
+"""
+Menú de rotación semanal: N recetas diarias formuladas en conjunto.
+
+- Los requerimientos se cumplen sobre el promedio de los N días (mínimos blandos con
+  holgura penalizada, máximos duros, igual que DietFormulator).
+- Cada día debe quedar dentro de una banda de tolerancia: nutriente >= (1 - tol) * mínimo
+  y <= (1 + tol) * máximo. Inclusiones, relaciones y rangos por categoría se aplican a
+  cada día.
+- Variedad: un ingrediente puede usarse a lo sumo max_dias días (binaria por día e
+  ingrediente). Los ingredientes con inclusión mínima > 0 quedan exentos.
+
+Resolución en dos fases:
+1. Rotación: se resuelve un día a la vez sobre un solo modelo LP, prohibiendo los
+   ingredientes que ya alcanzaron max_dias (cota superior 0) y partiendo de la solución
+   del día anterior. Cada día cumple los requerimientos completos, así que la rotación es
+   factible para el modelo conjunto. Si un día no tiene solución con las prohibiciones se
+   formula sin ellas: esa rotación no respeta max_dias y no se usa como warm start.
+2. MILP conjunto: N copias del modelo diario de DietFormulator (filas renombradas por día)
+   más filas semanales y de variedad, con la rotación como warm start y límite de tiempo.
+   Si no mejora dentro del tiempo, se retorna la rotación; si además no respeta max_dias,
+   el resultado lo indica con "max_dias_respetado": False y una advertencia.
+"""
+import copy
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from perf import span
+
+def _rotacion(formulator, n_dias, max_dias, exentos):
+    """
+    Fase 1: un LP por día con prohibición de ingredientes repetidos. Retorna (lista de
+    {label: x}, si se respetó max_dias), o None si algún día no tiene solución.
+    """
+    prob, ingredient_vars = formulator._build_problem()
+    solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True)
+    usos = {i: 0 for i in ingredient_vars}
+    dias = []
+    respeta_max_dias = True
+    for _ in range(n_dias):
+        for i, var in ingredient_vars.items():
+            var.upBound = 0 if usos[i] >= max_dias and i not in exentos else 1
+        prob.solve(solver)
+        if pulp.LpStatus[prob.status] != "Optimal":
+            # Sin alternativas suficientes: se repite sin prohibir para no dejar el día vacío
+            respeta_max_dias = False
+            for var in ingredient_vars.values():
+                var.upBound = 1
+            prob.solve(solver)
+            if pulp.LpStatus[prob.status] != "Optimal":
+                return None
+        # Dentro de [0, 1]: CBC puede dejar -1e-13 y la rotación se usa como warm start
+        x = {i: min(max(var.varValue or 0.0, 0.0), 1.0) for i, var in ingredient_vars.items()}
+        for i, valor in x.items():
+            usos[i] += valor > 1e-7
+        dias.append(x)
+    return dias, respeta_max_dias
+
+def _modelo_conjunto(formulator, n_dias, tolerancia, max_dias, exentos):
+    prob = pulp.LpProblem("Menu_Semanal", pulp.LpMinimize)
+    dias, objetivos, semanales = [], [], {}
+    for d in range(n_dias):
+        prob_d, vars_d = formulator._build_problem()
+        for var in prob_d.variables():
+            var.name = f"D{d}_{var.name}"
+        for nombre, restriccion in prob_d.constraints.items():
+            limite = -restriccion.constant
+            if nombre.startswith("Min_") and nombre.endswith("_slack"):
+                nut = nombre[len("Min_"):-len("_slack")]
+                sin_holgura = pulp.LpAffineExpression([(v, c) for v, c in restriccion.items() if not v.name.startswith(f"D{d}_Slack_")])
+                semanales.setdefault(("min", nut, limite), []).append(sin_holgura)
+                restriccion.changeRHS(limite * (1 - tolerancia))
+            elif nombre.startswith("Max_"):
+                semanales.setdefault(("max", nombre[len("Max_"):], limite), []).append(pulp.LpAffineExpression(list(restriccion.items())))
+                restriccion.changeRHS(limite * (1 + tolerancia))
+            prob.addConstraint(restriccion, f"D{d}_{nombre}")
+        dias.append(vars_d)
+        objetivos.append(prob_d.objective)
+    prob.setObjective(pulp.lpSum(objetivos) * (1.0 / n_dias))
+
+    holguras = {}
+    for (sentido, nut, limite), expresiones in semanales.items():
+        promedio = pulp.lpSum(expresiones) * (1.0 / n_dias)
+        if sentido == "max":
+            prob += promedio <= limite, f"Semana_Max_{nut}"
+        else:
+            holguras[nut] = pulp.LpVariable(f"Semana_Slack_{nut}", lowBound=0)
+            prob += promedio + holguras[nut] >= limite, f"Semana_Min_{nut}"
+            prob.objective += formulator.min_penalty_weight * holguras[nut]
+
+    usa = {}
+    for i in dias[0]:
+        if i in exentos:
+            continue
+        for d, vars_d in enumerate(dias):
+            usa[d, i] = pulp.LpVariable(f"Usa_{d}_{i}", cat="Binary")
+            prob += vars_d[i] <= usa[d, i], f"Usa_{d}_{i}"
+        prob += pulp.lpSum(usa[d, i] for d in range(n_dias)) <= max_dias, f"Variedad_{i}"
+    return prob, dias, usa
+
+def _cargar_warm_start(prob, dias, usa, rotacion):
+    for vars_d, x in zip(dias, rotacion):
+        for i, var in vars_d.items():
+            var.setInitialValue(x.get(i, 0.0))
+    for (d, i), var in usa.items():
+        var.setInitialValue(1 if rotacion[d].get(i, 0.0) > 1e-7 else 0)
+    # Holguras consistentes con la rotación (la restricción define su valor mínimo)
+    for nombre, restriccion in prob.constraints.items():
+        holgura = [v for v in restriccion if "Slack_" in v.name]
+        if len(holgura) == 1 and restriccion.sense == pulp.LpConstraintGE:
+            resto = sum((v.varValue or 0.0) * c for v, c in restriccion.items() if v is not holgura[0]) + restriccion.constant
+            holgura[0].setInitialValue(max(0.0, -resto))
+
+def planificar_menu(formulator, n_dias=7, tolerancia_diaria=0.2, max_dias=None, tiempo_max_s=5.0):
+    """
+    Retorna dict con:
+      "success", "metodo" ("milp" o "rotacion"), "dias" (resultado de DietFormulator por día),
+      "promedio" (nutrientes promedio de los N días), "cost" (costo promedio por 100 kg),
+      "repeticiones" ({ingrediente: días en que se usa}), "max_dias_respetado" y "tiempo_s".
+    Si el MILP no encuentra solución y la rotación tuvo que repetir ingredientes más de
+    max_dias días, se retorna igual con "max_dias_respetado": False y "advertencia".
+    """
+    inicio = time.perf_counter()
+    if max_dias is None:
+        max_dias = max(1, math.ceil(n_dias * 0.6))
+    # Los ingredientes dominados son justamente los sustitutos que la variedad necesita
+    formulator = copy.copy(formulator)
+    formulator.presolve_dominated = False
+    nombres = formulator.ingredients_df["Ingrediente"]
+    exentos = {i for i in formulator.ingredients_df.index if float(formulator.limits.get("min", {}).get(nombres[i], 0.0)) > 0}
+
+    with span("menu.rotation"):
+        fase1 = _rotacion(formulator, n_dias, max_dias, exentos)
+    if fase1 is None:
+        return {"success": False, "message": "No se pudo formular la dieta diaria con los requerimientos dados."}
+    rotacion, rotacion_respeta = fase1
+
+    with span("menu.joint"):
+        prob, dias, usa = _modelo_conjunto(formulator, n_dias, tolerancia_diaria, max_dias, exentos)
+        if rotacion_respeta:
+            _cargar_warm_start(prob, dias, usa, rotacion)
+        prob.solve(pulp.PULP_CBC_CMD(msg=False, warmStart=True, timeLimit=max(1, int(math.ceil(tiempo_max_s)))))
+    metodo = "milp"
+    if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        # Sin solución del MILP en el tiempo dado: se usa la rotación
+        metodo = "rotacion"
+        for vars_d, x in zip(dias, rotacion):
+            for i, var in vars_d.items():
+                var.varValue = x.get(i, 0.0)
+
+    resultados = [formulator._collect_results(vars_d) for vars_d in dias]
+    promedio = pd.DataFrame([r["nutritional_values"] for r in resultados]).mean().round(4).to_dict()
+    repeticiones = pd.Series(0, index=list(nombres))
+    for r in resultados:
+        repeticiones[list(r["diet"])] += 1
+    resultado = {
+        "success": True,
+        "metodo": metodo,
+        "optimo": metodo == "milp" and prob.sol_status == pulp.LpSolutionOptimal,
+        "dias": resultados,
+        "promedio": promedio,
+        "cost": round(float(np.mean([r["cost"] for r in resultados])), 4),
+        "repeticiones": repeticiones[repeticiones > 0].sort_values(ascending=False).to_dict(),
+        "max_dias": max_dias,
+        "max_dias_respetado": metodo == "milp" or rotacion_respeta,
+        "tiempo_s": time.perf_counter() - inicio,
+    }
+    if not resultado["max_dias_respetado"]:
+        resultado["advertencia"] = (
+            f"No hay ingredientes suficientes para no repetir más de {max_dias} días: "
+            "algunos ingredientes se usan más días que el máximo."
+        )
+    return resultado
@@ -1,3 +1,5 @@
+from reference_registry import REGISTRO, etapa_de_condicion
+
 def ajustar_nutrientes_referencia(nutrientes_ref, energia_kcal_kg_ref=1000, energia_kcal_kg_actual=None):
     """
     Ajusta los valores de referencia de nutrientes proporcionalmente a la energía metabolizable de la mascota.
@@ -28,10 +30,28 @@ def ajustar_nutrientes_referencia(nutrientes_ref, energia_kcal_kg_ref=1000, ener
         }
     return nutrientes_ajustados
 
-# Uso en tu app.py
-energia_actual = calcular_mer(especie, condicion, peso, edad_meses=edad * 12)
-nutrientes_ref_ajustados = ajustar_nutrientes_referencia(
-    NUTRIENTES_REFERENCIA_PERRO,
-    energia_kcal_kg_ref=1000,   # Tu dict es para 1000 kcal/kg
-    energia_kcal_kg_actual=energia_actual
-)
+def requerimientos_para_mascota(energia, especie, condicion=None, estandar=None):
+    """
+    Requerimientos diarios desde la tabla registrada para la especie y etapa de vida
+    (reference_registry). Retorna (requerimientos, clave de la tabla usada).
+    """
+    clave = REGISTRO.resolver(especie, etapa_de_condicion(condicion), estandar)
+    return REGISTRO.requerimientos_diarios(clave, energia), clave
+
+def requerimientos_por_kg_dieta(requerimientos, dosis_g):
+    """
+    Convierte requerimientos diarios a requerimientos por kg de dieta para una dosis (g/día),
+    en el formato que espera DietFormulator: {nutriente: {"min", "max", "unit"}}.
+    Los valores vacíos se dejan en 0.0 (sin restricción), igual que en la pestaña Formulación.
+    """
+    dosis_kg = dosis_g / 1000
+    por_kg = {}
+    for nombre, info in requerimientos.items():
+        min_val = info.get("min")
+        max_val = info.get("max")
+        por_kg[nombre] = {
+            "min": float(min_val) / dosis_kg if min_val not in ["", None] else 0.0,
+            "max": float(max_val) / dosis_kg if max_val not in ["", None] else 0.0,
+            "unit": info.get("unit", ""),
+        }
+    return por_kg
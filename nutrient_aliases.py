@@ -0,0 +1,136 @@
+"""
+Índice de nombres de nutriente: de los nombres de los requerimientos a las columnas de la
+matriz de ingredientes.
+
+Los nombres de las tablas de referencia ("PB", "Ca", "Vitamina E2") no siempre coinciden
+con los encabezados de los proveedores ("pb", "CALCIO", "Vitamina E 2 (UI/kg)"), y un
+requerimiento sin columna no generaba restricción. Cada nombre se lleva a una clave
+normalizada (sin acentos ni mayúsculas, sin espacios, guiones, puntos ni la unidad entre
+paréntesis) y se agregan alias configurables (ALIAS_NUTRIENTES: nombre canónico ->
+otros nombres). El índice de una lista de columnas se construye una sola vez (caché por
+columnas) y resolver un nombre es una búsqueda en un dict:
+
+1. coincidencia exacta con una columna;
+2. la misma clave normalizada que una columna;
+3. la clave de un alias del mismo grupo que una columna.
+
+Si dos columnas distintas dan la misma clave, la clave es ambigua y no se resuelve (solo la
+coincidencia exacta). Los nombres sin columna se reportan en vez de descartarse.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+ALIAS_NUTRIENTES = {
+    "PB": ["Proteína bruta", "Proteína cruda", "Proteína", "CP", "Crude protein"],
+    "EM": ["Energía metabolizable", "ME", "Energía"],
+    "Grasa": ["Grasa bruta", "Extracto etéreo", "EE", "Lípidos", "Fat"],
+    "Ácido Linoleico": ["Linoleico", "C18:2"],
+    "Ca": ["Calcio", "Calcium"],
+    "P": ["Fósforo", "Fósforo total", "Phosphorus"],
+    "Na": ["Sodio", "Sodium"],
+    "Cl": ["Cloro", "Cloruro", "Chloride"],
+    "Lisina": ["Lys"],
+    "Metionina": ["Met"],
+    "Metionina + Cistina": ["Met + Cis", "Met+Cys", "M+C"],
+    "Valina": ["Val"],
+    "Triptófano": ["Trp"],
+    "Fenilalanina": ["Phe"],
+    "Isoleucina": ["Ile"],
+    "Treonina": ["Thr"],
+    "Arginina": ["Arg"],
+    "Leucina": ["Leu"],
+    "Taurina": ["Tau"],
+    "Vitamina E2": ["Vitamina E"],
+    "Vitamina K3": ["Vitamina K", "Menadiona"],
+    "Tiamina - B1": ["Tiamina", "Vitamina B1"],
+    "Riboflavina - B2": ["Riboflavina", "Vitamina B2"],
+    "Piridoxina - B6": ["Piridoxina", "Vitamina B6"],
+    "Cobalamina - B12": ["Cobalamina", "Vitamina B12"],
+    "Ácido fólico": ["Folato", "Vitamina B9"],
+    "Niacina": ["Vitamina B3"],
+    "Ácido pantoténico": ["Pantotenato", "Vitamina B5"],
+    "Biotina": ["Vitamina B7"],
+    "Colina total": ["Colina"],
+    "Hierro": ["Fe"],
+    "Cobre": ["Cu"],
+    "Zinc": ["Zn"],
+    "Manganeso": ["Mn"],
+    "Selenio": ["Se"],
+    "Yodo": ["I"],
+}
+
+_UNIDAD = re.compile(r"\(.*?\)|\[.*?\]")
+_SEPARADORES = re.compile(r"[\s_\-.,:;/]+")
+
+def clave_nutriente(nombre):
+    """'Vitamina E 2 (UI/kg)' -> 'vitaminae2'."""
+    texto = unicodedata.normalize("NFKD", str(nombre)).encode("ascii", "ignore").decode()
+    texto = _UNIDAD.sub("", texto).casefold()
+    return _SEPARADORES.sub("", texto)
+
+class NutrientIndex:
+    """Resolución de nombres de nutriente a columnas de una matriz de ingredientes."""
+
+    __slots__ = ("columnas", "_exactas", "_por_clave", "ambiguas")
+
+    def __init__(self, columnas, alias=None):
+        self.columnas = tuple(columnas)
+        self._exactas = frozenset(self.columnas)
+        self._por_clave = {}
+        self.ambiguas = set()
+        for columna in self.columnas:
+            clave = clave_nutriente(columna)
+            if self._por_clave.setdefault(clave, columna) != columna:
+                self.ambiguas.add(clave)
+        for canonico, otros in (ALIAS_NUTRIENTES if alias is None else alias).items():
+            claves = [clave_nutriente(n) for n in [canonico, *otros]]
+            columna = next((self._por_clave[c] for c in claves if c in self._por_clave and c not in self.ambiguas), None)
+            if columna is not None:
+                for clave in claves:
+                    self._por_clave.setdefault(clave, columna)
+        for clave in self.ambiguas:
+            del self._por_clave[clave]
+
+    def resolver(self, nombre):
+        """Columna para el nombre, o None si no hay (o es ambigua)."""
+        if nombre in self._exactas:
+            return nombre
+        return self._por_clave.get(clave_nutriente(nombre))
+
+@lru_cache(maxsize=64)
+def _indice_por_defecto(columnas):
+    return NutrientIndex(columnas)
+
+def indice_nutrientes(columnas, alias=None):
+    """NutrientIndex de las columnas (compartido por columnas cuando se usan los alias por defecto)."""
+    if alias is None:
+        return _indice_por_defecto(tuple(columnas))
+    return NutrientIndex(columnas, alias)
+
+def alinear_columnas(df, nombres, alias=None):
+    """
+    Copia de df con una columna por cada nombre que se resuelve a otra columna (renombrada,
+    o duplicada si ya la usa otro nombre). Retorna (df, {nombre: columna original}, [nombres
+    sin columna]). Si todos los nombres son columnas exactas retorna el mismo df.
+    """
+    indice = indice_nutrientes(df.columns, alias)
+    por_alias, sin_columna = {}, []
+    for nombre in dict.fromkeys(nombres):
+        columna = indice.resolver(nombre)
+        if columna is None:
+            sin_columna.append(nombre)
+        elif columna != nombre:
+            por_alias[nombre] = columna
+    if not por_alias:
+        return df, por_alias, sin_columna
+    renombrar, copias = {}, {}
+    for nombre, columna in por_alias.items():
+        if columna in renombrar or columna in nombres:
+            copias[nombre] = columna  # la columna ya la usa otro nombre: se duplica
+        else:
+            renombrar[columna] = nombre
+    df = df.rename(columns=renombrar)
+    for nombre, columna in copias.items():
+        df[nombre] = df[renombrar.get(columna, columna)]
+    return df, por_alias, sin_columna
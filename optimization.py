@@ -1,6 +1,19 @@
 import pulp
+import numpy as np
 import pandas as pd
-import math
+from perf import incr, span
+from diet_profiles import DIET_CATEGORY_RANGES
+from formulation_result import UMBRAL_INCLUSION, FormulationResult
+from nutrient_aliases import alinear_columnas
+from presolve import presolve_formulacion, valor_usable
+
+ETAPAS_FORMULACION = ["build", "solve", "collect"]
+
+class FormulationCancelled(Exception):
+    """Se lanza entre etapas cuando la formulación fue cancelada."""
+
+def _coeficientes(df, columna):
+    return pd.to_numeric(df[columna], errors="coerce").fillna(0).to_numpy(dtype=float)
 
 class DietFormulator:
     def __init__(
@@ -11,146 +24,307 @@ class DietFormulator:
         limits: dict = None,
         selected_species: str = None,
         selected_stage: str = None,
-        ratios: list = None,
+        ratios: list = None,  # [{"numerador": "Ca", "denominador": "P", "min": 1.0, "max": 2.0}, ...]
         min_selected_ingredients: dict = None,
-        diet_type: str = None,
+        diet_type: str = None,  # Clave de DIET_CATEGORY_RANGES (rangos de inclusión por categoría)
         min_num_ingredientes: int = 3,
         min_inclusion_pct: float = 0.0,
         max_inclusion_pct: float = 1.0,
         min_penalty_weight: float = 1e5,  # Peso de penalización para mínimos no cumplidos
+        solver=None,  # Solver de PuLP (None = solver por defecto)
+        diagnose_time_limit_s: float = 3.0,  # Tiempo para diagnosticar infactibilidad (0 = no diagnosticar)
+        presolve: bool = True,  # Quitar nutrientes sin restricción y cotas redundantes antes de construir el modelo
+        presolve_dominated: bool = True,  # Quitar ingredientes dominados (depende de los precios)
+        nutrient_aliases: dict = None,  # {nombre canónico: [alias]} (None = nutrient_aliases.ALIAS_NUTRIENTES)
+        portfolio: list = None,  # Configuraciones de solver_portfolio que compiten en paralelo (True = todas; None = usar solver)
+        portfolio_deadline_s: float = 30.0,  # Plazo del portafolio: pasado este tiempo gana la mejor solución recibida
+        portfolio_log=True,  # Registro JSONL de las carreras (True = solver_portfolio.RUTA_LOG; None = no registrar)
     ):
-        self.ingredients_df = ingredients_df
         self.nutrient_list = nutrient_list
         self.requirements = requirements
+        # Requerimientos y relaciones con otro nombre de columna (mayúsculas, acentos, alias) se alinean a la matriz
+        nombres_ratios = [r.get(k) for r in ratios or [] for k in ("numerador", "denominador")]
+        self.ingredients_df, self.nutrientes_por_alias, sin_columna = alinear_columnas(
+            ingredients_df, list(nutrient_list) + [n for n in nombres_ratios if n is not None], nutrient_aliases
+        )
+        # Nutrientes con mínimo o máximo utilizable que no tienen columna: no generan restricción y se reportan
+        self.nutrientes_sin_columna = [
+            n for n in sin_columna
+            if n in requirements and (valor_usable(requirements[n].get("min")) or valor_usable(requirements[n].get("max")))
+        ]
         self.selected_species = selected_species
         self.selected_stage = selected_stage
         self.limits = limits if limits else {"min": {}, "max": {}}
         self.ratios = ratios or []
+        self._ratios = self._validar_ratios()
+        if diet_type is not None and diet_type not in DIET_CATEGORY_RANGES:
+            raise ValueError(f"Tipo de dieta no soportado: {diet_type}. Opciones: {', '.join(DIET_CATEGORY_RANGES)}")
+        self.categorias_sin_ingredientes = []
         self.min_selected_ingredients = min_selected_ingredients or {}
         self.diet_type = diet_type
         self.min_num_ingredientes = min_num_ingredientes
         self.min_inclusion_pct = min_inclusion_pct
         self.max_inclusion_pct = max_inclusion_pct
         self.min_penalty_weight = min_penalty_weight
+        self.solver = solver
+        self.diagnose_time_limit_s = diagnose_time_limit_s
+        self.presolve = presolve
+        self.presolve_dominated = presolve_dominated
+        self.presolve_report = None
+        self.portfolio = portfolio
+        self.portfolio_deadline_s = portfolio_deadline_s
+        self.portfolio_log = portfolio_log
+        self.portfolio_report = None
 
-    def _add_ingredient_inclusion_constraints(self, prob, ingredient_vars):
-        for i in self.ingredients_df.index:
+    def _validar_ratios(self):
+        """Normaliza self.ratios a tuplas (numerador, denominador, min, max); ValueError si no son válidas."""
+        ratios = []
+        for ratio in self.ratios:
+            num, den = ratio.get("numerador"), ratio.get("denominador")
+            faltantes = [n for n in (num, den) if n not in self.ingredients_df.columns]
+            if faltantes:
+                raise ValueError(
+                    f"Relación {num}:{den}: nutrientes sin columna en la matriz de ingredientes: "
+                    f"{', '.join(map(str, faltantes))}"
+                )
+            min_val, max_val = valor_usable(ratio.get("min")), valor_usable(ratio.get("max"))
+            if min_val is None and max_val is None:
+                raise ValueError(f"Relación {num}:{den}: debe tener mínimo o máximo mayor a 0")
+            if min_val is not None and max_val is not None and min_val > max_val:
+                raise ValueError(f"Relación {num}:{den}: el mínimo ({min_val}) es mayor que el máximo ({max_val})")
+            ratios.append((num, den, min_val, max_val))
+        return ratios
+
+    def _categorias(self):
+        """Categoría normalizada de cada ingrediente (misma regla que IngredientLibrary)."""
+        if "Categoría" not in self.ingredients_df.columns:
+            return np.full(len(self.ingredients_df), "Otros", dtype=object)
+        return self.ingredients_df["Categoría"].astype(str).str.strip().str.capitalize().to_numpy()
+
+    def _presolve(self):
+        presolved = presolve_formulacion(
+            self.ingredients_df,
+            self.nutrient_list,
+            self.requirements,
+            self.limits,
+            eliminar_dominados=self.presolve and self.presolve_dominated,
+            eliminar_redundantes=self.presolve,
+            # La dominancia no se mantiene en una relación si cambian sus nutrientes
+            nutrientes_igualdad=[n for num, den, _, _ in self._ratios for n in (num, den)],
+            # Con tipo de dieta, un ingrediente solo puede ser dominado por otro de su categoría
+            grupos=self._categorias() if self.diet_type else None,
+        )
+        presolved.reporte["nutrientes_por_alias"] = self.nutrientes_por_alias
+        return presolved
+
+    def _add_ingredient_inclusion_constraints(self, prob, ingredient_vars, presolved):
+        for i in presolved.labels:
             ing_name = self.ingredients_df.loc[i, "Ingrediente"]
-            max_inc = float(self.limits["max"].get(ing_name, 1.0))
-            min_inc = float(self.limits["min"].get(ing_name, 0.0))
-            prob += ingredient_vars[i] <= max_inc, f"MaxInc_{ing_name}"
-            prob += ingredient_vars[i] >= min_inc, f"MinInc_{ing_name}"
+            if i in presolved.inc_max:
+                prob += ingredient_vars[i] <= presolved.inc_max[i], f"MaxInc_{ing_name}"
+            if i in presolved.inc_min:
+                prob += ingredient_vars[i] >= presolved.inc_min[i], f"MinInc_{ing_name}"
+
+    def _nutrient_expr(self, ingredient_vars, labels, coefs):
+        return pulp.LpAffineExpression([(ingredient_vars[i], float(c)) for i, c in zip(labels, coefs) if c != 0])
 
-    def _add_nutrient_constraints(self, prob, ingredient_vars, slack_vars):
+    def _add_nutrient_constraints(self, prob, ingredient_vars, slack_vars, presolved):
         # Máximos como restricciones duras, mínimos como penalización con slack
-        for nut in self.nutrient_list:
-            if nut in self.ingredients_df.columns:
-                nut_sum = pulp.lpSum([self.ingredients_df.loc[i, nut] * ingredient_vars[i] for i in self.ingredients_df.index])
-                req = self.requirements.get(nut, {})
-                req_min = req.get("min", None)
-                req_max = req.get("max", None)
-                # Máx: restricción dura
-                if req_max is not None and str(req_max) != "" and float(req_max) > 0:
-                    try:
-                        max_val = float(req_max)
-                        if not math.isnan(max_val) and not math.isinf(max_val):
-                            prob += nut_sum <= max_val, f"Max_{nut}"
-                    except Exception:
-                        pass
-                # Min: solo penalización
-                if req_min is not None and str(req_min) != "" and float(req_min) > 0:
-                    try:
-                        min_val = float(req_min)
-                        if not math.isnan(min_val) and not math.isinf(min_val):
-                            prob += nut_sum + slack_vars[nut] >= min_val, f"Min_{nut}_slack"
-                            prob += slack_vars[nut] >= 0, f"Slack_{nut}_nonneg"
-                    except Exception:
-                        pass
+        for nut, (coefs, max_val) in presolved.filas_max.items():
+            prob += self._nutrient_expr(ingredient_vars, presolved.labels, coefs) <= max_val, f"Max_{nut}"
+        for nut, (coefs, min_val) in presolved.filas_min.items():
+            prob += self._nutrient_expr(ingredient_vars, presolved.labels, coefs) + slack_vars[nut] >= min_val, f"Min_{nut}_slack"
+
+    def _add_ratio_constraints(self, prob, ingredient_vars, presolved):
+        # num/den >= r  <=>  sum((num_i - r*den_i) * x_i) >= 0 (una fila dispersa por cota)
+        filas = 0
+        df = self.ingredients_df.loc[presolved.labels]
+        for num, den, min_val, max_val in self._ratios:
+            a, b = _coeficientes(df, num), _coeficientes(df, den)
+            if min_val is not None:
+                coefs = a - min_val * b
+                if not (self.presolve and len(coefs) and coefs.min() >= 0):
+                    prob += self._nutrient_expr(ingredient_vars, presolved.labels, coefs) >= 0, f"RatioMin_{num}_{den}"
+                    filas += 1
+            if max_val is not None:
+                coefs = a - max_val * b
+                if not (self.presolve and len(coefs) and coefs.max() <= 0):
+                    prob += self._nutrient_expr(ingredient_vars, presolved.labels, coefs) <= 0, f"RatioMax_{num}_{den}"
+                    filas += 1
+        return filas
+
+    def _add_category_constraints(self, prob, ingredient_vars, presolved):
+        # Índice de pertenencia one-hot (ingredientes x categorías): una fila agregada por cota
+        rangos = DIET_CATEGORY_RANGES[self.diet_type]
+        categorias = pd.Series(self._categorias(), index=self.ingredients_df.index).loc[presolved.labels]
+        pertenencia = pd.get_dummies(categorias).reindex(columns=list(rangos), fill_value=False).to_numpy(dtype=float)
+        vacias = ~pertenencia.any(axis=0)
+        self.categorias_sin_ingredientes = [cat for cat, vacia in zip(rangos, vacias) if vacia]
+        filas = 0
+        for j, (cat, (min_val, max_val)) in enumerate(rangos.items()):
+            if vacias[j]:
+                continue  # sin ingredientes de la categoría: se reporta en vez de volver infactible el modelo
+            expr = self._nutrient_expr(ingredient_vars, presolved.labels, pertenencia[:, j])
+            if min_val > 0:
+                prob += expr >= min_val, f"CatMin_{cat}"
+                filas += 1
+            if max_val < 1:
+                prob += expr <= max_val, f"CatMax_{cat}"
+                filas += 1
+        return filas
 
     def _build_problem(self):
+        presolved = self._presolve()
+        self.presolve_report = presolved.reporte
         prob = pulp.LpProblem("Diet_Formulation", pulp.LpMinimize)
         ingredient_vars = pulp.LpVariable.dicts(
-            "Ing", self.ingredients_df.index, lowBound=0, upBound=1, cat="Continuous"
+            "Ing", presolved.labels, lowBound=0, upBound=1, cat="Continuous"
         )
-        # Slack vars para mínimos
-        slack_vars = {}
-        for nut in self.nutrient_list:
-            slack_vars[nut] = pulp.LpVariable(f"Slack_{nut}", lowBound=0, cat="Continuous")
+        # Slack vars solo para nutrientes con mínimo no redundante
+        slack_vars = {
+            nut: pulp.LpVariable(f"Slack_{nut}", lowBound=0, cat="Continuous") for nut in presolved.filas_min
+        }
         # Suma de inclusiones debe ser igual a 1 (100% del alimento)
-        prob += pulp.lpSum([ingredient_vars[i] for i in self.ingredients_df.index]) == 1, "Total_Proportion"
-        self._add_ingredient_inclusion_constraints(prob, ingredient_vars)
-        self._add_nutrient_constraints(prob, ingredient_vars, slack_vars)
+        prob += pulp.lpSum([ingredient_vars[i] for i in presolved.labels]) == 1, "Total_Proportion"
+        self._add_ingredient_inclusion_constraints(prob, ingredient_vars, presolved)
+        self._add_nutrient_constraints(prob, ingredient_vars, slack_vars, presolved)
+        filas_extra = self._add_ratio_constraints(prob, ingredient_vars, presolved)
+        total_extra = sum((mn is not None) + (mx is not None) for _, _, mn, mx in self._ratios)
+        if self.diet_type:
+            filas_extra += self._add_category_constraints(prob, ingredient_vars, presolved)
+            total_extra += 2 * len(DIET_CATEGORY_RANGES[self.diet_type])
+        filas_antes, filas_despues = self.presolve_report["filas"]
+        self.presolve_report["filas"] = (filas_antes + total_extra, filas_despues + filas_extra)
         # Objetivo: minimizar costo + penalización por mínimos no alcanzados
-        total_cost = pulp.lpSum([
-            ingredient_vars[i] * float(self.ingredients_df.loc[i, "precio"] if "precio" in self.ingredients_df.columns else 0)
-            for i in self.ingredients_df.index
-        ])
-        penalty = pulp.lpSum([self.min_penalty_weight * slack_vars[nut] for nut in self.nutrient_list])
+        total_cost = pulp.LpAffineExpression(
+            [(ingredient_vars[i], float(p)) for i, p in zip(presolved.labels, presolved.precios)]
+        )
+        penalty = pulp.lpSum([self.min_penalty_weight * v for v in slack_vars.values()])
         prob += total_cost + penalty
         return prob, ingredient_vars
 
-    def _collect_results(self, ingredient_vars):
-        diet = {}
-        ingredient_amounts = {}
-        for i in self.ingredients_df.index:
-            var_val = ingredient_vars[i].varValue
-            ingredient_name = self.ingredients_df.loc[i, "Ingrediente"]
-            if var_val is not None and var_val > 1e-7:
-                ingredient_amounts[ingredient_name] = var_val
+    def _duales(self, prob, prefijo, sufijo=""):
+        """Dual de la fila prefijo+nutriente+sufijo de cada nutriente (NaN si no está en el modelo)."""
+        duales = np.full(len(self.nutrient_list), np.nan)
+        if prob is None:
+            return duales
+        for j, nut in enumerate(self.nutrient_list):
+            restriccion = prob.constraints.get(f"{prefijo}{nut}{sufijo}")
+            if restriccion is not None and restriccion.pi is not None:
+                duales[j] = restriccion.pi
+        return duales
 
-        total = sum(ingredient_amounts.values())
+    def _collect_results(self, ingredient_vars, prob=None):
+        """FormulationResult de la solución cargada en ingredient_vars (duales de prob si se da)."""
+        df = self.ingredients_df
+        # Ingredientes eliminados en el presolve no tienen variable (inclusión 0)
+        x = np.array([(ingredient_vars[i].varValue or 0.0) if i in ingredient_vars else 0.0 for i in df.index])
+        x[x <= UMBRAL_INCLUSION] = 0.0
+        total = x.sum()
         if abs(total - 1) > 1e-5 and total > 0:
-            for k in ingredient_amounts:
-                ingredient_amounts[k] /= total
-
-        for ingredient_name, frac in ingredient_amounts.items():
-            diet[ingredient_name] = round(frac * 100, 4)
-
-        nutritional_values = {}
-        for nutrient in self.nutrient_list:
-            valor_nut = 0
-            if nutrient in self.ingredients_df.columns:
-                for i in self.ingredients_df.index:
-                    ingredient_name = self.ingredients_df.loc[i, "Ingrediente"]
-                    frac = ingredient_amounts.get(ingredient_name, 0)
-                    nut_val = self.ingredients_df.loc[i, nutrient]
-                    try:
-                        nut_val = float(nut_val)
-                    except Exception:
-                        nut_val = 0.0
-                    if pd.isna(nut_val):
-                        nut_val = 0.0
-                    valor_nut += nut_val * frac
-            nutritional_values[nutrient] = round(valor_nut, 4)
-
-        total_cost_value = 0
-        for ingredient_name, frac in ingredient_amounts.items():
-            idx = self.ingredients_df[self.ingredients_df["Ingrediente"] == ingredient_name].index[0]
-            precio = self.ingredients_df.loc[idx, "precio"] if "precio" in self.ingredients_df.columns else 0
-            try:
-                precio = float(precio)
-            except Exception:
-                precio = 0.0
-            total_cost_value += precio * frac
-        total_cost_value = round(total_cost_value * 100, 4)  # por 100 kg
-
-        return {
-            "success": True,
-            "diet": diet,
-            "nutritional_values": nutritional_values,
-            "cost": total_cost_value,
-        }
+            x /= total
+
+        # Aportes de nutrientes (nutrientes x ingredientes; valores no numéricos cuentan como 0)
+        ceros = np.zeros(len(df))
+        coefs = np.vstack(
+            [_coeficientes(df, nut) if nut in df.columns else ceros for nut in self.nutrient_list]
+        ).reshape(len(self.nutrient_list), len(df))
+        usados = np.flatnonzero(x > 0)
+
+        ratio_values = {}
+        for num, den, _, _ in self._ratios:
+            valor_den = _coeficientes(df, den) @ x
+            valor_num = _coeficientes(df, num) @ x
+            ratio_values[f"{num}:{den}"] = round(float(valor_num / valor_den), 4) if valor_den else None
+
+        return FormulationResult(
+            ingredientes=df["Ingrediente"],
+            nutrientes=self.nutrient_list,
+            inclusion=x,
+            niveles=np.array([fila @ x for fila in coefs]),
+            aportes=(coefs[:, usados] * x[usados]).T,
+            dual_min=self._duales(prob, "Min_", "_slack"),
+            dual_max=self._duales(prob, "Max_"),
+            costo=float(_coeficientes(df, "precio") @ x) if "precio" in df.columns else 0.0,
+            ratios=ratio_values,
+            extras={
+                "categorias_sin_ingredientes": self.categorias_sin_ingredientes,
+                "nutrientes_sin_columna": self.nutrientes_sin_columna,
+                "presolve": self.presolve_report,
+            },
+        )
+
+    def _etapa(self, etapa, progress=None, should_cancel=None):
+        if should_cancel is not None and should_cancel():
+            raise FormulationCancelled(etapa)
+        if progress is not None:
+            progress(etapa)
+
+    def run(self, progress=None, should_cancel=None):
+        """
+        progress: callable(etapa) que se llama al iniciar "build", "solve" y "collect".
+        should_cancel: callable() -> bool que se revisa antes de cada etapa;
+        si retorna True se lanza FormulationCancelled.
+        """
+        self._etapa("build", progress, should_cancel)
+        with span("model.build"):
+            prob, ingredient_vars = self._build_problem()
+        return self._resolver_problema(prob, ingredient_vars, progress, should_cancel)
 
-    def run(self):
-        prob, ingredient_vars = self._build_problem()
-        prob.solve()
+    def _resolver_problema(self, prob, ingredient_vars, progress=None, should_cancel=None):
+        """Etapas solve y collect de run sobre un modelo ya construido."""
+        self._etapa("solve", progress, should_cancel)
+        incr("solver.invocations")
+        with span("model.solve"):
+            self._resolver_modelo(prob, should_cancel=should_cancel)
+        self._etapa("collect", progress, should_cancel)
         if pulp.LpStatus[prob.status] not in ["Optimal", "Not Solved"]:
-            return {
+            result = {
                 "success": False,
-                "message": f"No se pudo encontrar una solución. Estado del solver: {pulp.LpStatus[prob.status]}"
+                "message": f"No se pudo encontrar una solución. Estado del solver: {pulp.LpStatus[prob.status]}",
+                "nutrientes_sin_columna": self.nutrientes_sin_columna,
             }
-        return self._collect_results(ingredient_vars)
+            if self.portfolio:
+                result["portafolio"] = self.portfolio_report
+            if pulp.LpStatus[prob.status] == "Infeasible" and self.diagnose_time_limit_s > 0:
+                from diagnosis import diagnosticar_infactibilidad
+
+                with span("model.diagnosis"):
+                    result["diagnostico"] = diagnosticar_infactibilidad(self, tiempo_max_s=self.diagnose_time_limit_s)
+            return result
+        with span("model.collect"):
+            result = self._collect_results(ingredient_vars, prob)
+        if self.portfolio:
+            result["portafolio"] = self.portfolio_report
+        return result
+
+    def _resolver_modelo(self, prob, tiempo_max_s=None, should_cancel=None):
+        """
+        prob.solve con self.solver, o con el portafolio de solvers si está activo (el reporte
+        de la carrera queda en self.portfolio_report). tiempo_max_s acota el plazo del portafolio.
+        Con should_cancel el solver corre en un proceso propio que se termina al cancelar
+        (FormulationCancelled), en lugar de esperar a que CBC termine.
+        """
+        if not self.portfolio:
+            if should_cancel is None:
+                return prob.solve(self.solver)
+            from solver_portfolio import resolver_en_proceso
+
+            if not resolver_en_proceso(prob, self.solver, cancelar=should_cancel):
+                raise FormulationCancelled("solve")
+            return prob.status
+        from solver_portfolio import RUTA_LOG, resolver_portafolio
+
+        plazo = self.portfolio_deadline_s if tiempo_max_s is None else min(tiempo_max_s, self.portfolio_deadline_s)
+        configuraciones = None if self.portfolio is True else self.portfolio
+        ruta_log = RUTA_LOG if self.portfolio_log is True else self.portfolio_log
+        self.portfolio_report = resolver_portafolio(
+            prob, configuraciones, plazo_s=plazo, ruta_log=ruta_log, cancelar=should_cancel
+        )
+        if self.portfolio_report["cancelado"]:
+            raise FormulationCancelled("solve")
+        return prob.status
 
-    def solve(self):
-        result = self.run()
+    def solve(self, progress=None, should_cancel=None):
+        result = self.run(progress=progress, should_cancel=should_cancel)
         return result
@@ -0,0 +1,173 @@
+"""
+Frontera de Pareto entre costo y un segundo objetivo (método epsilon-restricción).
+
+Segundos objetivos disponibles:
+- "exceso_nutrientes": suma de los excesos relativos sobre los mínimos
+  (sum_n max(0, nutriente_n - min_n) / min_n, en %), solo nutrientes con mínimo > 0.
+- "n_ingredientes": número de ingredientes usados (variables binarias, MILP).
+
+Se calculan los extremos (mínimo costo y mínimo segundo objetivo) y se barre epsilon
+entre ambos minimizando el costo con la fila "Epsilon" (objetivo2 <= epsilon). Cada worker
+construye un solo modelo y recorre su tramo de puntos cambiando solo el lado derecho de
+esa fila, con la solución anterior como warm start. El presolve no elimina ingredientes
+dominados: la dominancia se define por costo y puede no valer para el segundo objetivo.
+"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from presolve import valor_usable
+
+OBJETIVOS = {
+    "exceso_nutrientes": "Exceso sobre mínimos (%)",
+    "n_ingredientes": "Número de ingredientes",
+}
+
+def _agregar_objetivo2(formulator, prob, ingredient_vars, objetivo):
+    """Agrega variables y filas del segundo objetivo al modelo; retorna su expresión."""
+    df = formulator.ingredients_df
+    if objetivo == "n_ingredientes":
+        usados = pulp.LpVariable.dicts("Usa", list(ingredient_vars), cat="Binary")
+        for i in ingredient_vars:
+            prob += ingredient_vars[i] <= usados[i], f"Usa_{i}"
+        return pulp.lpSum(usados.values())
+    if objetivo == "exceso_nutrientes":
+        terminos = []
+        for nut in formulator.nutrient_list:
+            min_val = valor_usable(formulator.requirements.get(nut, {}).get("min"))
+            if nut not in df.columns or min_val is None:
+                continue
+            coefs = pd.to_numeric(df[nut], errors="coerce").fillna(0).to_numpy(dtype=float)
+            nut_sum = pulp.LpAffineExpression(
+                [(ingredient_vars[i], c) for i, c in zip(df.index, coefs) if c != 0 and i in ingredient_vars]
+            )
+            exceso = pulp.LpVariable(f"Exceso_{nut}", lowBound=0)
+            prob += exceso >= (nut_sum - min_val) * (100.0 / min_val), f"ExcesoDef_{nut}"
+            terminos.append(exceso)
+        return pulp.lpSum(terminos)
+    raise ValueError(f"Objetivo no soportado: {objetivo}. Opciones: {', '.join(OBJETIVOS)}")
+
+def exceso_sobre_minimos(formulator, x):
+    """
+    sum_n max(0, A_n x - min_n) * 100 / min_n para las inclusiones x (en el orden de
+    ingredients_df). Se calcula desde x y no desde las variables Exceso_*: en el modelo solo
+    están acotadas por abajo y, sin costo, el solver puede dejarlas por encima del exceso real.
+    """
+    df = formulator.ingredients_df
+    total = 0.0
+    for nut in formulator.nutrient_list:
+        min_val = valor_usable(formulator.requirements.get(nut, {}).get("min"))
+        if nut not in df.columns or min_val is None:
+            continue
+        coefs = pd.to_numeric(df[nut], errors="coerce").fillna(0).to_numpy(dtype=float)
+        total += max(0.0, float(coefs @ x) - min_val) * 100.0 / min_val
+    return total
+
+def _inclusiones(formulator, ingredient_vars):
+    indices = formulator.ingredients_df.index
+    return np.array([(ingredient_vars[i].varValue or 0.0) if i in ingredient_vars else 0.0 for i in indices])
+
+def _valor_objetivo2(formulator, objetivo, x):
+    if objetivo == "n_ingredientes":
+        return int((x > 1e-7).sum())
+    return exceso_sobre_minimos(formulator, x)
+
+def _modelo(formulator, objetivo):
+    prob, ingredient_vars = formulator._build_problem()
+    f2 = _agregar_objetivo2(formulator, prob, ingredient_vars, objetivo)
+    return prob, ingredient_vars, f2
+
+def _punto(formulator, prob, ingredient_vars, objetivo, epsilon):
+    df = formulator.ingredients_df
+    precios = pd.to_numeric(df.get("precio", 0), errors="coerce")
+    precios = np.zeros(len(df)) if np.isscalar(precios) else precios.fillna(0).to_numpy(dtype=float)
+    x = _inclusiones(formulator, ingredient_vars)
+    fila = {
+        "epsilon": epsilon,
+        "estado": pulp.LpStatus[prob.status],
+        "costo": float(precios @ x) * 100,  # por 100 kg
+        OBJETIVOS[objetivo]: _valor_objetivo2(formulator, objetivo, x),
+    }
+    fila.update({nombre: round(val * 100, 4) for nombre, val in zip(formulator.ingredients_df["Ingrediente"], x)})
+    return fila
+
+def _barrer(formulator, objetivo, epsilons):
+    prob, ingredient_vars, f2 = _modelo(formulator, objetivo)
+    prob.addConstraint(f2 <= (epsilons[0] if len(epsilons) else 0), "Epsilon")
+    solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True)
+    filas = []
+    for eps in epsilons:
+        prob.constraints["Epsilon"].changeRHS(float(eps))
+        prob.solve(solver)
+        if pulp.LpStatus[prob.status] == "Optimal":
+            filas.append(_punto(formulator, prob, ingredient_vars, objetivo, float(eps)))
+    return filas
+
+def frontera_pareto(formulator, objetivo="exceso_nutrientes", n_puntos=15, jobs=1):
+    """
+    Retorna un DataFrame con la frontera (costo por 100 kg, valor del segundo objetivo y
+    % de inclusión de cada ingrediente), ordenada por el segundo objetivo.
+    """
+    formulator = copy.copy(formulator)
+    formulator.presolve_dominated = False
+    solver = pulp.PULP_CBC_CMD(msg=False)
+    # Extremo 1: mínimo costo (el segundo objetivo queda en su máximo útil)
+    prob, ingredient_vars, f2 = _modelo(formulator, objetivo)
+    prob.solve(solver)
+    if pulp.LpStatus[prob.status] != "Optimal":
+        raise ValueError(f"No se pudo formular la dieta base. Estado del solver: {pulp.LpStatus[prob.status]}")
+    f2_max = float(_valor_objetivo2(formulator, objetivo, _inclusiones(formulator, ingredient_vars)))
+    # Extremo 2: mínimo segundo objetivo (manteniendo la penalización por mínimos no cumplidos)
+    costo_objetivo = prob.objective
+    penalizacion = pulp.LpAffineExpression([(v, c) for v, c in costo_objetivo.items() if v.name.startswith("Slack_")])
+    prob.setObjective(f2 + penalizacion)
+    prob.solve(solver)
+    f2_min = float(_valor_objetivo2(formulator, objetivo, _inclusiones(formulator, ingredient_vars)))
+
+    epsilons = np.linspace(f2_min, f2_max, max(2, int(n_puntos)))
+    if objetivo == "n_ingredientes":
+        epsilons = np.unique(np.round(epsilons))
+    if jobs <= 1:
+        filas = _barrer(formulator, objetivo, epsilons)
+    else:
+        tramos = [t for t in np.array_split(epsilons, jobs) if len(t)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            filas = [f for parte in pool.map(_barrer, [formulator] * len(tramos), [objetivo] * len(tramos), tramos) for f in parte]
+
+    frontera = pd.DataFrame(filas)
+    if frontera.empty:
+        return frontera
+    columna = OBJETIVOS[objetivo]
+    frontera = frontera.sort_values([columna, "costo"]).drop_duplicates(subset=[columna], keep="first")
+    # Solo puntos no dominados: el costo debe bajar cuando el segundo objetivo sube
+    frontera = frontera[frontera["costo"] < frontera["costo"].cummin().shift(fill_value=np.inf) - 1e-9]
+    return frontera.reset_index(drop=True)
+
+def grafico_frontera(frontera, objetivo="exceso_nutrientes"):
+    import plotly.graph_objects as go
+
+    columna = OBJETIVOS[objetivo]
+    ingredientes = [c for c in frontera.columns if c not in ("epsilon", "estado", "costo", columna)]
+    texto = [
+        "<br>".join(f"{ing}: {row[ing]:.2f}%" for ing in ingredientes if row[ing] > 0.005)
+        for _, row in frontera.iterrows()
+    ]
+    fig = go.Figure(go.Scatter(
+        x=frontera[columna],
+        y=frontera["costo"],
+        mode="lines+markers",
+        marker=dict(color="#19345c", size=9),
+        line=dict(color="#7a9fc8"),
+        hovertext=texto,
+        hovertemplate=f"{columna}: %{{x:.2f}}<br>Costo: %{{y:.2f}}<br>%{{hovertext}}<extra></extra>",
+    ))
+    fig.update_layout(
+        xaxis_title=columna,
+        yaxis_title="Costo por 100 kg",
+        title=f"Frontera de Pareto: costo vs {columna.lower()}",
+        template="simple_white",
+    )
+    return fig
@@ -0,0 +1,120 @@
+"""
+Instrumentación liviana: spans de tiempo con nombre y contadores.
+
+    from perf import span, incr
+    with span("model.build"):
+        ...
+    incr("solver.invocations")
+
+Los datos se acumulan en un registro global del proceso (seguro entre hilos) y se pueden
+exportar como JSON lines (un evento por línea) o en formato de texto de Prometheus
+(summary con cuantiles p50/p95/p99 por span y un counter por contador).
+"""
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+CUANTILES = (0.5, 0.95, 0.99)
+
+def _cuantil(valores_ordenados, q):
+    if not valores_ordenados:
+        return 0.0
+    return valores_ordenados[min(len(valores_ordenados) - 1, max(0, int(math.ceil(q * len(valores_ordenados))) - 1))]
+
+class PerfRegistry:
+    def __init__(self, max_muestras=2048, max_eventos=10000):
+        self._lock = threading.Lock()
+        self._max_muestras = max_muestras
+        self._muestras = {}  # nombre -> deque de duraciones recientes (s)
+        self._totales = {}  # nombre -> [count, sum]
+        self._contadores = {}
+        self._eventos = deque(maxlen=max_eventos)
+
+    def registrar(self, nombre, duracion, inicio=None):
+        with self._lock:
+            if nombre not in self._muestras:
+                self._muestras[nombre] = deque(maxlen=self._max_muestras)
+                self._totales[nombre] = [0, 0.0]
+            self._muestras[nombre].append(duracion)
+            self._totales[nombre][0] += 1
+            self._totales[nombre][1] += duracion
+            self._eventos.append({"type": "span", "name": nombre, "ts": inicio or time.time(), "duration_s": duracion})
+
+    def incr(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + n
+            self._eventos.append({"type": "counter", "name": nombre, "ts": time.time(), "value": n})
+
+    def contador(self, nombre):
+        return self._contadores.get(nombre, 0)
+
+    def reset(self):
+        with self._lock:
+            self._muestras.clear()
+            self._totales.clear()
+            self._contadores.clear()
+            self._eventos.clear()
+
+    def resumen(self):
+        """Lista de dicts por span: count, total, media, p50/p95/p99 y máximo (s) de las muestras recientes."""
+        with self._lock:
+            datos = {nombre: (sorted(m), list(self._totales[nombre])) for nombre, m in self._muestras.items()}
+        filas = []
+        for nombre, (valores, (count, total)) in sorted(datos.items()):
+            fila = {"span": nombre, "count": count, "total_s": total, "mean_s": total / count if count else 0.0}
+            for q in CUANTILES:
+                fila[f"p{int(q * 100)}_s"] = _cuantil(valores, q)
+            fila["max_s"] = valores[-1] if valores else 0.0
+            filas.append(fila)
+        return filas
+
+    def contadores(self):
+        with self._lock:
+            return dict(self._contadores)
+
+    def exportar_jsonl(self):
+        with self._lock:
+            eventos = list(self._eventos)
+        return "\n".join(json.dumps(e, ensure_ascii=False) for e in eventos) + ("\n" if eventos else "")
+
+    def exportar_prometheus(self, prefijo="uywa"):
+        lineas = [f"# TYPE {prefijo}_span_seconds summary"]
+        for fila in self.resumen():
+            etiqueta = fila["span"].replace("\\", "\\\\").replace('"', '\\"')
+            for q in CUANTILES:
+                lineas.append(f'{prefijo}_span_seconds{{span="{etiqueta}",quantile="{q}"}} {fila[f"p{int(q * 100)}_s"]:.6f}')
+            lineas.append(f'{prefijo}_span_seconds_sum{{span="{etiqueta}"}} {fila["total_s"]:.6f}')
+            lineas.append(f'{prefijo}_span_seconds_count{{span="{etiqueta}"}} {fila["count"]}')
+        lineas.append(f"# TYPE {prefijo}_events_total counter")
+        for nombre, valor in sorted(self.contadores().items()):
+            etiqueta = nombre.replace("\\", "\\\\").replace('"', '\\"')
+            lineas.append(f'{prefijo}_events_total{{counter="{etiqueta}"}} {valor}')
+        return "\n".join(lineas) + "\n"
+
+REGISTRY = PerfRegistry()
+
+@contextmanager
+def span(nombre, registry=None):
+    inicio_ts = time.time()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        (registry or REGISTRY).registrar(nombre, time.perf_counter() - inicio, inicio_ts)
+
+def timed(nombre):
+    """Decorador equivalente a envolver la función en span(nombre)."""
+    def decorador(func):
+        @wraps(func)
+        def envoltura(*args, **kwargs):
+            with span(nombre):
+                return func(*args, **kwargs)
+        return envoltura
+    return decorador
+
+def incr(nombre, n=1):
+    REGISTRY.incr(nombre, n)
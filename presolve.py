@@ -0,0 +1,146 @@
+"""
+Presolve de la formulación antes de construir el modelo de PuLP.
+
+- Nutrientes sin mínimo ni máximo utilizable (vacío, 0, NaN o sin columna) no generan
+  filas ni variable de holgura.
+- Cotas redundantes: inclusión mínima <= 0 y máxima >= 1 (ya son las cotas de la
+  variable); mínimo de nutriente <= menor contenido entre ingredientes y máximo >= mayor
+  contenido (toda mezcla con suma 1 los cumple).
+- Ingredientes dominados: j se elimina si otro ingrediente k cuesta lo mismo o menos, es
+  al menos igual de rico en cada nutriente con mínimo, no más rico en cada nutriente con
+  máximo, pertenece al mismo grupo (si se indican grupos), j no tiene inclusión mínima y
+  k no tiene inclusión máxima. Reemplazar j por k en cualquier solución la mantiene
+  factible y no la encarece.
+
+Las comparaciones se hacen en forma vectorizada sobre la matriz de coeficientes.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+def valor_usable(valor):
+    """float > 0 y finito, o None (misma regla que DietFormulator para min/max)."""
+    if valor is None or str(valor) == "":
+        return None
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(valor) or math.isinf(valor) or valor <= 0:
+        return None
+    return valor
+
+class PresolveResult:
+    def __init__(self, labels, nombres, precios, filas_min, filas_max, inc_min, inc_max, dominados, reporte):
+        self.labels = labels  # etiquetas de índice de los ingredientes que quedan en el modelo
+        self.nombres = nombres
+        self.precios = precios
+        self.filas_min = filas_min  # {nutriente: (coeficientes, mínimo)}
+        self.filas_max = filas_max  # {nutriente: (coeficientes, máximo)}
+        self.inc_min = inc_min  # {label: mínimo de inclusión} (solo no redundantes)
+        self.inc_max = inc_max
+        self.dominados = dominados
+        self.reporte = reporte
+
+def _dominados(precios, mas_es_mejor, menos_es_mejor, igualdad, grupos, elegibles_j, elegibles_k):
+    """Máscara de ingredientes dominados por algún otro (comparación por pares vectorizada)."""
+    n = len(precios)
+    domina = (precios[:, None] <= precios[None, :])  # domina[k, j]: k no es más caro que j
+    estricto = (precios[:, None] < precios[None, :])
+    for matriz, signo in ((mas_es_mejor, 1), (menos_es_mejor, -1)):
+        if matriz.shape[1]:
+            dif = signo * (matriz[:, None, :] - matriz[None, :, :])  # dif[k, j, n]
+            domina &= (dif >= -1e-12).all(axis=2)
+            estricto |= (dif > 1e-12).any(axis=2)
+    if igualdad.shape[1]:
+        domina &= (np.abs(igualdad[:, None, :] - igualdad[None, :, :]) <= 1e-12).all(axis=2)
+    if grupos is not None:
+        domina &= grupos[:, None] == grupos[None, :]
+    # Ingredientes idénticos: se conserva el de menor posición
+    k_idx, j_idx = np.indices((n, n))
+    domina &= estricto | (k_idx < j_idx)
+    np.fill_diagonal(domina, False)
+    domina &= elegibles_k[:, None] & elegibles_j[None, :]
+    return domina.any(axis=0)
+
+def presolve_formulacion(
+    ingredients_df,
+    nutrient_list,
+    requirements,
+    limits,
+    eliminar_dominados=True,
+    eliminar_redundantes=True,
+    nutrientes_igualdad=(),
+    grupos=None,
+):
+    df = ingredients_df
+    labels = np.asarray(df.index)
+    nombres = df["Ingrediente"].to_numpy()
+    if "precio" in df.columns:
+        precios = pd.to_numeric(df["precio"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    else:
+        precios = np.zeros(len(df))
+    inc_min = np.array([float(limits.get("min", {}).get(n, 0.0)) for n in nombres])
+    inc_max = np.array([float(limits.get("max", {}).get(n, 1.0)) for n in nombres])
+
+    mins, maxs = {}, {}
+    for nut in nutrient_list:
+        if nut not in df.columns:
+            continue
+        req = requirements.get(nut, {})
+        min_val, max_val = valor_usable(req.get("min")), valor_usable(req.get("max"))
+        if min_val is not None:
+            mins[nut] = min_val
+        if max_val is not None:
+            maxs[nut] = max_val
+    columnas = list(dict.fromkeys(list(mins) + list(maxs) + [n for n in nutrientes_igualdad if n in df.columns]))
+    coefs = {c: pd.to_numeric(df[c], errors="coerce").fillna(0).to_numpy(dtype=float) for c in columnas}
+
+    conservar = np.ones(len(df), dtype=bool)
+    if eliminar_dominados and len(df) > 1:
+        igualdad = [n for n in columnas if n in nutrientes_igualdad or (n in mins and n in maxs)]
+        mas = [n for n in mins if n not in igualdad]
+        menos = [n for n in maxs if n not in igualdad]
+        matriz = lambda cols: np.column_stack([coefs[c] for c in cols]) if cols else np.empty((len(df), 0))
+        conservar = ~_dominados(
+            precios, matriz(mas), matriz(menos), matriz(igualdad),
+            None if grupos is None else np.asarray(grupos),
+            elegibles_j=inc_min <= 0, elegibles_k=inc_max >= 1,
+        )
+
+    filas_min, filas_max = {}, {}
+    for nut, min_val in mins.items():
+        c = coefs[nut][conservar]
+        if eliminar_redundantes and len(c) and min_val <= c.min():
+            continue
+        filas_min[nut] = (c, min_val)
+    for nut, max_val in maxs.items():
+        c = coefs[nut][conservar]
+        if eliminar_redundantes and len(c) and max_val >= c.max():
+            continue
+        filas_max[nut] = (c, max_val)
+    inc_min_filas = {l: float(v) for l, v, k in zip(labels, inc_min, conservar) if k and (v > 0 or not eliminar_redundantes)}
+    inc_max_filas = {l: float(v) for l, v, k in zip(labels, inc_max, conservar) if k and (v < 1 or not eliminar_redundantes)}
+
+    # Filas del modelo sin presolve: proporción total, MinInc/MaxInc por ingrediente, Max_ y Min_ + Slack_nonneg
+    filas_antes = 1 + 2 * len(df) + len(maxs) + 2 * len(mins)
+    filas_despues = 1 + len(inc_min_filas) + len(inc_max_filas) + len(filas_min) + len(filas_max)
+    reporte = {
+        "ingredientes": (len(df), int(conservar.sum())),
+        "variables_holgura": (len(nutrient_list), len(filas_min)),
+        "filas": (filas_antes, filas_despues),
+        "nutrientes_sin_restriccion": [n for n in nutrient_list if n not in mins and n not in maxs],
+        "ingredientes_dominados": [str(n) for n in nombres[~conservar]],
+    }
+    return PresolveResult(
+        labels=labels[conservar],
+        nombres=nombres[conservar],
+        precios=precios[conservar],
+        filas_min=filas_min,
+        filas_max=filas_max,
+        inc_min=inc_min_filas,
+        inc_max=inc_max_filas,
+        dominados=reporte["ingredientes_dominados"],
+        reporte=reporte,
+    )
@@ -0,0 +1,140 @@
+"""
+Simulación Monte Carlo del riesgo de precio de una formulación.
+
+Se muestrean vectores de precios (rango o distribución por ingrediente) y se resuelve la
+misma especificación de DietFormulator para cada muestra. Cada worker construye el modelo
+una sola vez y, como entre muestras solo cambia el objetivo, la solución de una resolución
+sigue siendo óptima para toda muestra con la que su base es dual factible. Esa prueba se
+hace para todas las muestras pendientes a la vez (incremental._Base.optima_con_objetivos,
+álgebra lineal vectorizada), así CBC solo se llama una vez por base distinta (decenas de
+veces para miles de muestras) en lugar de una vez por muestra. La eliminación de
+ingredientes dominados del presolve se desactiva: depende de los precios, que aquí cambian.
+
+Especificación de precios por ingrediente:
+    (min, max)                                   -> uniforme
+    {"dist": "uniforme", "min": a, "max": b}
+    {"dist": "triangular", "min": a, "moda": m, "max": b}
+    {"dist": "normal", "media": mu, "desv": sd}  (truncada en 0)
+Los ingredientes sin especificación conservan su precio actual.
+"""
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from incremental import _Base, _matrices
+from perf import incr
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+def muestrear_precios(ingredientes_df, especificacion, n, seed=None):
+    """Matriz (n x ingredientes) de precios muestreados."""
+    rng = np.random.default_rng(seed)
+    base = pd.to_numeric(ingredientes_df.get("precio", 0), errors="coerce")
+    base = np.zeros(len(ingredientes_df)) if np.isscalar(base) else base.fillna(0).to_numpy(dtype=float)
+    precios = np.tile(base, (n, 1))
+    nombres = list(ingredientes_df["Ingrediente"])
+    for ing, spec in (especificacion or {}).items():
+        if ing not in nombres:
+            raise ValueError(f"Ingrediente no encontrado en la formulación: {ing}")
+        j = nombres.index(ing)
+        if isinstance(spec, (tuple, list)):
+            spec = {"dist": "uniforme", "min": spec[0], "max": spec[1]}
+        dist = spec.get("dist", "uniforme")
+        if dist == "uniforme":
+            precios[:, j] = rng.uniform(spec["min"], spec["max"], n)
+        elif dist == "triangular":
+            precios[:, j] = rng.triangular(spec["min"], spec["moda"], spec["max"], n)
+        elif dist == "normal":
+            precios[:, j] = rng.normal(spec["media"], spec["desv"], n)
+        else:
+            raise ValueError(f"Distribución no soportada: {dist}")
+    return np.clip(precios, 0, None)
+
+def especificacion_porcentual(ingredientes_df, variacion_pct):
+    """Rango uniforme de ±variacion_pct % alrededor del precio actual de cada ingrediente."""
+    f = variacion_pct / 100.0
+    return {
+        row["Ingrediente"]: (float(row["precio"]) * (1 - f), float(row["precio"]) * (1 + f))
+        for _, row in ingredientes_df.iterrows()
+    }
+
+def _resolver_muestras(formulator, precios):
+    """
+    Resuelve una serie de vectores de precio reutilizando un solo modelo. Retorna (costos,
+    inclusiones). Cada solución de CBC se asigna a todas las muestras pendientes con las que
+    su base sigue siendo óptima; CBC se llama solo para la primera muestra no cubierta.
+    """
+    prob, ingredient_vars = formulator._build_problem()
+    variables = [ingredient_vars[i] for i in formulator.ingredients_df.index]
+    nombres, _, A, sentidos, _, c, bajo, _ = _matrices(prob)
+    posicion = {v.name: j for j, v in enumerate(nombres)}
+    columnas = [posicion[var.name] for var in variables]
+    objetivos = np.tile(c, (len(precios), 1))
+    objetivos[:, columnas] = precios
+
+    solver = pulp.PULP_CBC_CMD(msg=False, warmStart=True)
+    costos = np.full(len(precios), np.nan)
+    inclusiones = np.zeros((len(precios), len(variables)))
+    pendientes = np.arange(len(precios))
+    while len(pendientes):
+        k, pendientes = pendientes[0], pendientes[1:]
+        for var, precio in zip(variables, precios[k]):
+            prob.objective[var] = float(precio)
+        prob.solve(solver)
+        incr("risk.solves")
+        if pulp.LpStatus[prob.status] != "Optimal":
+            continue
+        x = np.array([var.varValue or 0.0 for var in variables])
+        total = x.sum()
+        if total > 0:
+            x = x / total
+        cubiertas = pendientes[_Base.desde_solucion(prob).optima_con_objetivos(A, sentidos, bajo, objetivos[pendientes])]
+        incr("risk.basis_reuse", len(cubiertas))
+        muestras = np.concatenate([[k], cubiertas])
+        inclusiones[muestras] = x
+        costos[muestras] = precios[muestras] @ x * 100  # por 100 kg, igual que DietFormulator
+        pendientes = np.setdiff1d(pendientes, cubiertas, assume_unique=True)
+    return costos, inclusiones
+
+def simular_riesgo_precio(formulator, especificacion, n=1000, jobs=1, seed=None, umbral_inclusion=1e-4):
+    """
+    Distribución del costo (por 100 kg) de la especificación bajo incertidumbre de precios.
+    Retorna dict con percentiles, media, desviación, frecuencia de entrada de cada
+    ingrediente (fracción de muestras con inclusión > umbral) e inclusión media.
+    """
+    inicio = time.perf_counter()
+    formulator = copy.copy(formulator)
+    formulator.presolve_dominated = False
+    precios = muestrear_precios(formulator.ingredients_df, especificacion, n, seed)
+    if jobs <= 1:
+        costos, inclusiones = _resolver_muestras(formulator, precios)
+    else:
+        bloques = [b for b in np.array_split(precios, jobs) if len(b)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            partes = list(pool.map(_resolver_muestras, [formulator] * len(bloques), bloques))
+        costos = np.concatenate([c for c, _ in partes])
+        inclusiones = np.vstack([inc for _, inc in partes])
+
+    validas = ~np.isnan(costos)
+    costos_ok = costos[validas]
+    inclusiones_ok = inclusiones[validas]
+    nombres = list(formulator.ingredients_df["Ingrediente"])
+    ingredientes = pd.DataFrame({
+        "Ingrediente": nombres,
+        "Frecuencia de inclusión (%)": (inclusiones_ok > umbral_inclusion).mean(axis=0) * 100 if len(costos_ok) else 0.0,
+        "Inclusión media (%)": inclusiones_ok.mean(axis=0) * 100 if len(costos_ok) else 0.0,
+    }).sort_values("Frecuencia de inclusión (%)", ascending=False, ignore_index=True)
+    return {
+        "n": n,
+        "n_fallidas": int((~validas).sum()),
+        "percentiles": {p: float(v) for p, v in zip(PERCENTILES, np.percentile(costos_ok, PERCENTILES))} if len(costos_ok) else {},
+        "media": float(costos_ok.mean()) if len(costos_ok) else None,
+        "desv": float(costos_ok.std()) if len(costos_ok) else None,
+        "costos": costos,
+        "ingredientes": ingredientes,
+        "tiempo_s": time.perf_counter() - inicio,
+    }
@@ -0,0 +1,132 @@
+"""
+Receta de producción para mezcladora: cantidades enteras en incrementos de balanza.
+
+La fórmula óptima (fracciones continuas) se lleva a unidades de balanza
+q_i = x_i * lote / incremento y se redondea por el método del mayor resto (la suma
+queda exactamente en lote / incremento). Si la receta redondeada viola alguna
+restricción del modelo (inclusiones, máximos, relaciones, categorías) o empeora algún
+mínimo de nutriente respecto de la fórmula continua, se repara con un MILP acotado:
+unidades enteras n_i en [piso(q_i) - radio, techo(q_i) + radio], mismas filas del
+modelo de DietFormulator, minimizando la desviación total respecto de q.
+"""
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from perf import span
+
+TOLERANCIA = 1e-7
+
+def _mayor_resto(q, total):
+    """Redondea q a enteros que suman total, asignando las unidades faltantes a los mayores restos."""
+    n = np.floor(q + 1e-9).astype(int)
+    faltan = int(total - n.sum())
+    if faltan > 0:
+        n[np.argsort(-(q - n), kind="stable")[:faltan]] += 1
+    elif faltan < 0:
+        n[np.argsort(q - n, kind="stable")[:(-faltan)]] -= 1
+    return n
+
+def _cumple(prob, etiquetas, ingredient_vars, x):
+    """Evalúa las filas del modelo con la receta x (las holguras conservan su valor de la fórmula continua)."""
+    for etiqueta, valor in zip(etiquetas, x):
+        if etiqueta in ingredient_vars:
+            ingredient_vars[etiqueta].varValue = float(valor)
+        elif valor > 0:
+            return False  # ingrediente eliminado por el presolve
+    return all(c.valid(TOLERANCIA) for c in prob.constraints.values())
+
+def _reparar(prob, etiquetas, ingredient_vars, q, total, radio, tiempo_max_s, formulator=None):
+    """
+    MILP acotado alrededor de q. Retorna unidades enteras o None si no hay solución en el radio.
+    Con el portafolio de formulator activo, las configuraciones compiten dentro de tiempo_max_s.
+    """
+    unidades, desviaciones = {}, []
+    for etiqueta, qi in zip(etiquetas, q):
+        if etiqueta not in ingredient_vars:
+            continue
+        bajo = max(0, math.floor(qi) - radio) if qi > TOLERANCIA else 0
+        alto = math.ceil(qi) + radio if qi > TOLERANCIA else 0
+        n = pulp.LpVariable(f"Unidades_{len(unidades)}", lowBound=bajo, upBound=alto, cat="Integer")
+        d = pulp.LpVariable(f"Desvio_{len(unidades)}", lowBound=0)
+        prob += ingredient_vars[etiqueta] * total - n == 0, f"Escala_{len(unidades)}"
+        prob += d >= n - float(qi), f"DesvioSube_{len(unidades)}"
+        prob += d >= float(qi) - n, f"DesvioBaja_{len(unidades)}"
+        unidades[etiqueta] = n
+        desviaciones.append(d)
+    prob.setObjective(pulp.lpSum(desviaciones))
+    if formulator is not None and formulator.portfolio:
+        formulator._resolver_modelo(prob, tiempo_max_s)
+    else:
+        prob.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=max(1, int(math.ceil(tiempo_max_s)))))
+    if pulp.LpStatus[prob.status] != "Optimal":
+        return None
+    return np.array([round(unidades[e].varValue or 0) if e in unidades else 0 for e in etiquetas], dtype=int)
+
+def receta_produccion(formulator, lote_kg, incremento_kg=0.5, radio=2, tiempo_max_s=1.0):
+    """
+    Retorna dict con:
+      "success", "metodo" ("redondeo" o "milp"), "receta" (DataFrame con Ingrediente, kg,
+      unidades de balanza y % de inclusión), "desviacion_max_kg" respecto de la fórmula
+      continua, "costo" (por 100 kg) y "tiempo_s".
+    """
+    inicio = time.perf_counter()
+    if incremento_kg <= 0:
+        raise ValueError(f"El incremento de balanza debe ser mayor que 0 (recibido: {incremento_kg} kg)")
+    total = lote_kg / incremento_kg
+    if abs(total - round(total)) > 1e-6:
+        raise ValueError(f"El lote ({lote_kg} kg) debe ser múltiplo del incremento de balanza ({incremento_kg} kg)")
+    total = int(round(total))
+
+    df = formulator.ingredients_df
+    etiquetas = list(df.index)
+    with span("production.lp"):
+        prob, ingredient_vars = formulator._build_problem()
+        formulator._resolver_modelo(prob)
+    if pulp.LpStatus[prob.status] != "Optimal":
+        return {"success": False, "message": f"No se pudo formular la dieta. Estado del solver: {pulp.LpStatus[prob.status]}"}
+    x_continuo = np.array([(ingredient_vars[e].varValue or 0.0) if e in ingredient_vars else 0.0 for e in etiquetas])
+    x_continuo = np.clip(x_continuo, 0, None)
+    x_continuo /= x_continuo.sum()
+    q = x_continuo * total
+
+    # Los mínimos de nutrientes no pueden empeorar: holguras acotadas a su valor en la fórmula continua
+    for var in prob.variables():
+        if var.name.startswith("Slack_"):
+            var.upBound = (var.varValue or 0.0) + TOLERANCIA
+
+    with span("production.rounding"):
+        unidades = _mayor_resto(q, total)
+        metodo = "redondeo"
+        if not _cumple(prob, etiquetas, ingredient_vars, unidades / total):
+            metodo = "milp"
+            unidades = _reparar(prob, etiquetas, ingredient_vars, q, total, radio, tiempo_max_s, formulator)
+    if unidades is None:
+        return {
+            "success": False,
+            "message": f"No hay receta entera que cumpla las restricciones a ±{radio} incrementos de la fórmula.",
+            "tiempo_s": time.perf_counter() - inicio,
+        }
+
+    precios = pd.to_numeric(df.get("precio", 0), errors="coerce")
+    precios = np.zeros(len(df)) if np.isscalar(precios) else precios.fillna(0).to_numpy(dtype=float)
+    usados = unidades > 0
+    receta = pd.DataFrame({
+        "Ingrediente": df["Ingrediente"].to_numpy()[usados],
+        "kg": unidades[usados] * incremento_kg,
+        "Unidades de balanza": unidades[usados],
+        "% Inclusión": unidades[usados] / total * 100,
+    }).sort_values("kg", ascending=False, ignore_index=True)
+    return {
+        "success": True,
+        "metodo": metodo,
+        "receta": receta,
+        "lote_kg": lote_kg,
+        "incremento_kg": incremento_kg,
+        "desviacion_max_kg": float(np.abs(unidades - q).max() * incremento_kg),
+        "costo": round(float(precios @ (unidades / total)) * 100, 4),
+        "tiempo_s": time.perf_counter() - inicio,
+    }
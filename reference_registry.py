@@ -0,0 +1,167 @@
+"""
+Registro de tablas de referencia de nutrientes por (especie, etapa, estándar).
+
+Cada tabla es un archivo JSON en reference_data/:
+    {"especie": "gato", "etapa": "adulto", "estandar": "fediaf", "energia_ref": 1000,
+     "descripcion": "...", "nutrientes": {"PB": {"min": 15.6, "max": null, "unit": "g/100g"}, ...}}
+
+Al importar el módulo se compilan todas las tablas una sola vez en arreglos indexados
+(tablas x nutrientes) con un índice de nutrientes común. Un mismo nutriente debe usar la
+misma unidad en todas las tablas; si no, la carga falla con ValueError. La búsqueda por
+clave es un acceso a diccionario.
+"""
+import json
+import os
+from types import MappingProxyType
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_data")
+
+# Unidades que se escalan con la energía (ver ReferenceRegistry.requerimientos_diarios)
+UNIDADES_ESCALABLES = ("g/100g", "g/kg")
+
+# Condición del perfil de mascota -> etapa de vida de la tabla
+ETAPA_POR_CONDICION = {
+    "cachorro": "crecimiento",
+    "cachorro_<4m": "crecimiento",
+    "cachorro_>4m": "crecimiento",
+    "gatito": "crecimiento",
+}
+
+def etapa_de_condicion(condicion):
+    return ETAPA_POR_CONDICION.get(condicion, "adulto")
+
+class ReferenceRegistry:
+    def __init__(self, tablas):
+        """tablas: lista de dicts con el formato de los archivos de reference_data/."""
+        self.nutrientes = list(dict.fromkeys(n for t in tablas for n in t["nutrientes"]))
+        self._indice = {n: j for j, n in enumerate(self.nutrientes)}
+        self.unidades = np.full(len(self.nutrientes), "", dtype=object)
+        self.claves = []
+        self._por_clave = {}
+        self._por_especie = {}
+        self.minimos = np.full((len(tablas), len(self.nutrientes)), np.nan)
+        self.maximos = np.full((len(tablas), len(self.nutrientes)), np.nan)
+        self.presentes = np.zeros((len(tablas), len(self.nutrientes)), dtype=bool)
+        self.energia_ref = np.zeros(len(tablas))
+        self.descripciones = []
+        for k, tabla in enumerate(tablas):
+            clave = (tabla["especie"], tabla["etapa"], tabla["estandar"])
+            if clave in self._por_clave:
+                raise ValueError(f"Tabla de referencia duplicada: {clave}")
+            self._por_clave[clave] = k
+            self._por_especie.setdefault(tabla["especie"], []).append(k)
+            self.claves.append(clave)
+            self.descripciones.append(tabla.get("descripcion", ""))
+            self.energia_ref[k] = float(tabla.get("energia_ref", 1000))
+            for nombre, info in tabla["nutrientes"].items():
+                j = self._indice[nombre]
+                if self.unidades[j] and self.unidades[j] != info["unit"]:
+                    raise ValueError(
+                        f"Unidad inconsistente para {nombre}: {self.unidades[j]} y {info['unit']} ({'/'.join(clave)})"
+                    )
+                self.unidades[j] = info["unit"]
+                self.presentes[k, j] = True
+                if info.get("min") is not None:
+                    self.minimos[k, j] = float(info["min"])
+                if info.get("max") is not None:
+                    self.maximos[k, j] = float(info["max"])
+        # Máscaras por nutriente para derivar requerimientos sin recorrer diccionarios
+        self._escala = np.isin(self.unidades, UNIDADES_ESCALABLES) | (
+            (np.array(self.nutrientes, dtype=object) == "EM_1") & (self.unidades == "kcal/g")
+        )
+        self._energia = (np.array(self.nutrientes, dtype=object) == "EM") & (self.unidades == "kcal/kg")
+        for arr in (self.minimos, self.maximos, self.presentes, self.energia_ref, self._escala, self._energia):
+            arr.setflags(write=False)
+        self._vistas = {}
+
+    def __len__(self):
+        return len(self.claves)
+
+    def especies(self):
+        return list(self._por_especie)
+
+    def resolver(self, especie, etapa="adulto", estandar=None):
+        """
+        Clave registrada más cercana: (especie, etapa, estandar) exacta, si no la primera
+        tabla de la especie y etapa, si no la primera de la especie en etapa adulto.
+        """
+        if (especie, etapa, estandar) in self._por_clave:
+            return (especie, etapa, estandar)
+        if especie not in self._por_especie:
+            raise ValueError(f"No hay tablas de referencia para la especie: {especie}")
+        candidatas = [self.claves[k] for k in self._por_especie[especie]]
+        for filtro in (
+            lambda c: c[1] == etapa and (estandar is None or c[2] == estandar),
+            lambda c: c[1] == etapa,
+            lambda c: c[1] == "adulto",
+        ):
+            coincidencias = [c for c in candidatas if filtro(c)]
+            if coincidencias:
+                return coincidencias[0]
+        return candidatas[0]
+
+    def tabla(self, clave):
+        """
+        Vista {nutriente: {"min", "max", "unit"}} de una tabla (formato de nutrient_reference).
+        Se cachea y se comparte entre llamadas, por eso es de solo lectura (MappingProxyType);
+        dict(...) o {n: dict(v) ...} para obtener una copia editable.
+        """
+        if clave not in self._vistas:
+            k = self._por_clave[clave]
+            self._vistas[clave] = MappingProxyType({
+                n: MappingProxyType({
+                    "min": None if np.isnan(self.minimos[k, j]) else float(self.minimos[k, j]),
+                    "max": None if np.isnan(self.maximos[k, j]) else float(self.maximos[k, j]),
+                    "unit": self.unidades[j],
+                })
+                for j, n in enumerate(self.nutrientes) if self.presentes[k, j]
+            })
+        return self._vistas[clave]
+
+    def requerimientos_diarios(self, clave, energia):
+        """
+        Requerimientos diarios para una energía (MER), misma regla que la pestaña "Perfil de
+        Mascota": EM (kcal/kg) toma la energía; EM_1 (kcal/g), g/100g y g/kg se escalan por
+        energia / energia_ref; el resto copia el mínimo de la tabla.
+        Retorna {nutriente: {"min", "max": None, "unit"}}.
+        """
+        if energia is None:
+            raise ValueError("No se pudo calcular el requerimiento energético.")
+        k = self._por_clave[clave]
+        minimos = np.where(self._escala, self.minimos[k] * energia / self.energia_ref[k], self.minimos[k])
+        minimos = np.where(self._energia, energia, minimos)
+        return {
+            self.nutrientes[j]: {
+                "min": None if np.isnan(minimos[j]) else float(minimos[j]),
+                "max": None,
+                "unit": self.unidades[j],
+            }
+            for j in np.flatnonzero(self.presentes[k])
+        }
+
+    def indices(self, claves):
+        """Posición de cada clave en los arreglos compilados (minimos, maximos, presentes)."""
+        return np.array([self._por_clave[c] for c in claves], dtype=int)
+
+    def requerimientos_diarios_matriz(self, indices, energias):
+        """
+        requerimientos_diarios para muchos animales: mínimos diarios (animales x nutrientes)
+        con NaN donde la tabla no tiene mínimo. indices: posición de la tabla de cada animal.
+        """
+        indices = np.asarray(indices, dtype=int)
+        energias = np.asarray(energias, dtype=float)[:, None]
+        minimos = self.minimos[indices]
+        minimos = np.where(self._escala, minimos * energias / self.energia_ref[indices][:, None], minimos)
+        return np.where(self._energia & self.presentes[indices], energias, minimos)
+
+def cargar_registro(directorio=DATA_DIR):
+    tablas = []
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.endswith(".json"):
+            with open(os.path.join(directorio, nombre), encoding="utf-8") as f:
+                tablas.append(json.load(f))
+    return ReferenceRegistry(tablas)
+
+REGISTRO = cargar_registro()
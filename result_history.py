@@ -0,0 +1,161 @@
+"""
+Historial de resultados de formulación como arreglos alineados.
+
+Cada resultado se guarda como una fila de matrices que comparten índice de
+ingredientes y de nutrientes (los índices crecen si aparece un ingrediente o nutriente
+nuevo; las filas anteriores quedan con inclusión 0 y nutriente NaN):
+
+    inclusiones  (resultados x ingredientes)  % de inclusión
+    valores      (resultados x nutrientes)    valor obtenido por kg
+    minimos / maximos (resultados x nutrientes) requerimiento usado (NaN = sin cota)
+    costos       (resultados)                 por 100 kg
+
+La comparación entre dos resultados, o de un resultado contra todo el historial, es una
+resta de filas y un par de comparaciones booleanas sobre estas matrices.
+Cumplimiento (misma regla que la tabla "Composición nutricional y cumplimiento"):
+obtenido >= mínimo y, si el máximo es > 0, obtenido <= máximo.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+class ResultHistory:
+    def __init__(self, capacidad=16):
+        self.ingredientes = []
+        self.nutrientes = []
+        self._idx_ing = {}
+        self._idx_nut = {}
+        self._n = 0
+        self.inclusiones = np.zeros((capacidad, 0))
+        self.valores = np.full((capacidad, 0), np.nan)
+        self.minimos = np.full((capacidad, 0), np.nan)
+        self.maximos = np.full((capacidad, 0), np.nan)
+        self.costos = np.full(capacidad, np.nan)
+        self.etiquetas = []
+        self.fechas = []
+
+    def __len__(self):
+        return self._n
+
+    def _columnas(self, nombres, indice, lista):
+        nuevas = [n for n in dict.fromkeys(nombres) if n not in indice]
+        for nombre in nuevas:
+            indice[nombre] = len(lista)
+            lista.append(nombre)
+        return len(nuevas)
+
+    def _crecer(self):
+        """Capacidad de filas (se duplica) y columnas para los índices actuales."""
+        filas = self.inclusiones.shape[0]
+        if self._n == filas:
+            filas *= 2
+        ancho = lambda m, n, relleno: np.pad(
+            m, ((0, filas - m.shape[0]), (0, n - m.shape[1])), constant_values=relleno
+        )
+        n_ing, n_nut = len(self.ingredientes), len(self.nutrientes)
+        self.inclusiones = ancho(self.inclusiones, n_ing, 0.0)
+        self.valores = ancho(self.valores, n_nut, np.nan)
+        self.minimos = ancho(self.minimos, n_nut, np.nan)
+        self.maximos = ancho(self.maximos, n_nut, np.nan)
+        self.costos = np.pad(self.costos, (0, filas - len(self.costos)), constant_values=np.nan)
+
+    def agregar(self, result, requirements, etiqueta=None):
+        """Agrega un resultado exitoso de DietFormulator con los requerimientos usados. Retorna su posición."""
+        diet = result.get("diet", {})
+        valores = result.get("nutritional_values", {})
+        nuevas = self._columnas(diet, self._idx_ing, self.ingredientes)
+        nuevas += self._columnas(list(valores) + list(requirements), self._idx_nut, self.nutrientes)
+        if nuevas or self._n == self.inclusiones.shape[0]:
+            self._crecer()
+        k = self._n
+        if diet:
+            self.inclusiones[k, [self._idx_ing[i] for i in diet]] = list(diet.values())
+        if valores:
+            self.valores[k, [self._idx_nut[n] for n in valores]] = pd.to_numeric(
+                pd.Series(list(valores.values()), dtype=object), errors="coerce"
+            ).to_numpy(dtype=float)
+        for destino, cota in ((self.minimos, "min"), (self.maximos, "max")):
+            if requirements:
+                destino[k, [self._idx_nut[n] for n in requirements]] = pd.to_numeric(
+                    pd.Series([r.get(cota) for r in requirements.values()], dtype=object), errors="coerce"
+                ).to_numpy(dtype=float)
+        self.costos[k] = result.get("cost", np.nan)
+        self.etiquetas.append(etiqueta or f"Formulación {k + 1}")
+        self.fechas.append(time.time())
+        self._n += 1
+        return k
+
+    def cumplimiento(self, filas=None):
+        """Matriz booleana (resultados x nutrientes) de cumplimiento; nutrientes sin requerimiento = True."""
+        filas = slice(0, self._n) if filas is None else filas
+        valores, minimos, maximos = self.valores[filas], self.minimos[filas], self.maximos[filas]
+        con_requerimiento = ~np.isnan(minimos) | ~np.isnan(maximos)
+        sobre_maximo = np.nan_to_num(maximos, nan=0.0) > 0
+        cumple = (valores >= minimos) & ~(sobre_maximo & (valores > maximos))
+        return np.where(con_requerimiento, cumple, True)
+
+    def diferencia(self, anterior, actual, umbral=1e-6):
+        """
+        Compara dos resultados del historial. Retorna dict con "ingredientes" (antes,
+        después y delta de inclusión en %, solo filas con cambio), "nutrientes" (antes,
+        después, delta, delta % y cumplimiento antes/después) y "costo" (antes, después, delta).
+        """
+        filas = [anterior, actual]
+        inc = self.inclusiones[filas]
+        delta_inc = inc[1] - inc[0]
+        cambia = np.abs(delta_inc) > umbral
+        ingredientes = pd.DataFrame({
+            "Ingrediente": np.array(self.ingredientes, dtype=object)[cambia],
+            "% Antes": inc[0, cambia],
+            "% Después": inc[1, cambia],
+            "Δ %": delta_inc[cambia],
+        }).sort_values("Δ %", key=np.abs, ascending=False, ignore_index=True)
+
+        val = self.valores[filas]
+        cumple = self.cumplimiento(filas)
+        presentes = ~np.isnan(val).all(axis=0)
+        delta_val = val[1] - val[0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta_pct = np.where(val[0] != 0, delta_val / np.abs(val[0]) * 100, np.nan)
+        nutrientes = pd.DataFrame({
+            "Nutriente": np.array(self.nutrientes, dtype=object)[presentes],
+            "Antes": val[0, presentes],
+            "Después": val[1, presentes],
+            "Δ": delta_val[presentes],
+            "Δ %": delta_pct[presentes],
+            "Cumple antes": cumple[0, presentes],
+            "Cumple después": cumple[1, presentes],
+        })
+        nutrientes["Cambio de cumplimiento"] = np.select(
+            [~nutrientes["Cumple antes"] & nutrientes["Cumple después"], nutrientes["Cumple antes"] & ~nutrientes["Cumple después"]],
+            ["Ahora cumple", "Deja de cumplir"],
+            default="",
+        )
+        costo = self.costos[filas]
+        return {
+            "ingredientes": ingredientes,
+            "nutrientes": nutrientes,
+            "costo": {"antes": float(costo[0]), "despues": float(costo[1]), "delta": float(costo[1] - costo[0])},
+        }
+
+    def resumen_contra(self, actual):
+        """
+        Una fila por resultado del historial comparado con actual: delta de costo,
+        distancia de composición (suma de |Δ inclusión| / 2, en %), ingredientes que
+        entran o salen y nutrientes que pasan a cumplir o dejan de cumplir.
+        """
+        n = self._n
+        inc = self.inclusiones[:n]
+        usados = inc > 1e-6
+        cumple = self.cumplimiento()
+        return pd.DataFrame({
+            "Formulación": self.etiquetas,
+            "Fecha": pd.to_datetime(self.fechas, unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+            "Costo": self.costos[:n],
+            "Δ costo (actual - esta)": self.costos[actual] - self.costos[:n],
+            "Distancia de composición (%)": np.abs(inc[actual] - inc).sum(axis=1) / 2,
+            "Ingredientes distintos": (usados[actual] != usados).sum(axis=1),
+            "Ahora cumple": (cumple[actual] & ~cumple).sum(axis=1),
+            "Deja de cumplir": (~cumple[actual] & cumple).sum(axis=1),
+        })
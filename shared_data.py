@@ -0,0 +1,161 @@
+"""
+Matriz de ingredientes compartida entre sesiones.
+
+Cada archivo de ingredientes se parsea una sola vez por proceso y se guarda como un
+IngredientLibrary de solo lectura, identificado por el hash de su contenido. Las sesiones
+guardan únicamente la clave de la biblioteca, los índices de los ingredientes
+seleccionados y las ediciones puntuales del editor; el DataFrame de trabajo se
+reconstruye bajo demanda con IngredientLibrary.frame().
+
+La caché LRU (MAX_BIBLIOTECAS) solo decide qué bibliotecas se conservan sin dueño: una
+sesión que formuló guarda además una referencia a su biblioteca, y mientras exista alguna
+referencia la biblioteca sigue disponible por su clave (_VIVAS, referencias débiles).
+"""
+import hashlib
+import io
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from data import load_ingredients, limpiar_matriz_ingredientes
+
+COLUMNAS_TEXTO = ["Ingrediente", "Categoría"]
+
+class IngredientLibrary:
+    def __init__(self, df, clave=None):
+        df = limpiar_matriz_ingredientes(df).reset_index(drop=True)
+        self.clave = clave
+        self._df = df
+        self.nombres = df["Ingrediente"].astype(str).to_numpy()
+        if "Categoría" in df.columns:
+            self.categorias = df["Categoría"].astype(str).str.strip().str.capitalize().to_numpy()
+        else:
+            self.categorias = np.full(len(df), "Otros", dtype=object)
+        self.columnas_numericas = [c for c in df.columns if c not in COLUMNAS_TEXTO]
+        self.matriz = df[self.columnas_numericas].to_numpy(dtype=float)
+        for arr in (self.nombres, self.categorias, self.matriz):
+            arr.setflags(write=False)
+        self._posicion = {nombre: i for i, nombre in enumerate(self.nombres)}
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @property
+    def columnas(self):
+        return list(self._df.columns)
+
+    @property
+    def nbytes(self):
+        return int(self._df.memory_usage(deep=True).sum() + self.matriz.nbytes)
+
+    def indices(self, nombres):
+        """Posiciones (np.ndarray de int) de los ingredientes dados, en el orden recibido."""
+        return np.array([self._posicion[n] for n in nombres if n in self._posicion], dtype=np.int64)
+
+    def nombres_de(self, idx):
+        return [str(n) for n in self.nombres[np.asarray(idx, dtype=np.int64)]]
+
+    def ingredientes_por_categoria(self, categoria):
+        return [str(n) for n in self.nombres[self.categorias == categoria]]
+
+    def frame(self, idx=None, ediciones=None):
+        """
+        Copia de trabajo de las filas idx (todas si es None) con las ediciones aplicadas.
+        ediciones: {(ingrediente, columna): valor}
+        """
+        df = self._df if idx is None else self._df.iloc[np.asarray(idx, dtype=np.int64)]
+        df = df.copy()
+        if ediciones:
+            fila = {nombre: etiqueta for etiqueta, nombre in zip(df.index, df["Ingrediente"])}
+            for (ingrediente, columna), valor in ediciones.items():
+                if ingrediente in fila and columna in df.columns:
+                    df.at[fila[ingrediente], columna] = valor
+        return df
+
+    def ediciones(self, idx, df_editado):
+        """Celdas numéricas de df_editado que difieren de la biblioteca: {(ingrediente, columna): valor}."""
+        idx = np.asarray(idx, dtype=np.int64)
+        columnas = [c for c in self.columnas_numericas if c in df_editado.columns]
+        if len(idx) == 0 or not columnas or len(df_editado) != len(idx):
+            return {}
+        original = self.matriz[idx][:, [self.columnas_numericas.index(c) for c in columnas]]
+        editado = df_editado[columnas].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(dtype=float)
+        filas, cols = np.nonzero(~np.isclose(original, editado, rtol=0, atol=1e-12))
+        nombres = df_editado["Ingrediente"].to_numpy()
+        return {(str(nombres[f]), columnas[c]): float(editado[f, c]) for f, c in zip(filas, cols)}
+
+# --- Caché de bibliotecas por proceso ---
+_BIBLIOTECAS = OrderedDict()
+_VIVAS = weakref.WeakValueDictionary()  # todas las bibliotecas con alguna referencia, aunque salgan del LRU
+_LOCK = threading.Lock()
+MAX_BIBLIOTECAS = 32
+
+def obtener_biblioteca(contenido, nombre_archivo):
+    """Retorna la biblioteca para el contenido del archivo, parseándolo solo la primera vez."""
+    clave = hashlib.sha1(contenido).hexdigest()
+    with _LOCK:
+        biblioteca = _VIVAS.get(clave)
+        if biblioteca is not None:
+            _retener(clave, biblioteca)
+            return biblioteca
+    archivo = io.BytesIO(contenido)
+    archivo.name = nombre_archivo
+    df = load_ingredients(archivo)
+    if df is None or df.empty:
+        return None
+    biblioteca = IngredientLibrary(df, clave=clave)
+    with _LOCK:
+        biblioteca = _VIVAS.setdefault(clave, biblioteca)  # otro hilo pudo parsear el mismo archivo
+        _retener(clave, biblioteca)
+    return biblioteca
+
+def _retener(clave, biblioteca):
+    # Con _LOCK tomado: la biblioteca pasa al frente del LRU y sale la menos usada
+    _BIBLIOTECAS[clave] = biblioteca
+    _BIBLIOTECAS.move_to_end(clave)
+    while len(_BIBLIOTECAS) > MAX_BIBLIOTECAS:
+        _BIBLIOTECAS.popitem(last=False)
+
+def biblioteca_por_clave(clave):
+    """Biblioteca con esa clave si sigue en memoria (en el LRU o referenciada por alguna sesión)."""
+    with _LOCK:
+        return _VIVAS.get(clave) if clave is not None else None
+
+def memoria_compartida():
+    with _LOCK:
+        vivas = list(_VIVAS.values())
+    return sum(b.nbytes for b in vivas), len(vivas)
+
+# --- Reporte de memoria por sesión ---
+def tamano_aproximado(obj, _vistos=None):
+    """Tamaño aproximado en bytes de un objeto (DataFrames y arrays incluidos)."""
+    _vistos = set() if _vistos is None else _vistos
+    if id(obj) in _vistos:
+        return 0
+    _vistos.add(id(obj))
+    if isinstance(obj, IngredientLibrary):
+        return 0  # compartida, no cuenta para la sesión
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum() if isinstance(obj, pd.DataFrame) else obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    tamano = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        tamano += sum(tamano_aproximado(k, _vistos) + tamano_aproximado(v, _vistos) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        tamano += sum(tamano_aproximado(v, _vistos) for v in obj)
+    return tamano
+
+def reporte_memoria_sesion(session_state):
+    """DataFrame con el tamaño aproximado de cada clave de la sesión, de mayor a menor."""
+    filas = []
+    for clave in list(session_state.keys()):
+        try:
+            filas.append({"clave": str(clave), "bytes": tamano_aproximado(session_state[clave])})
+        except Exception:
+            continue
+    return pd.DataFrame(filas, columns=["clave", "bytes"]).sort_values("bytes", ascending=False, ignore_index=True)
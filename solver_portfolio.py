@@ -0,0 +1,313 @@
+"""
+Portafolio de solvers: varias configuraciones compiten por el mismo modelo en paralelo.
+
+En los modelos con variables enteras (número de ingredientes, unidades de balanza) el
+tiempo de CBC depende mucho de sus opciones (cortes, preproceso, estrategia de nodos) y
+la mejor combinación cambia de un modelo a otro. resolver_portafolio:
+
+1. Serializa el modelo con LpProblem.to_dict() y lo resuelve con cada configuración en un
+   proceso propio (cada proceso en su grupo, para poder terminar también el ejecutable de
+   CBC que lanza PuLP). Cada solver recibe el plazo como límite de tiempo.
+2. La primera solución con optimalidad probada gana y los demás procesos se terminan. Si
+   se cumple el plazo sin una, gana la mejor solución factible recibida (CBC entrega la
+   mejor entera encontrada al llegar a su límite de tiempo).
+3. Carga los valores y duales del ganador en el modelo original (prob.status y
+   prob.sol_status como si se hubiera llamado prob.solve) y retorna un reporte por
+   configuración.
+4. Agrega una línea JSON al registro (RUTA_LOG) con el tamaño del modelo, el ganador y el
+   tiempo de cada configuración; estadisticas() resume el registro para ajustar las
+   configuraciones por defecto (python solver_portfolio.py [registro]). El registro va en
+   DATA_DIR (variable de entorno UYWA_DATA_DIR; por defecto la carpeta de la app), no en
+   el directorio de trabajo; ruta_log=None no registra.
+
+resolver_en_proceso usa el mismo worker con un único solver para que una formulación en
+segundo plano (jobs.JobManager) se pueda cancelar mientras CBC está resolviendo.
+
+Los procesos usan el contexto spawn: se lanzan desde el servidor de Streamlit, que tiene
+hilos, y fork podría heredar locks tomados por otro hilo (logging, imports). spawn
+re-ejecuta el __main__ del padre en el hijo, y bajo Streamlit __main__ es app.py
+(script_runner lo instala en sys.modules); _iniciar lanza los procesos con un __main__
+vacío, ya que los workers solo necesitan este módulo.
+
+HiGHS entra al portafolio solo si PuLP lo encuentra (highspy o el ejecutable highs).
+En un LP puro todas las configuraciones llegan al mismo óptimo y la carrera solo agrega
+el costo de los procesos: el portafolio conviene en los MILP.
+"""
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import statistics
+import sys
+import threading
+import time
+import types
+
+import pulp
+
+from perf import incr
+
+DATA_DIR = os.environ.get("UYWA_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+RUTA_LOG = os.path.join(DATA_DIR, "portfolio_log.jsonl")
+PLAZO_S = 30.0
+MARGEN_S = 2.0  # espera extra sobre el plazo para recibir la solución de un solver que llegó a su límite
+_CONTEXTO = multiprocessing.get_context("spawn")
+_LOCK_INICIO = threading.Lock()
+
+# nombre -> (solver, argumentos); solo se usan datos serializables (se envían a los procesos)
+CONFIGURACIONES = {
+    "cbc": ("cbc", {}),
+    "cbc_sin_cortes": ("cbc", {"cuts": False}),
+    "cbc_sin_preproceso": ("cbc", {"options": ["preprocess off"]}),
+    "cbc_profundidad": ("cbc", {"options": ["nodeStrategy depth"]}),
+    "highs": ("highs", {}),
+}
+
+def _crear_solver(tipo, argumentos, tiempo_max_s=None):
+    limite = None if tiempo_max_s is None else max(1, int(math.ceil(tiempo_max_s)))
+    if tipo == "cbc":
+        return pulp.PULP_CBC_CMD(msg=False, timeLimit=limite, **argumentos)
+    if tipo == "highs":
+        solver = pulp.HiGHS(msg=False, timeLimit=limite, **argumentos)
+        return solver if solver.available() else pulp.HiGHS_CMD(msg=False, timeLimit=limite, **argumentos)
+    raise ValueError(f"Solver no soportado: {tipo}")
+
+def configuraciones_disponibles(nombres=None):
+    """Nombres de las configuraciones (todas o las dadas) cuyo solver está instalado."""
+    disponibles = []
+    for nombre in nombres or CONFIGURACIONES:
+        if nombre not in CONFIGURACIONES:
+            raise ValueError(f"Configuración de solver desconocida: {nombre}. Opciones: {', '.join(CONFIGURACIONES)}")
+        tipo, argumentos = CONFIGURACIONES[nombre]
+        if _crear_solver(tipo, argumentos).available():
+            disponibles.append(nombre)
+    return disponibles
+
+def _resolver_configuracion(datos, nombre, tiempo_max_s, cola, solver=None):
+    """
+    Worker: resuelve el modelo serializado con una configuración (o con solver, un solver
+    serializado con to_dict) y envía el resultado por la cola.
+    """
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()  # grupo propio: el proceso de CBC se termina junto con este
+    inicio = time.perf_counter()
+    try:
+        _, prob = pulp.LpProblem.from_dict(datos)
+        if solver is None:
+            tipo, argumentos = CONFIGURACIONES[nombre]
+            prob.solve(_crear_solver(tipo, argumentos, tiempo_max_s))
+        else:
+            prob.solve(pulp.getSolverFromDict(solver))
+        cola.put({
+            "nombre": nombre,
+            "estado": prob.status,
+            "estado_solucion": prob.sol_status,
+            "objetivo": pulp.value(prob.objective),
+            "valores": {v.name: v.varValue for v in prob.variables()},
+            "duales": {fila: r.pi for fila, r in prob.constraints.items()},
+            "tiempo_s": time.perf_counter() - inicio,
+        })
+    except Exception as e:
+        cola.put({"nombre": nombre, "error": f"{type(e).__name__}: {e}", "tiempo_s": time.perf_counter() - inicio})
+
+def _terminar(proceso):
+    try:
+        os.killpg(proceso.pid, signal.SIGKILL)
+    except (AttributeError, OSError):  # sin grupos de procesos, o el worker aún no creó el suyo
+        proceso.kill()
+    proceso.join(1)
+
+def _probado(r):
+    return r.get("estado") == pulp.LpStatusOptimal and r.get("estado_solucion") == pulp.LpSolutionOptimal
+
+def _factible(r):
+    return r.get("estado") == pulp.LpStatusOptimal and r.get("objetivo") is not None
+
+def _cargar_solucion(prob, r):
+    """Deja en prob los valores, duales y estados recibidos de un worker."""
+    for var in prob.variables():
+        var.varValue = r["valores"].get(var.name)
+    for fila, restriccion in prob.constraints.items():
+        restriccion.pi = r["duales"].get(fila)
+    prob.status, prob.sol_status = r["estado"], r["estado_solucion"]
+
+def _iniciar(procesos):
+    """Inicia los procesos con un __main__ vacío en sys.modules (el hijo no re-ejecuta app.py)."""
+    with _LOCK_INICIO:
+        principal = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            for proceso in procesos:
+                proceso.start()
+        finally:
+            sys.modules["__main__"] = principal
+
+def resolver_en_proceso(prob, solver=None, cancelar=None, intervalo_s=0.2):
+    """
+    prob.solve(solver) en un proceso propio que se termina (junto con CBC) en cuanto
+    cancelar() retorna True. Retorna False si se canceló (prob queda sin resolver) y True
+    si el solver terminó; la solución queda en prob como con prob.solve.
+    """
+    solver = solver or pulp.LpSolverDefault
+    cola = _CONTEXTO.Queue()
+    proceso = _CONTEXTO.Process(
+        target=_resolver_configuracion, args=(prob.to_dict(), solver.name, None, cola, solver.to_dict()), daemon=True
+    )
+    _iniciar([proceso])
+    try:
+        while True:
+            if cancelar is not None and cancelar():
+                incr("solver.cancelled")
+                return False
+            try:
+                r = cola.get(timeout=intervalo_s)
+                break
+            except queue.Empty:
+                if proceso.exitcode not in (None, 0):
+                    raise pulp.PulpSolverError(f"El proceso del solver terminó con código {proceso.exitcode}")
+    finally:
+        if proceso.is_alive():
+            _terminar(proceso)
+    if "error" in r:
+        raise pulp.PulpSolverError(r["error"])
+    _cargar_solucion(prob, r)
+    return True
+
+def resolver_portafolio(prob, configuraciones=None, plazo_s=PLAZO_S, ruta_log=RUTA_LOG, cancelar=None):
+    """
+    Resuelve prob con las configuraciones dadas (None = todas las disponibles) en paralelo y
+    deja en prob la solución ganadora. Retorna dict con "ganador" (None si ninguna
+    configuración encontró solución), "probado_optimo", "tiempo_s", "cancelado" (cancelar()
+    retornó True y se terminaron todos los procesos) y "configuraciones" (nombre, estado,
+    objetivo, tiempo_s, si probó optimalidad y si se canceló o falló).
+    """
+    nombres = configuraciones_disponibles(configuraciones)
+    if not nombres:
+        raise RuntimeError("Ninguna configuración del portafolio tiene su solver instalado")
+    datos = prob.to_dict()
+    cola = _CONTEXTO.Queue()
+    inicio = time.perf_counter()
+    procesos = {
+        nombre: _CONTEXTO.Process(target=_resolver_configuracion, args=(datos, nombre, plazo_s, cola), daemon=True)
+        for nombre in nombres
+    }
+    _iniciar(procesos.values())
+
+    resultados, ganador, cancelado = {}, None, False
+    while len(resultados) < len(procesos):
+        if cancelar is not None and cancelar():
+            cancelado = True
+            break
+        restante = plazo_s + MARGEN_S - (time.perf_counter() - inicio)
+        if restante <= 0:
+            break
+        try:
+            r = cola.get(timeout=min(restante, 0.5))
+        except queue.Empty:
+            for nombre, proceso in procesos.items():
+                if nombre not in resultados and proceso.exitcode not in (None, 0):
+                    resultados[nombre] = {"nombre": nombre, "error": f"el proceso terminó con código {proceso.exitcode}"}
+            continue
+        resultados[r["nombre"]] = r
+        if _probado(r):
+            ganador = r
+            break
+    for nombre, proceso in procesos.items():
+        if proceso.is_alive():
+            _terminar(proceso)
+    tiempo = time.perf_counter() - inicio
+
+    if ganador is None and not cancelado:
+        factibles = [r for r in resultados.values() if _factible(r)]
+        if factibles:
+            ganador = min(factibles, key=lambda r: r["objetivo"] * prob.sense)
+    if ganador is not None:
+        _cargar_solucion(prob, ganador)
+        incr(f"portfolio.winner.{ganador['nombre']}")
+    else:
+        # Sin solución: el estado de algún solver que terminó (p. ej. infactible) o "Not Solved"
+        estados = [r["estado"] for r in resultados.values() if "estado" in r]
+        prob.status = estados[0] if estados else pulp.LpStatusNotSolved
+        prob.sol_status = pulp.LpSolutionNoSolutionFound
+
+    reporte = {
+        "ganador": ganador["nombre"] if ganador else None,
+        "probado_optimo": bool(ganador and _probado(ganador)),
+        "tiempo_s": tiempo,
+        "cancelado": cancelado,
+        "configuraciones": [
+            {
+                "nombre": nombre,
+                "estado": pulp.LpStatus.get(resultados[nombre].get("estado")) if nombre in resultados else None,
+                "objetivo": resultados[nombre].get("objetivo") if nombre in resultados else None,
+                "tiempo_s": resultados[nombre].get("tiempo_s") if nombre in resultados else None,
+                "probado_optimo": nombre in resultados and _probado(resultados[nombre]),
+                "cancelada": nombre not in resultados,
+                "error": resultados.get(nombre, {}).get("error"),
+            }
+            for nombre in nombres
+        ],
+    }
+    if ruta_log:
+        _registrar(ruta_log, prob, plazo_s, reporte)
+    return reporte
+
+def _registrar(ruta, prob, plazo_s, reporte):
+    variables = prob.variables()
+    linea = {
+        "ts": time.time(),
+        "modelo": prob.name,
+        "variables": len(variables),
+        "enteras": sum(v.cat == pulp.LpInteger for v in variables),
+        "filas": len(prob.constraints),
+        "plazo_s": plazo_s,
+        **reporte,
+    }
+    with open(ruta, "a", encoding="utf-8") as f:
+        f.write(json.dumps(linea, ensure_ascii=False) + "\n")
+
+def estadisticas(ruta=RUTA_LOG):
+    """
+    Resumen del registro por configuración: carreras, victorias, % de victorias, victorias con
+    optimalidad probada y mediana del tiempo en las carreras que terminó.
+    """
+    carreras, victorias, probadas, tiempos = {}, {}, {}, {}
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            for c in registro["configuraciones"]:
+                carreras[c["nombre"]] = carreras.get(c["nombre"], 0) + 1
+                if c["tiempo_s"] is not None and not c["error"]:
+                    tiempos.setdefault(c["nombre"], []).append(c["tiempo_s"])
+            ganador = registro.get("ganador")
+            if ganador:
+                victorias[ganador] = victorias.get(ganador, 0) + 1
+                probadas[ganador] = probadas.get(ganador, 0) + bool(registro.get("probado_optimo"))
+    return sorted(
+        (
+            {
+                "configuracion": nombre,
+                "carreras": n,
+                "victorias": victorias.get(nombre, 0),
+                "pct_victorias": 100.0 * victorias.get(nombre, 0) / n,
+                "victorias_probadas": probadas.get(nombre, 0),
+                "mediana_tiempo_s": statistics.median(tiempos[nombre]) if nombre in tiempos else None,
+            }
+            for nombre, n in carreras.items()
+        ),
+        key=lambda fila: -fila["victorias"],
+    )
+
+if __name__ == "__main__":
+    ruta = sys.argv[1] if len(sys.argv) > 1 else RUTA_LOG
+    print(f"{'Configuración':<22}{'carreras':>10}{'victorias':>11}{'%':>8}{'probadas':>10}{'mediana s':>11}")
+    for fila in estadisticas(ruta):
+        mediana = "" if fila["mediana_tiempo_s"] is None else f"{fila['mediana_tiempo_s']:.3f}"
+        print(
+            f"{fila['configuracion']:<22}{fila['carreras']:>10}{fila['victorias']:>11}{fila['pct_victorias']:>8.1f}"
+            f"{fila['victorias_probadas']:>10}{mediana:>11}"
+        )
@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Los módulos de la app están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+CATEGORIAS = ["Proteinas", "Carbohidratos", "Grasas", "Vegetales"]
+NUTRIENTES = ["PB", "EM", "Grasa", "Ca", "P"]
+
+@pytest.fixture
+def matriz_aleatoria():
+    """
+    Fábrica de instancias: (ingredientes, requerimientos) con requerimientos alrededor de una
+    mezcla al azar (factibles) y copias más caras de algunos ingredientes (dominados).
+    """
+    def crear(seed, n=10):
+        rng = np.random.default_rng(seed)
+        df = pd.DataFrame({
+            "Ingrediente": [f"Ing {i}" for i in range(n)],
+            "Categoría": [CATEGORIAS[i % len(CATEGORIAS)] for i in range(n)],
+            "precio": rng.uniform(0.5, 5.0, n).round(2),
+            "PB": rng.uniform(0, 60, n).round(2),
+            "EM": rng.uniform(1500, 8000, n).round(0),
+            "Grasa": rng.uniform(0, 40, n).round(2),
+            "Ca": rng.uniform(0, 3, n).round(3),
+            "P": rng.uniform(0.1, 2, n).round(3),
+        })
+        copias = df.sample(3, random_state=seed).assign(precio=lambda d: d["precio"] + 0.1)
+        copias["Ingrediente"] = [f"{nombre} (copia)" for nombre in copias["Ingrediente"]]
+        df = pd.concat([df, copias], ignore_index=True)
+        mezcla = rng.dirichlet(np.ones(n))
+        niveles = {nut: float(mezcla @ df[nut].to_numpy()[:n]) for nut in NUTRIENTES}
+        requerimientos = {
+            "PB": {"min": niveles["PB"] * 0.95},
+            "EM": {"min": niveles["EM"] * 0.9, "max": niveles["EM"] * 1.2},
+            "Grasa": {"max": niveles["Grasa"] * 1.1},
+            "Ca": {"min": niveles["Ca"] * 0.8, "max": niveles["Ca"] * 1.5},
+            "P": {"min": 0.0},  # sin restricción utilizable
+        }
+        return df, requerimientos
+    return crear
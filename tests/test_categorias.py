@@ -0,0 +1,58 @@
+"""
+Rangos de inclusión por categoría (tipo de dieta): la solución de DietFormulator respeta
+cada rango y cuesta lo mismo que un modelo con una fila por categoría armado aparte.
+"""
+import pulp
+import pytest
+
+from diet_profiles import DIET_CATEGORY_RANGES
+from optimization import DietFormulator
+
+PENALIZACION = 1e5
+
+
+def _modelo_aparte(df, requerimientos, rangos):
+    prob = pulp.LpProblem("categorias", pulp.LpMinimize)
+    x = pulp.LpVariable.dicts("x", list(df.index), lowBound=0, upBound=1)
+    holguras = []
+    prob += pulp.lpSum(x.values()) == 1
+    for nut, req in requerimientos.items():
+        expr = pulp.lpSum(float(df.at[i, nut]) * x[i] for i in df.index)
+        if req.get("min"):
+            h = pulp.LpVariable(f"h_{nut}", lowBound=0)
+            prob += expr + h >= req["min"]
+            holguras.append(h)
+        if req.get("max"):
+            prob += expr <= req["max"]
+    for categoria, (minimo, maximo) in rangos.items():
+        filas = [i for i in df.index if df.at[i, "Categoría"] == categoria]
+        if filas:
+            prob += pulp.lpSum(x[i] for i in filas) >= minimo
+            prob += pulp.lpSum(x[i] for i in filas) <= maximo
+    prob += pulp.lpSum(float(df.at[i, "precio"]) * x[i] for i in df.index) + PENALIZACION * pulp.lpSum(holguras)
+    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+    assert pulp.LpStatus[prob.status] == "Optimal"
+    return pulp.value(prob.objective), sum(h.varValue or 0.0 for h in holguras)
+
+
+@pytest.mark.parametrize("tipo", list(DIET_CATEGORY_RANGES))
+@pytest.mark.parametrize("seed", range(3))
+def test_rangos_por_categoria(matriz_aleatoria, tipo, seed):
+    df, requerimientos = matriz_aleatoria(seed, n=12)
+    rangos = DIET_CATEGORY_RANGES[tipo]
+    f = DietFormulator(
+        df, list(requerimientos), requerimientos, diet_type=tipo,
+        min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False),
+    )
+    resultado = f.solve()
+    assert resultado["success"]
+    categoria = dict(zip(df["Ingrediente"], df["Categoría"]))
+    for cat, (minimo, maximo) in rangos.items():
+        total = sum(v for nombre, v in resultado["diet"].items() if categoria[nombre] == cat) / 100
+        if cat in set(df["Categoría"]):
+            assert minimo - 1e-4 <= total <= maximo + 1e-4, cat
+        else:
+            assert cat in resultado["categorias_sin_ingredientes"]
+    objetivo, holgura = _modelo_aparte(df, requerimientos, rangos)
+    assert holgura == pytest.approx(0.0, abs=1e-7)
+    assert resultado["cost"] == pytest.approx(objetivo * 100, abs=1e-3)
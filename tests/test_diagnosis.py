@@ -0,0 +1,98 @@
+"""
+diagnosticar_infactibilidad: el conflicto reportado es infactible por sí solo y mínimo
+(sin cualquiera de sus filas es factible), y la relajación mínima restituye la factibilidad.
+"""
+import numpy as np
+import pandas as pd
+import pulp
+import pytest
+
+from diagnosis import diagnosticar_infactibilidad
+from optimization import DietFormulator
+
+def _formulador(df, requerimientos, limits=None, ratios=None):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, limits=limits, ratios=ratios,
+        min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False),
+    )
+
+def _factible(formulator, filas, relajacion=None):
+    """Modelo de formulator con solo las filas dadas (o todas, con relajacion {fila: cantidad})."""
+    completo, _ = formulator._build_problem()
+    prob = pulp.LpProblem("sub", pulp.LpMinimize)
+    prob += 0
+    for nombre, restriccion in completo.constraints.items():
+        if filas is not None and nombre not in filas:
+            continue
+        holgura = (relajacion or {}).get(nombre, 0.0)
+        fila = pulp.LpConstraint(restriccion, restriccion.sense, nombre)
+        if holgura and restriccion.sense == pulp.LpConstraintLE:
+            fila.constant -= holgura
+        elif holgura and restriccion.sense == pulp.LpConstraintGE:
+            fila.constant += holgura
+        elif holgura:
+            continue  # igualdad relajada en cualquier sentido
+        prob.addConstraint(fila)
+    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+    return pulp.LpStatus[prob.status] == "Optimal"
+
+def _assert_iis(formulator, diagnostico):
+    assert diagnostico["minimo"]
+    filas = {c["restriccion"] for c in diagnostico["conflicto"]}
+    assert filas
+    assert not _factible(formulator, filas)
+    for fila in filas:
+        assert _factible(formulator, filas - {fila}), fila
+    relajacion = {r["restriccion"]: r["relajacion"] + 1e-6 for r in diagnostico["relajacion_minima"]}
+    assert _factible(formulator, None, relajacion)
+
+@pytest.fixture
+def ingredientes():
+    return pd.DataFrame({
+        "Ingrediente": ["Maíz", "Harina de carne", "Arroz", "Aceite"],
+        "Categoría": ["Carbohidratos", "Proteinas", "Carbohidratos", "Grasas"],
+        "precio": [0.8, 2.5, 1.0, 3.0],
+        "PB": [8.5, 55.0, 7.5, 0.0],
+        "Grasa": [3.8, 12.0, 1.0, 99.0],
+        "Ca": [0.02, 8.0, 0.01, 0.0],
+        "P": [0.3, 4.0, 0.1, 0.05],
+    })
+
+def test_inclusiones_minimas_que_suman_mas_de_100(ingredientes):
+    f = _formulador(ingredientes, {"PB": {"min": 20.0}}, limits={"min": {"Maíz": 0.6, "Harina de carne": 0.6}, "max": {}})
+    diagnostico = diagnosticar_infactibilidad(f)
+    assert {c["restriccion"] for c in diagnostico["conflicto"]} == {
+        "Total_Proportion", "MinInc_Maíz", "MinInc_Harina_de_carne",  # PuLP cambia espacios por _
+    }
+    _assert_iis(f, diagnostico)
+
+def test_maximo_de_nutriente_con_inclusion_maxima(ingredientes):
+    # Solo el arroz tiene menos de 2% de grasa, y se limita a 50%
+    requerimientos = {"PB": {"min": 5.0}, "Grasa": {"max": 2.0}}
+    f = _formulador(ingredientes, requerimientos, limits={"min": {}, "max": {"Arroz": 0.5}})
+    diagnostico = diagnosticar_infactibilidad(f)
+    assert {"Max_Grasa", "MaxInc_Arroz"} <= {c["restriccion"] for c in diagnostico["conflicto"]}
+    _assert_iis(f, diagnostico)
+
+def test_relacion_en_conflicto_con_maximo(ingredientes):
+    # Ca:P >= 1.5 solo con harina de carne (Ca/P = 2), limitada a 2%
+    f = _formulador(
+        ingredientes, {"PB": {"min": 5.0}}, limits={"min": {}, "max": {"Harina de carne": 0.02}},
+        ratios=[{"numerador": "Ca", "denominador": "P", "min": 1.5, "max": None}],
+    )
+    diagnostico = diagnosticar_infactibilidad(f)
+    assert {c["restriccion"] for c in diagnostico["conflicto"]} == {
+        "Total_Proportion", "MaxInc_Harina_de_carne", "RatioMin_Ca_P",
+    }
+    _assert_iis(f, diagnostico)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_conflictos_aleatorios(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed)
+    rng = np.random.default_rng(seed)
+    nombres = list(rng.choice(df["Ingrediente"], 3, replace=False))
+    limites = {"min": {nombres[0]: 0.5, nombres[1]: 0.4}, "max": {}}
+    requerimientos["Grasa"] = {"max": float(df["Grasa"].min()) * 0.5}
+    f = _formulador(df, requerimientos, limits=limites)
+    assert not f.solve()["success"]
+    _assert_iis(f, diagnosticar_infactibilidad(f, tiempo_max_s=10.0))
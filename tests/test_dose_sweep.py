@@ -0,0 +1,61 @@
+"""
+barrido_dosis: cada punto de la curva coincide con DietFormulator.solve con los
+requerimientos por kg escalados a esa dosis, y los límites de factibilidad quedan dentro de
+la resolución pedida.
+"""
+import numpy as np
+import pulp
+import pytest
+
+from dose_sweep import barrido_dosis
+from optimization import DietFormulator
+
+DOSIS_REF_G = 1000.0
+
+def _formulador(df, requerimientos):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False)
+    )
+
+def _a_dosis(requerimientos, dosis_g):
+    t = DOSIS_REF_G / dosis_g
+    return {
+        nut: {k: (v * t if k in ("min", "max") and v else v) for k, v in req.items()}
+        for nut, req in requerimientos.items()
+    }
+
+def _cumple_minimos(resultado, requerimientos):
+    return resultado.get("success", False) and all(
+        resultado["nutritional_values"][nut] >= req["min"] - 1e-4
+        for nut, req in requerimientos.items() if req.get("min")
+    )
+
+@pytest.mark.parametrize("seed", range(3))
+def test_curva_igual_a_formular_a_cada_dosis(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed)
+    barrido = barrido_dosis(_formulador(df, requerimientos), DOSIS_REF_G, 300, 3000, n_puntos=8, resolucion_g=1.0)
+    curva = barrido["curva"]
+    assert curva["factible"].any() and not curva["factible"].all()
+    for fila in curva.iloc[:: max(1, len(curva) // 12)].itertuples():
+        escalados = _a_dosis(requerimientos, fila.dosis_g)
+        resultado = _formulador(df, escalados).solve()
+        if fila.factible:
+            assert _cumple_minimos(resultado, escalados), fila.dosis_g
+            assert fila.costo_100kg == pytest.approx(resultado["cost"], abs=1e-3), fila.dosis_g
+            assert fila.costo_dia == pytest.approx(fila.costo_100kg / 100 * fila.dosis_g / 1000)
+        else:
+            assert not _cumple_minimos(resultado, escalados), fila.dosis_g
+
+@pytest.mark.parametrize("seed", range(3))
+def test_limites_factibles_dentro_de_la_resolucion(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed)
+    resolucion_g = 2.0
+    barrido = barrido_dosis(_formulador(df, requerimientos), DOSIS_REF_G, 300, 3000, n_puntos=8, resolucion_g=resolucion_g)
+    bajo, alto = barrido["limites_factibles"]
+    for dosis, factible in ((bajo, True), (alto, True), (bajo - resolucion_g, False), (alto + resolucion_g, False)):
+        escalados = _a_dosis(requerimientos, dosis)
+        assert _cumple_minimos(_formulador(df, escalados).solve(), escalados) == factible, dosis
+    mejor = barrido["mejor"]
+    factibles = barrido["curva"][barrido["curva"]["factible"]]
+    assert mejor["costo_dia"] == pytest.approx(factibles["costo_dia"].min())
+    assert np.isclose(barrido["curva"]["dosis_g"].diff().dropna(), 0).sum() == 0
@@ -0,0 +1,79 @@
+"""
+IncrementalSolver.actualizar contra una formulación completa con la matriz editada: la
+solución analítica (misma base, sin solver) y el re-solve deben coincidir con ella.
+"""
+import pandas as pd
+import pulp
+import pytest
+
+from incremental import IncrementalSolver
+from optimization import DietFormulator
+
+REQUERIMIENTOS = {
+    "PB": {"min": 22.0, "max": 32.0},
+    "EM": {"min": 3400.0},
+    "Grasa": {"min": 8.0, "max": 18.0},
+}
+
+@pytest.fixture
+def ingredientes():
+    # Óptimo: Maíz, Soya y Aceite (base no degenerada)
+    return pd.DataFrame({
+        "Ingrediente": ["Maíz", "Harina de carne", "Arroz", "Soya", "Aceite"],
+        "Categoría": ["Carbohidratos", "Proteinas", "Carbohidratos", "Proteinas", "Grasas"],
+        "precio": [0.8, 2.5, 1.0, 1.6, 3.0],
+        "PB": [8.5, 55.0, 7.5, 44.0, 0.0],
+        "EM": [3300.0, 2900.0, 3500.0, 2800.0, 8800.0],
+        "Grasa": [3.8, 12.0, 1.0, 1.5, 99.0],
+    })
+
+def _formulador(df):
+    return DietFormulator(
+        df.copy(), list(REQUERIMIENTOS), REQUERIMIENTOS,
+        min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False),
+    )
+
+def _actualizar(df, editado):
+    incremental = IncrementalSolver(_formulador(df))
+    assert incremental.solve()["success"]
+    formulador = _formulador(editado)
+    assert incremental.compatible(formulador)
+    return incremental.actualizar(formulador), _formulador(editado).solve()
+
+def _assert_igual(resultado, referencia):
+    assert resultado["success"] and referencia["success"]
+    assert resultado["cost"] == pytest.approx(referencia["cost"], abs=1e-4)
+    ingredientes = set(resultado["diet"]) | set(referencia["diet"])
+    for ingrediente in ingredientes:
+        assert resultado["diet"].get(ingrediente, 0.0) == pytest.approx(
+            referencia["diet"].get(ingrediente, 0.0), abs=1e-4
+        ), ingrediente
+    for nutriente, valor in referencia["nutritional_values"].items():
+        assert resultado["nutritional_values"][nutriente] == pytest.approx(valor, rel=1e-6, abs=1e-6), nutriente
+
+def test_precio_dentro_del_rango_de_la_base(ingredientes):
+    editado = ingredientes.copy()
+    editado.loc[0, "precio"] = 0.81
+    resultado, referencia = _actualizar(ingredientes, editado)
+    assert resultado["incremental"]["metodo"] == "analitico"
+    assert resultado["incremental"]["cambios"] == [("Maíz", "precio", 0.8, 0.81)]
+    _assert_igual(resultado, referencia)
+
+def test_precio_fuera_del_rango_de_la_base(ingredientes):
+    editado = ingredientes.copy()
+    editado.loc[0, "precio"] = 3.0  # el Maíz deja de convenir: cambia la base
+    resultado, referencia = _actualizar(ingredientes, editado)
+    assert resultado["incremental"]["metodo"] == "re_solve"
+    _assert_igual(resultado, referencia)
+
+def test_cambio_de_nutriente(ingredientes):
+    editado = ingredientes.copy()
+    editado.loc[3, "PB"] = 44.1
+    resultado, referencia = _actualizar(ingredientes, editado)
+    assert resultado["incremental"]["metodo"] == "analitico"
+    _assert_igual(resultado, referencia)
+
+def test_sin_cambios_retorna_el_resultado_anterior(ingredientes):
+    resultado, referencia = _actualizar(ingredientes, ingredientes.copy())
+    assert resultado["incremental"]["metodo"] == "sin_cambios"
+    _assert_igual(resultado, referencia)
@@ -0,0 +1,22 @@
+"""requerimientos_canil: los animales sin edad o peso válidos se reportan, no interrumpen el canil."""
+import numpy as np
+
+from data import PerfilMascota
+from kennel import requerimientos_canil
+
+def test_edad_y_peso_invalidos_se_reportan_por_animal():
+    perfiles = [
+        ("ok", PerfilMascota("perro", "adulto_entero", 3, 10.0)),
+        ("sin_edad", PerfilMascota("perro", "adulto_entero", None, 10.0)),
+        ("texto", PerfilMascota("perro", "adulto_entero", 3.0, "diez")),
+        ("negativo", PerfilMascota("gato", "adulto_entero", 2.0, -4.0)),
+    ]
+    animales, minimos = requerimientos_canil(perfiles)
+    assert animales.loc[0, "tabla"] >= 0 and animales.loc[0, "mer_kcal"] > 0
+    assert not np.isnan(minimos[0]).all()
+    mensajes = dict(zip(animales["id"], animales["mensaje"]))
+    assert mensajes["sin_edad"] == "Falta edad en el perfil"
+    assert mensajes["texto"] == "Peso inválido en el perfil: diez"
+    assert mensajes["negativo"] == "Peso inválido en el perfil: -4.0"
+    assert (animales.loc[1:, "tabla"] == -1).all()
+    assert np.isnan(minimos[1:]).all()
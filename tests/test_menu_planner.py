@@ -0,0 +1,79 @@
+"""
+planificar_menu: promedios semanales dentro de los requerimientos, banda diaria de
+tolerancia, tope de días por ingrediente (con exentos) y la rotación como respaldo.
+"""
+import pandas as pd
+import pulp
+import pytest
+
+from menu_planner import planificar_menu
+from optimization import DietFormulator
+
+TOL = 1e-6
+
+def _formulador(filas, requerimientos, limits=None):
+    df = pd.DataFrame(filas, columns=["Ingrediente", "Categoría", "precio", "N"])
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, limits=limits,
+        min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False),
+    )
+
+def _niveles(menu, nutriente):
+    return [dia["nutritional_values"][nutriente] for dia in menu["dias"]]
+
+def _usos(menu):
+    usos = {}
+    for dia in menu["dias"]:
+        for ingrediente, valor in dia["diet"].items():
+            if valor > 1e-6:
+                usos[ingrediente] = usos.get(ingrediente, 0) + 1
+    return usos
+
+def test_promedio_semanal_respeta_el_maximo():
+    # El barato excede el máximo: con tolerancia, cada día puede pasarse pero no el promedio
+    f = _formulador(
+        [("Barato", "A", 1.0, 10.0), ("Caro", "B", 5.0, 0.0), ("Caro2", "B", 5.5, 0.0)],
+        {"N": {"max": 4.0}},
+    )
+    menu = planificar_menu(f, n_dias=4, tolerancia_diaria=0.5, max_dias=4)
+    assert menu["success"] and menu["metodo"] == "milp"
+    niveles = _niveles(menu, "N")
+    assert sum(niveles) / len(niveles) <= 4.0 + TOL
+    assert menu["promedio"]["N"] <= 4.0 + TOL
+    assert all(n <= 4.0 * 1.5 + TOL for n in niveles)
+    # Sin variedad que imponer, el menú cuesta lo mismo que la dieta de un día
+    assert menu["cost"] == pytest.approx(f.solve()["cost"], abs=1e-3)
+
+def test_promedio_semanal_respeta_el_minimo_y_la_banda_diaria():
+    f = _formulador(
+        [("Bajo", "A", 1.0, 4.0), ("Medio", "A", 2.0, 6.0), ("Alto", "B", 3.0, 9.0), ("Nulo", "B", 0.5, 0.0)],
+        {"N": {"min": 5.0, "max": 8.0}},
+    )
+    menu = planificar_menu(f, n_dias=4, tolerancia_diaria=0.2, max_dias=2)
+    assert menu["success"] and menu["max_dias_respetado"]
+    niveles = _niveles(menu, "N")
+    assert sum(niveles) / len(niveles) >= 5.0 - TOL
+    assert sum(niveles) / len(niveles) <= 8.0 + TOL
+    assert all(5.0 * 0.8 - TOL <= n <= 8.0 * 1.2 + TOL for n in niveles)
+
+def test_max_dias_y_exentos():
+    f = _formulador(
+        [("Base", "A", 1.0, 5.0), ("Uno", "A", 1.1, 5.0), ("Dos", "B", 1.2, 5.0), ("Tres", "B", 1.3, 5.0)],
+        {"N": {"min": 5.0}},
+        limits={"min": {"Base": 0.2}, "max": {}},
+    )
+    menu = planificar_menu(f, n_dias=4, tolerancia_diaria=0.2, max_dias=2)
+    assert menu["success"] and menu["metodo"] == "milp" and menu["max_dias_respetado"]
+    usos = _usos(menu)
+    assert usos["Base"] == 4  # inclusión mínima > 0: exento del tope
+    assert all(dias <= 2 for ingrediente, dias in usos.items() if ingrediente != "Base")
+
+def test_rotacion_sin_alternativas_avisa_que_no_respeta_max_dias():
+    # Dos ingredientes, tres días y a lo sumo un día cada uno: no hay menú que cumpla el tope
+    f = _formulador([("Uno", "A", 1.0, 5.0), ("Dos", "B", 2.0, 5.0)], {"N": {"min": 5.0}})
+    menu = planificar_menu(f, n_dias=3, tolerancia_diaria=0.2, max_dias=1)
+    assert menu["success"]
+    assert menu["metodo"] == "rotacion"
+    assert menu["max_dias_respetado"] is False
+    assert "advertencia" in menu
+    assert max(_usos(menu).values()) > 1
@@ -0,0 +1,89 @@
+"""
+frontera_pareto: los extremos de la frontera son los óptimos de cada objetivo por separado
+(el de costo, DietFormulator.solve; el segundo, un modelo propio) y la frontera no tiene
+puntos dominados.
+"""
+import itertools
+
+import numpy as np
+import pulp
+import pytest
+
+from optimization import DietFormulator
+from pareto import OBJETIVOS, frontera_pareto
+
+def _formulador(df, requerimientos):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False)
+    )
+
+def _filas(df, requerimientos, x, usar=None):
+    """Restricciones de la mezcla x (sin holguras: las instancias son factibles)."""
+    usar = list(df.index) if usar is None else usar
+    filas = [pulp.lpSum(x[i] for i in usar) == 1]
+    for nut, req in requerimientos.items():
+        expr = pulp.lpSum(float(df.at[i, nut]) * x[i] for i in usar)
+        if req.get("min"):
+            filas.append(expr >= req["min"])
+        if req.get("max"):
+            filas.append(expr <= req["max"])
+    return filas
+
+def _minimo_exceso(df, requerimientos):
+    prob = pulp.LpProblem("exceso", pulp.LpMinimize)
+    x = pulp.LpVariable.dicts("x", list(df.index), lowBound=0, upBound=1)
+    excesos = []
+    for nut, req in requerimientos.items():
+        if req.get("min"):
+            e = pulp.LpVariable(f"e_{nut}", lowBound=0)
+            prob += e >= (pulp.lpSum(float(df.at[i, nut]) * x[i] for i in df.index) - req["min"]) * (100.0 / req["min"])
+            excesos.append(e)
+    prob += pulp.lpSum(excesos)
+    for fila in _filas(df, requerimientos, x):
+        prob += fila
+    prob.solve(pulp.PULP_CBC_CMD(msg=False))
+    assert pulp.LpStatus[prob.status] == "Optimal"
+    return pulp.value(prob.objective)
+
+def _minimo_ingredientes(df, requerimientos):
+    # Fuerza bruta: el menor subconjunto de ingredientes con una mezcla factible
+    for k in range(1, len(df) + 1):
+        for usar in itertools.combinations(df.index, k):
+            prob = pulp.LpProblem("factible", pulp.LpMinimize)
+            x = pulp.LpVariable.dicts("x", list(usar), lowBound=0, upBound=1)
+            prob += 0
+            for fila in _filas(df, requerimientos, x, list(usar)):
+                prob += fila
+            prob.solve(pulp.PULP_CBC_CMD(msg=False))
+            if pulp.LpStatus[prob.status] == "Optimal":
+                return k
+
+def _sin_dominados(frontera, columna):
+    ordenada = frontera.sort_values(columna)
+    assert (np.diff(ordenada[columna].to_numpy()) > 0).all()
+    assert (np.diff(ordenada["costo"].to_numpy()) < 0).all()
+
+@pytest.mark.parametrize("seed", range(3))
+def test_extremos_exceso_nutrientes(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed, n=8)
+    columna = OBJETIVOS["exceso_nutrientes"]
+    frontera = frontera_pareto(_formulador(df, requerimientos), "exceso_nutrientes", n_puntos=8)
+    mas_barato = frontera.loc[frontera["costo"].idxmin()]
+    assert mas_barato["costo"] == pytest.approx(_formulador(df, requerimientos).solve()["cost"], abs=1e-3)
+    assert frontera[columna].min() == pytest.approx(_minimo_exceso(df, requerimientos), abs=1e-4)
+    _sin_dominados(frontera, columna)
+
+def test_extremos_n_ingredientes(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(1, n=6)
+    columna = OBJETIVOS["n_ingredientes"]
+    frontera = frontera_pareto(_formulador(df, requerimientos), "n_ingredientes")
+    mas_barato = frontera.loc[frontera["costo"].idxmin()]
+    assert mas_barato["costo"] == pytest.approx(_formulador(df, requerimientos).solve()["cost"], abs=1e-3)
+    assert frontera[columna].min() == _minimo_ingredientes(df, requerimientos)
+    _sin_dominados(frontera, columna)
+
+def test_barrido_en_paralelo_igual_al_secuencial(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(2, n=8)
+    secuencial = frontera_pareto(_formulador(df, requerimientos), n_puntos=6)
+    paralelo = frontera_pareto(_formulador(df, requerimientos), n_puntos=6, jobs=2)
+    assert np.allclose(secuencial["costo"], paralelo["costo"], atol=1e-6)
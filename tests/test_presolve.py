@@ -0,0 +1,43 @@
+"""El presolve no cambia el óptimo: misma formulación con y sin presolve en instancias al azar."""
+import pulp
+import pytest
+
+from optimization import DietFormulator
+
+def _resolver(df, requerimientos, **opciones):
+    f = DietFormulator(
+        df, list(requerimientos), requerimientos, min_num_ingredientes=0,
+        solver=pulp.PULP_CBC_CMD(msg=False), **opciones,
+    )
+    return f, f.solve()
+
+@pytest.mark.parametrize("seed", range(12))
+def test_mismo_objetivo_con_y_sin_presolve(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed)
+    limites = {"min": {"Ing 0": 0.05}, "max": {"Ing 1": 0.2}}
+    f, con = _resolver(df, requerimientos, limits=limites)
+    _, sin = _resolver(df, requerimientos, limits=limites, presolve=False)
+    assert con["success"] and sin["success"]
+    assert con["cost"] == pytest.approx(sin["cost"], abs=1e-4)
+    # Las copias más caras son dominadas por su original, salvo si este tiene inclusión máxima
+    copias = {n for n in df["Ingrediente"] if n.endswith("(copia)")} - {"Ing 1 (copia)"}
+    assert copias <= set(f.presolve_report["ingredientes_dominados"])
+    assert "P" in f.presolve_report["nutrientes_sin_restriccion"]
+    antes, despues = f.presolve_report["filas"]
+    assert despues < antes
+    # La solución con presolve cumple los requerimientos del modelo completo (valores a 4 decimales)
+    for nut, req in requerimientos.items():
+        valor = con["nutritional_values"][nut]
+        if req.get("min"):
+            assert valor >= req["min"] - 1e-4, nut
+        if req.get("max"):
+            assert valor <= req["max"] + 1e-4, nut
+
+@pytest.mark.parametrize("seed", range(4))
+def test_mismo_objetivo_con_tipo_de_dieta(matriz_aleatoria, seed):
+    # Con tipo de dieta la dominancia solo se compara dentro de cada categoría
+    df, requerimientos = matriz_aleatoria(seed, n=12)
+    _, con = _resolver(df, requerimientos, diet_type="Equilibrada")
+    _, sin = _resolver(df, requerimientos, diet_type="Equilibrada", presolve=False)
+    assert con["success"] and sin["success"]
+    assert con["cost"] == pytest.approx(sin["cost"], abs=1e-4)
@@ -0,0 +1,51 @@
+"""
+simular_riesgo_precio: el costo de cada muestra, resuelta reutilizando bases, es el de
+DietFormulator.solve con esos precios, y CBC se llama menos veces que muestras.
+"""
+import numpy as np
+import pulp
+import pytest
+
+from optimization import DietFormulator
+from perf import REGISTRY
+from price_risk import especificacion_porcentual, muestrear_precios, simular_riesgo_precio
+
+N = 60
+
+def _formulador(df, requerimientos):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False)
+    )
+
+@pytest.mark.parametrize("seed", range(3))
+def test_costos_iguales_a_resolver_cada_muestra(matriz_aleatoria, seed):
+    df, requerimientos = matriz_aleatoria(seed)
+    especificacion = especificacion_porcentual(df, 30)
+    REGISTRY.reset()
+    riesgo = simular_riesgo_precio(_formulador(df, requerimientos), especificacion, n=N, seed=seed)
+    contadores = REGISTRY.contadores()
+    assert riesgo["n_fallidas"] == 0
+    assert contadores["risk.solves"] + contadores.get("risk.basis_reuse", 0) == N
+    assert contadores["risk.solves"] < N
+    # Mismas muestras (misma semilla) resueltas una por una
+    precios = muestrear_precios(df, especificacion, N, seed)
+    for k in range(N):
+        muestra = df.assign(precio=precios[k])
+        esperado = _formulador(muestra, requerimientos).solve()["cost"]
+        assert riesgo["costos"][k] == pytest.approx(esperado, abs=1e-3), k
+    costos = riesgo["costos"]
+    assert riesgo["media"] == pytest.approx(costos.mean())
+    assert riesgo["percentiles"][50] == pytest.approx(np.percentile(costos, 50))
+
+def test_en_paralelo_igual_que_secuencial(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(4)
+    especificacion = especificacion_porcentual(df, 30)
+    secuencial = simular_riesgo_precio(_formulador(df, requerimientos), especificacion, n=N, seed=1)
+    paralelo = simular_riesgo_precio(_formulador(df, requerimientos), especificacion, n=N, seed=1, jobs=2)
+    assert np.allclose(secuencial["costos"], paralelo["costos"], atol=1e-6)
+
+def test_precio_fijo_sin_variacion(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(5)
+    riesgo = simular_riesgo_precio(_formulador(df, requerimientos), {}, n=10, seed=0)
+    assert np.allclose(riesgo["costos"], _formulador(df, requerimientos).solve()["cost"], atol=1e-3)
+    assert riesgo["desv"] == pytest.approx(0.0, abs=1e-9)
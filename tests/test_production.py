@@ -0,0 +1,76 @@
+"""
+receta_produccion: la receta en unidades de balanza suma exactamente el lote, respeta las
+cotas duras del modelo (inclusiones y máximos de nutrientes) y no empeora los mínimos
+respecto de la fórmula continua de DietFormulator.
+"""
+import numpy as np
+import pulp
+import pytest
+
+from optimization import DietFormulator
+from production import _mayor_resto, receta_produccion
+
+def _formulador(df, requerimientos, limits=None):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, limits=limits,
+        min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False),
+    )
+
+def _assert_receta(df, requerimientos, limites, receta, lote_kg, incremento_kg):
+    assert receta["success"]
+    tabla = receta["receta"]
+    unidades = tabla["Unidades de balanza"].to_numpy()
+    assert np.issubdtype(unidades.dtype, np.integer)
+    assert unidades.sum() * incremento_kg == pytest.approx(lote_kg, abs=1e-9)
+    assert tabla["kg"].sum() == pytest.approx(lote_kg, abs=1e-9)
+    x = dict(zip(tabla["Ingrediente"], unidades / unidades.sum()))
+    for nombre, maximo in limites.get("max", {}).items():
+        assert x.get(nombre, 0.0) <= maximo + 1e-9, nombre
+    for nombre, minimo in limites.get("min", {}).items():
+        assert x.get(nombre, 0.0) >= minimo - 1e-9, nombre
+    continuo = _formulador(df, requerimientos, limites).solve()
+    por_nombre = df.set_index("Ingrediente")
+    for nut, req in requerimientos.items():
+        valor = sum(float(por_nombre.at[nombre, nut]) * xi for nombre, xi in x.items())
+        if req.get("max"):
+            assert valor <= req["max"] + 1e-6, nut
+        if req.get("min"):
+            # Un mínimo que la fórmula continua cumple lo cumple la receta; si no, no empeora
+            assert valor >= min(req["min"], continuo["nutritional_values"][nut]) - 1e-4, nut
+
+def test_mayor_resto_suma_exacta():
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        total = int(rng.integers(1, 2000))
+        q = rng.dirichlet(np.ones(int(rng.integers(2, 15)))) * total
+        n = _mayor_resto(q, total)
+        assert n.sum() == total
+        assert (np.abs(n - q) < 1).all()
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("lote_kg, incremento_kg", [(500.0, 0.5), (100.0, 1.0), (60.0, 3.0)])
+def test_receta_suma_el_lote_y_respeta_las_cotas(matriz_aleatoria, seed, lote_kg, incremento_kg):
+    df, requerimientos = matriz_aleatoria(seed)
+    limites = {"min": {"Ing 0": 0.05}, "max": {"Ing 1": 0.1, "Ing 2": 0.15}}
+    receta = receta_produccion(_formulador(df, requerimientos, limites), lote_kg, incremento_kg, radio=3)
+    _assert_receta(df, requerimientos, limites, receta, lote_kg, incremento_kg)
+    assert receta["desviacion_max_kg"] <= 4 * incremento_kg
+
+def test_reparacion_cuando_el_redondeo_rompe_una_cota(matriz_aleatoria):
+    # Balanza gruesa: el mayor resto tiende a pasarse de las inclusiones máximas
+    metodos = set()
+    for seed in range(8):
+        df, requerimientos = matriz_aleatoria(seed)
+        limites = {"min": {}, "max": {nombre: 0.22 for nombre in df["Ingrediente"]}}
+        receta = receta_produccion(_formulador(df, requerimientos, limites), 50.0, 5.0, radio=2)
+        if receta["success"]:
+            _assert_receta(df, requerimientos, limites, receta, 50.0, 5.0)
+            metodos.add(receta["metodo"])
+    assert "milp" in metodos
+
+def test_lote_que_no_es_multiplo_del_incremento(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(0)
+    with pytest.raises(ValueError):
+        receta_produccion(_formulador(df, requerimientos), 100.0, 0.3)
+    with pytest.raises(ValueError):
+        receta_produccion(_formulador(df, requerimientos), 100.0, 0.0)
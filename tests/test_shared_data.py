@@ -0,0 +1,59 @@
+"""
+Biblioteca de ingredientes compartida: una sola copia de solo lectura por contenido, y la
+matriz de trabajo reconstruida (selección + ediciones) formula igual que el DataFrame original.
+"""
+import gc
+
+import numpy as np
+import pulp
+import pytest
+
+import shared_data
+from data import limpiar_matriz_ingredientes
+from optimization import DietFormulator
+
+def _csv(df):
+    return df.to_csv(sep=";", index=False).encode("latin1")
+
+def _formular(df, requerimientos):
+    return DietFormulator(
+        df, list(requerimientos), requerimientos, min_num_ingredientes=0, solver=pulp.PULP_CBC_CMD(msg=False)
+    ).solve()
+
+def test_mismo_contenido_misma_biblioteca_de_solo_lectura(matriz_aleatoria):
+    df, _ = matriz_aleatoria(0)
+    a = shared_data.obtener_biblioteca(_csv(df), "ingredientes.csv")
+    b = shared_data.obtener_biblioteca(_csv(df), "otro_nombre.csv")
+    assert a is b
+    assert shared_data.biblioteca_por_clave(a.clave) is a
+    with pytest.raises(ValueError):
+        a.matriz[0, 0] = 1.0
+    copia = a.frame()
+    copia.iloc[0, 2] = -1.0
+    assert a.frame().iloc[0, 2] != -1.0
+
+def test_biblioteca_referenciada_sobrevive_al_lru(matriz_aleatoria, monkeypatch):
+    monkeypatch.setattr(shared_data, "MAX_BIBLIOTECAS", 1)
+    df, _ = matriz_aleatoria(1)
+    retenida = shared_data.obtener_biblioteca(_csv(df), "a.csv")
+    for seed in range(2, 5):
+        shared_data.obtener_biblioteca(_csv(matriz_aleatoria(seed)[0]), "b.csv")
+    gc.collect()
+    assert shared_data.biblioteca_por_clave(retenida.clave) is retenida
+    assert shared_data.obtener_biblioteca(_csv(df), "a.csv") is retenida
+
+def test_frame_con_ediciones_formula_igual_que_el_original(matriz_aleatoria):
+    df, requerimientos = matriz_aleatoria(2)
+    biblioteca = shared_data.obtener_biblioteca(_csv(df), "ingredientes.csv")
+    idx = biblioteca.indices(list(df["Ingrediente"])[::2])
+    editado = limpiar_matriz_ingredientes(df.iloc[idx].copy())
+    editado.iloc[0, editado.columns.get_loc("precio")] = 0.25
+    editado.iloc[1, editado.columns.get_loc("PB")] = 48.0
+    ediciones = biblioteca.ediciones(idx, editado)
+    assert set(ediciones) == {(editado["Ingrediente"].iloc[0], "precio"), (editado["Ingrediente"].iloc[1], "PB")}
+    reconstruido = biblioteca.frame(idx, ediciones)
+    numericas = biblioteca.columnas_numericas
+    assert np.allclose(reconstruido[numericas].to_numpy(dtype=float), editado[numericas].to_numpy(dtype=float))
+    assert _formular(reconstruido, requerimientos)["cost"] == pytest.approx(
+        _formular(editado, requerimientos)["cost"], abs=1e-6
+    )
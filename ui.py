@@ -1,5 +1,21 @@
 import streamlit as st
 
+FOTO_LADO_MAX_PX = 280  # la foto se muestra a 140 px; se guarda a 2x para pantallas de alta densidad
+
+def miniatura_foto(contenido):
+    """Reduce la foto a una miniatura JPEG para no guardar la imagen original en la sesión."""
+    import io
+    from PIL import Image
+
+    try:
+        img = Image.open(io.BytesIO(contenido))
+        img.thumbnail((FOTO_LADO_MAX_PX, FOTO_LADO_MAX_PX))
+        salida = io.BytesIO()
+        img.convert("RGB").save(salida, format="JPEG", quality=85)
+        return salida.getvalue()
+    except Exception:
+        return contenido
+
 def show_mascota_form(profile, on_update_callback=None):
     mascota = profile.get("mascota", {})
 
@@ -9,7 +25,7 @@ def show_mascota_form(profile, on_update_callback=None):
         if "foto_mascota_bytes" not in st.session_state:
             img = st.file_uploader("Foto de la mascota", type=["png", "jpg", "jpeg"], key="foto_mascota")
             if img is not None:
-                st.session_state["foto_mascota_bytes"] = img.getvalue()
+                st.session_state["foto_mascota_bytes"] = miniatura_foto(img.getvalue())
                 st.session_state["foto_mascota_name"] = mascota.get("nombre", "")
         # Si hay foto, solo muestra la imagen, nombre, y botón eliminar
         if "foto_mascota_bytes" in st.session_state: